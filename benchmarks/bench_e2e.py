@@ -0,0 +1,234 @@
+"""Offline end-to-end benchmark of the main workflows at 10, 100 or 1,000 accounts.
+
+Every scenario drives main.py through Streamlit's AppTest against the local
+stand-ins in mock_services.py, in a fresh working directory with its own
+secrets.toml and databases, and records wall time, external calls and peak
+memory. Results can be saved and compared against a previous run to catch
+regressions.
+
+Memory is the process's peak RSS by default, which only ever grows, so it is
+most meaningful for the largest size. --memory tracemalloc reports each
+scenario's own peak Python allocations instead, but slows the app several
+times over, so wall times from such runs are not comparable with untraced ones.
+
+Scenarios:
+    account_search  Upload a company list in Account Search, start the batch and wait for every summary
+    top_targets     Upload top targets and poll until background intelligence finishes
+    call_prep       Generate prep sheets for sample websites (capped at --max-prep-sheets)
+    crm_pipeline    Import a pipeline of 10 deals per account (failing on any rejected row) and page through the grid
+
+Usage:
+    python benchmarks/bench_e2e.py [--sizes 10 100 1000] [--scenarios account_search top_targets]
+                                   [--latency 0.05] [--jitter 0.01] [--error-rate 0.0] [--rpm 0] [--tpm 0]
+                                   [--memory rss]
+                                   [--save results.json] [--compare baseline.json] [--tolerance 0.25]
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(os.path.dirname(BENCH_DIR), "main.py")
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+import main as app  # noqa: E402
+from mock_services import MockServices  # noqa: E402
+
+ADJECTIVES = ["Northwind", "Contoso", "Fabrikam", "Tailspin", "Litware", "Proseware", "Adatum", "Wingtip"]
+NOUNS = ["Analytics", "Logistics", "Health", "Robotics", "Foods", "Energy", "Media", "Finance"]
+TOP_TARGETS_TIMEOUT_SECONDS = 600
+
+
+def company_names(count):
+    return [f"{ADJECTIVES[i % len(ADJECTIVES)]} {NOUNS[(i // len(ADJECTIVES)) % len(NOUNS)]} {i + 1}"
+            for i in range(count)]
+
+
+def make_app(section):
+    at = AppTest.from_file(APP_PATH, default_timeout=TOP_TARGETS_TIMEOUT_SECONDS)
+    at.session_state["section"] = section
+    return at
+
+
+def check(at):
+    if at.exception:
+        raise RuntimeError(f"App raised: {at.exception[0].message}")
+    return at
+
+
+def uploader(at, label):
+    return next(u for u in at.file_uploader if u.label == label)
+
+
+def account_search(size, services, options):
+    names = company_names(size)
+    at = check(make_app("🔍 Account Search").run())
+    csv = "Company Name\n" + "\n".join(names)
+    check(uploader(at, "Upload Company List (CSV)").set_value(("companies.csv", csv.encode(), "text/csv")).run())
+    check(at.button(key="batch_start").click().run())
+    failed = sum(1 for e in at.error if "Error" in e.value)
+    return {"items": size, "failed": failed}
+
+
+def top_targets(size, services, options):
+    names = company_names(size)
+    at = check(make_app("📁 Top Targets").run())
+    csv = "Company Name,Website\n" + "\n".join(f"{name},{name.lower().replace(' ', '')}.example" for name in names)
+    check(uploader(at, "Upload Top Targets CSV").set_value(("targets.csv", csv.encode(), "text/csv")).run())
+    deadline = time.time() + TOP_TARGETS_TIMEOUT_SECONDS
+    # The page polls with a fragment timer in a browser; here the script is rerun until every job is done
+    while len(at.session_state["intelligence"]) < size or any("Generating intelligence" in p.proto.text for p in at.get("progress")):
+        if time.time() > deadline:
+            raise TimeoutError(f"Top Targets did not finish {size} companies in {TOP_TARGETS_TIMEOUT_SECONDS}s")
+        time.sleep(0.2)
+        check(at.run())
+    failed = sum(1 for entry in at.session_state["intelligence"].values() if entry["content"].startswith("Error"))
+    return {"items": size, "failed": failed}
+
+
+def call_prep(size, services, options):
+    sheets = min(size, options.max_prep_sheets)
+    at = check(make_app("📞 Call Prep").run())
+    failed = 0
+    for slug in company_names(sheets):
+        at.text_input[0].set_value(services.site_url(slug.lower().replace(" ", "-")))
+        check(next(b for b in at.button if b.label == "Generate Prep Sheet").click().run())
+        failed += sum(1 for e in at.error if "Error" in e.value)
+    return {"items": sheets, "failed": failed}
+
+
+def crm_pipeline(size, services, options):
+    rows = ["account,acv,stage,confidence,close_date,notes"]
+    for i, name in enumerate(company_names(size)):
+        for j in range(10):
+            stage = app.PIPELINE_STAGES[(i + j) % len(app.PIPELINE_STAGES)]
+            rows.append(f"{name},{10000 + (i * 37 + j * 911) % 90000},{stage},"
+                        f"{(i + j) % 101},2025-{(j % 12) + 1:02d}-15,Next step {j}")
+    at = check(make_app("📂 CRM").run())
+    check(uploader(at, "Upload Pipeline CSV").set_value(("pipeline.csv", "\n".join(rows).encode(), "text/csv")).run())
+    if "pipeline_import_report" not in at.session_state:
+        raise RuntimeError(f"Pipeline import failed: {[e.value for e in at.error]}")
+    report = at.session_state["pipeline_import_report"]
+    if report.rejected:
+        # Every generated row is valid, so a rejection means the workload is not what it claims to be
+        raise RuntimeError(f"Pipeline import rejected {report.rejected} of {len(rows) - 1} rows: "
+                           f"{report.errors['errors'].value_counts().to_dict()}")
+    page_count = int(at.number_input(key="pipeline_page").max)
+    for page in range(2, min(page_count, 5) + 1):
+        check(at.number_input(key="pipeline_page").set_value(page).run())
+    check(at.radio(key="pipeline_view").set_value("Cards").run())
+    return {"items": report.imported, "failed": report.rejected}
+
+
+SCENARIOS = {
+    "account_search": account_search,
+    "top_targets": top_targets,
+    "call_prep": call_prep,
+    "crm_pipeline": crm_pipeline
+}
+
+
+def run_scenario(name, size, services, options):
+    """Run one scenario in a fresh working directory and return its measurements"""
+    workdir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    os.makedirs(os.path.join(workdir, ".streamlit"))
+    with open(os.path.join(workdir, ".streamlit", "secrets.toml"), "w") as f:
+        # Background workers read secrets from disk, so AppTest's in-memory secrets are not enough
+        f.write('OPENAI_API_KEY = "sk-benchmark"\nNEWSDATA_API_KEY = "nd-benchmark"\n')
+    os.environ["TERRITORY_DB_PATH"] = os.path.join(workdir, "territory.sqlite3")
+    os.environ["LLM_CACHE_PATH"] = os.path.join(workdir, "llm_cache.sqlite3")
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    services.reset_counts()
+    if options.memory == "tracemalloc":
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = SCENARIOS[name](size, services, options)
+        wall = time.perf_counter() - start
+        if options.memory == "tracemalloc":
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        else:
+            peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+    finally:
+        if options.memory == "tracemalloc":
+            tracemalloc.stop()
+        os.chdir(previous_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return dict(result, scenario=name, size=size, wall_seconds=round(wall, 3),
+                peak_mb=round(peak_mb, 1), calls=dict(services.counts))
+
+
+def compare(results, baseline_path, tolerance):
+    """Print regressions against a saved run; returns True if any metric regressed"""
+    with open(baseline_path) as f:
+        baseline = {(r["scenario"], r["size"]): r for r in json.load(f)["results"]}
+    regressed = False
+    for result in results:
+        base = baseline.get((result["scenario"], result["size"]))
+        if base is None:
+            continue
+        checks = [("wall_seconds", result["wall_seconds"], base["wall_seconds"]),
+                  ("peak_mb", result["peak_mb"], base["peak_mb"])]
+        checks += [(f"calls.{k}", v, base["calls"].get(k, 0)) for k, v in result["calls"].items()]
+        for metric, value, previous in checks:
+            if value > previous * (1 + tolerance) and value - previous > 0.05:
+                regressed = True
+                print(f"REGRESSION {result['scenario']}[{result['size']}] {metric}: {previous} -> {value}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100], help="Account counts to run")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock API latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.01, help="Standard deviation of the mock latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of mock API calls that fail")
+    parser.add_argument("--rpm", type=int, default=0, help="Mock OpenAI requests per minute per model (0 = unlimited)")
+    parser.add_argument("--tpm", type=int, default=0, help="Mock OpenAI tokens per minute per model (0 = unlimited)")
+    parser.add_argument("--max-prep-sheets", type=int, default=20, help="Cap on prep sheets per call_prep run")
+    parser.add_argument("--memory", choices=["rss", "tracemalloc"], default="rss", help="How peak memory is measured")
+    parser.add_argument("--save", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file from an earlier --save")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative increase before flagging")
+    options = parser.parse_args()
+
+    services = MockServices(latency=options.latency, jitter=options.jitter, error_rate=options.error_rate,
+                            rpm=options.rpm, tpm=options.tpm).start()
+    os.environ["OPENAI_BASE_URL"] = services.openai_base_url
+    os.environ["NEWSDATA_API_URL"] = services.news_url
+
+    results = []
+    print(f"{'Scenario':<16} {'Size':>6} {'Items':>7} {'Failed':>6} {'Wall (s)':>9} {'ms/item':>8} {'Peak MB':>8}  Calls")
+    for size in options.sizes:
+        for name in options.scenarios:
+            result = run_scenario(name, size, services, options)
+            results.append(result)
+            calls = " ".join(f"{k}={v}" for k, v in sorted(result["calls"].items()))
+            per_item = result["wall_seconds"] * 1000 / max(result["items"], 1)
+            print(f"{name:<16} {size:>6} {result['items']:>7} {result['failed']:>6} {result['wall_seconds']:>9.2f} "
+                  f"{per_item:>8.1f} {result['peak_mb']:>8.1f}  {calls}")
+    services.stop()
+
+    if options.save:
+        with open(options.save, "w") as f:
+            json.dump({"options": {k: v for k, v in vars(options).items() if k not in ("save", "compare")},
+                       "results": results}, f, indent=2)
+    if options.compare and compare(results, options.compare, options.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
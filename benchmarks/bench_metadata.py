@@ -0,0 +1,195 @@
+"""Website metadata extraction benchmark against generated sample homepages.
+
+Builds three deterministic pages that mimic real homepages (a WordPress site
+with a heavy <head>, a Next.js app with inline CSS and JSON-LD, and a page whose
+<head> is never closed), serves each from a local HTTP server and compares the
+previous approach (download the whole body, parse it all with html.parser) with
+the streamed, head-only extract_company_info. --inflate repeats each page body to mimic the
+multi-megabyte homepages of large marketing sites.
+
+Usage:
+    python benchmarks/bench_metadata.py [--runs 20] [--inflate 10]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from bs4 import BeautifulSoup
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FILLER_WORDS = ["automation", "analytics", "cloud", "customers", "enterprise", "finance", "global", "insights",
+                "integrate", "leaders", "payroll", "planning", "platform", "scalable", "secure", "solution",
+                "talent", "teams", "trusted", "workforce"]
+
+# Keep the app's databases out of the way before importing it
+os.environ.setdefault("TERRITORY_DB_PATH", os.path.join(tempfile.mkdtemp(), "territory.sqlite3"))
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "llm_cache.sqlite3"))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+import main  # noqa: E402
+
+
+def filler(rng, words):
+    text = " ".join(rng.choice(FILLER_WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def enterprise_homepage(rng):
+    """WordPress-style page: dozens of plugin scripts and a large inline script before the metadata"""
+    head = ["<!doctype html><html><head>", "<title>Home - Contoso Manufacturing</title>"]
+    head += [f'<script src="/wp-includes/js/plugin-{i}.min.js?ver=6.{i}"></script>'
+             f'<link rel="stylesheet" href="/wp-content/plugins/p{i}/style.css"/>' for i in range(60)]
+    head += [
+        '<meta name="description" content="Industrial automation, robotics and service for manufacturers worldwide."/>',
+        '<meta property="og:locale" content="en_GB"/><meta property="og:site_name" content="Contoso"/>',
+        "<script>window.dataLayer=window.dataLayer||[];"
+        + "".join(f"dataLayer.push({{event:'e{i}',v:{i}}});" for i in range(2000)) + "</script>",
+        "<script type='application/ld+json'>" + json.dumps({
+            "@context": "https://schema.org", "@type": "Corporation", "name": "Contoso Manufacturing",
+            "legalName": "Contoso Manufacturing Holdings plc", "url": "https://www.contoso.example",
+            "description": "Contoso builds industrial automation equipment for 40 countries.",
+            "address": {"@type": "PostalAddress", "addressLocality": "Leeds", "addressCountry": "GB"}
+        }) + "</script>"
+    ]
+    rows = "".join(f"<div class='row'><h3>{filler(rng, 4)}</h3><p>{filler(rng, 120)}</p>"
+                   f"<img src='/img/{i}.jpg' alt='{filler(rng, 3)}'/></div>" for i in range(250))
+    return "\n".join(head) + f'\n</HEAD><body class="home page-template-default">{rows}</body></html>'
+
+
+def saas_homepage(rng):
+    """Next.js-style page: inline CSS, a JSON-LD @graph, and the page data repeated in a JSON script"""
+    head = [
+        '<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"/>',
+        '<meta name="viewport" content="width=device-width, initial-scale=1"/>',
+        "<title>Northwind Cloud | The Workforce Planning Platform</title>",
+        '<meta name="description" content="Northwind Cloud helps finance and HR teams plan headcount, '
+        'model scenarios and close the books faster."/>',
+        '<meta property="og:site_name" content="Northwind Cloud"/><meta property="og:title" content="Northwind Cloud"/>',
+        '<meta property="og:type" content="website"/><meta property="og:url" content="https://www.northwind.example/"/>',
+        '<meta property="og:image" content="https://www.northwind.example/og.png"/>',
+        '<link rel="preload" href="/_next/static/css/app.css" as="style"/>',
+        "<style>" + "\n".join(f".c{i}{{margin:{i % 17}px;padding:{i % 9}px;color:#{rng.randrange(16 ** 6):06x};display:flex}}"
+                               for i in range(600)) + "</style>",
+        '<script type="application/ld+json">' + json.dumps({"@context": "https://schema.org", "@graph": [
+            {"@type": "WebSite", "name": "Northwind Cloud", "url": "https://www.northwind.example"},
+            {"@type": "Organization", "name": "Northwind Cloud, Inc.", "url": "https://www.northwind.example",
+             "logo": "https://www.northwind.example/logo.svg",
+             "sameAs": ["https://www.linkedin.com/company/northwind-cloud", "https://x.com/northwind"],
+             "foundingDate": "2014", "numberOfEmployees": {"@type": "QuantitativeValue", "value": 2400}}
+        ]}) + "</script>",
+        "</head>"
+    ]
+    sections = [{"id": i, "heading": filler(rng, 6), "body": filler(rng, 70)} for i in range(90)]
+    paths = "".join(f'<path d="M{i} {i}L{i * 7 % 100} {i * 13 % 100}Z"/>' for i in range(100))
+    body = "".join(f"<section><h2>{s['heading']}</h2><p>{s['body']}</p><svg viewBox=\"0 0 100 100\">{paths}</svg></section>"
+                   for s in sections)
+    data = json.dumps({"props": {"pageProps": {"sections": sections}}})
+    return "\n".join(head) + f'<body><div id="__next">{body}</div>' \
+        f'<script id="__NEXT_DATA__" type="application/json">{data}</script></body></html>'
+
+
+def unclosed_head(rng):
+    """Metadata followed straight by body content, with no </head> or <body> for the reader to stop at"""
+    paragraphs = "".join(f"<p>{filler(rng, 120)}</p>" for _ in range(600))
+    return ("<html><head><title>Fabrikam Logistics</title>\n"
+            '<meta name="description" content="Freight forwarding and warehousing across North America."/>\n'
+            '<meta property="og:title" content="Fabrikam Logistics"/>\n'
+            f'<div class="banner">{paragraphs}</div></html>')
+
+
+SAMPLE_PAGES = {
+    "enterprise_homepage.html": enterprise_homepage,
+    "saas_homepage.html": saas_homepage,
+    "unclosed_head.html": unclosed_head
+}
+
+
+def build_sample_pages(seed=0):
+    """Generate every sample page; the same seed always produces the same bytes"""
+    rng = random.Random(seed)
+    return {name: build(rng).encode("utf-8") for name, build in SAMPLE_PAGES.items()}
+
+
+def inflate_page(page, factor):
+    """Repeat the body of a page so the head stays the same but the download grows"""
+    split = page.lower().find(b"<body")
+    if split == -1:
+        split = page.lower().find(b"<div")
+    return page[:split] + page[split:] * factor
+
+
+class PageHandler(SimpleHTTPRequestHandler):
+    pages = {}
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = self.pages.get(self.path.lstrip("/"))
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The head-only reader hangs up early by design
+
+
+def legacy_extract(url):
+    """The original implementation: full download, full parse"""
+    response = main.get_http_client().session.get(url, timeout=main.get_http_client().timeout)
+    response.raise_for_status()
+    soup = BeautifulSoup(response.text, 'html.parser')
+    meta_desc = soup.find('meta', {'name': 'description'})
+    return {"name": soup.title.string if soup.title else None,
+            "description": meta_desc['content'] if meta_desc else ""}
+
+
+def time_runs(func, url, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func(url)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def run_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20, help="Timed runs per page and approach")
+    parser.add_argument("--inflate", type=int, default=10, help="Times to repeat each page body")
+    args = parser.parse_args()
+
+    for name, page in build_sample_pages().items():
+        PageHandler.pages[name] = inflate_page(page, args.inflate)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    print(f"{'Page':<26} {'Size':>9} {'Legacy ms':>10} {'Head ms':>8} {'Speedup':>8} {'Bytes parsed':>13}")
+    for name, body in PageHandler.pages.items():
+        url = f"{base_url}/{name}"
+        info = main.extract_company_info(url)
+        head_bytes = len(main.get_http_client().get(url, max_bytes=main.HTML_HEAD_MAX_BYTES, stop_at=b"</head>").content)
+        legacy = time_runs(legacy_extract, url, args.runs)
+        head = time_runs(main.extract_company_info, url, args.runs)
+        print(f"{name:<26} {len(body) / 1024:>7.0f}KB {legacy * 1000:>10.1f} {head * 1000:>8.1f} "
+              f"{legacy / head:>7.1f}x {head_bytes:>13,}")
+        print(f"    name={info['name']!r} og={sorted(info['open_graph'])} "
+              f"organization={sorted(info['organization'])}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    run_benchmark()
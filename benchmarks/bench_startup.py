@@ -0,0 +1,54 @@
+"""Time-to-first-render benchmark for each section of the sidebar router.
+
+Runs main.py through Streamlit's AppTest harness. "Cold" is the first run of
+a section after all st.cache_resource / st.cache_data entries are cleared,
+"warm" is the median of repeated reruns of the same session.
+
+Usage:
+    python benchmarks/bench_startup.py [--warm-runs 5]
+"""
+import argparse
+import os
+import statistics
+import time
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+SECTIONS = ["🏠 Home", "📂 CRM", "📁 Top Targets", "🔍 Account Search", "📞 Call Prep", "📊 Quota Tracker"]
+
+
+def make_app(section):
+    at = AppTest.from_file(APP_PATH, default_timeout=120)
+    at.secrets["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY", "sk-benchmark")
+    at.session_state["section"] = section
+    return at
+
+
+def timed_run(at):
+    start = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(f"App raised: {at.exception[0].message}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--warm-runs", type=int, default=5, help="Reruns per section for the warm measurement")
+    args = parser.parse_args()
+
+    print(f"{'Section':<20} {'Cold (ms)':>10} {'Warm p50 (ms)':>14} {'Warm max (ms)':>14}")
+    for section in SECTIONS:
+        st.cache_resource.clear()
+        st.cache_data.clear()
+        at = make_app(section)
+        cold = timed_run(at)
+        warm = [timed_run(at) for _ in range(args.warm_runs)]
+        print(f"{section:<20} {cold * 1000:>10.1f} {statistics.median(warm) * 1000:>14.1f} {max(warm) * 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+"""Local stand-ins for the OpenAI chat completions API, NewsData.io and company websites.
+
+Latency, jitter, error injection and per-model RPM/TPM limits (answered with
+429s and x-ratelimit-* headers like the real API) are configurable so benchmarks
+can run the app offline at any scale without spending API credits. Point the
+app at it with:
+
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 \
+    NEWSDATA_API_URL=http://127.0.0.1:8765/api/1/news \
+    streamlit run main.py
+
+Usage:
+    python benchmarks/mock_services.py [--port 8765] [--latency 0.2] [--jitter 0.05] [--error-rate 0.01]
+                                       [--rpm 60] [--tpm 40000]
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SUMMARY_TEXT = """**Company Overview:**
+- {name} sells subscription software to mid-market finance and HR teams
+- Flagship products cover planning, payroll and workforce analytics
+- Estimated 1,200 employees across North America and Europe
+- Recently announced a new product line for frontline workers
+
+**Industry Trends:**
+- Consolidation of HR and finance tooling onto unified cloud suites
+- Growing regulatory pressure on pay transparency and data residency
+- Buyers expect embedded analytics and AI assistance
+
+**Known Challenges or Risks:**
+- Legacy on-premise ERP slows month-end close
+- Rapid headcount growth is straining manual onboarding processes
+
+**Opportunities for Tech Adoption:**
+- Replace spreadsheet-based headcount planning
+- Automate onboarding and compliance reporting"""
+
+STRATEGY_TEXT = """**Company Summary:**
+- {name} is a fast-growing provider in its segment with a subscription model
+- Serves enterprise and mid-market customers in 20 countries
+
+**Industry Trends:**
+- Cloud consolidation and tighter budgets favour platform vendors
+
+**Workday Fit/Value:**
+- Current HRIS is a patchwork of SAP and spreadsheets
+- Unified HCM and financials would shorten planning cycles
+
+**Trigger Events:**
+- Raised a $40M Series C funding round last quarter
+- Appointed a new CFO from a public SaaS company
+
+**Strategic Business Context:**
+- Core business model built on recurring revenue
+
+**Growth Triggers & Risk Factors:**
+- Recent funding accelerates hiring plans
+
+**Technology Enablement Opportunities:**
+- Consolidate finance and HR systems onto one platform
+
+**Executive Conversation Starters:**
+- How is the new CFO approaching planning and forecasting?"""
+
+COMPANY_LINE = re.compile(r"^(c\d+): (.+)$", re.MULTILINE)
+SECTION_LINE = re.compile(r"^- ([a-z_]+): ", re.MULTILINE)
+
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that stop reading early (head-only fetches, cancelled streams) are expected
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+class MockServices:
+    """Threaded HTTP server emulating the external APIs the app calls"""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.05, jitter=0.0, error_rate=0.0,
+                 token_delay=0.0, articles_per_company=3, rpm=0, tpm=0, seed=0):
+        self.latency = latency  # Seconds before the first byte of each chat/news response
+        self.jitter = jitter  # Standard deviation added to latency
+        self.error_rate = error_rate  # Fraction of chat/news requests answered with HTTP 500
+        self.token_delay = token_delay  # Seconds between streamed chunks
+        self.articles_per_company = articles_per_company
+        self.rpm = rpm  # Chat requests per minute per model; 0 for no limit
+        self.tpm = tpm  # Prompt plus max_tokens per minute per model; 0 for no limit
+        self._buckets = {}  # model -> [requests_left, tokens_left, updated_at]
+        self.counts = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = QuietHTTPServer((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def openai_base_url(self):
+        return f"{self.base_url}/v1"
+
+    @property
+    def news_url(self):
+        return f"{self.base_url}/api/1/news"
+
+    def site_url(self, slug):
+        return f"{self.base_url}/site/{slug}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_counts(self):
+        with self._lock:
+            self.counts.clear()
+            self._buckets.clear()
+
+    def _count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def _delay_and_maybe_fail(self):
+        """Sleep for the configured latency; return True when this request should fail"""
+        with self._lock:
+            delay = max(0.0, self._random.gauss(self.latency, self.jitter)) if self.jitter else self.latency
+            fail = self._random.random() < self.error_rate
+        time.sleep(delay)
+        return fail
+
+    def rate_limit(self, request):
+        """Charge a chat request to its model's buckets; returns (headers, allowed)"""
+        if not (self.rpm or self.tpm):
+            return {}, True
+        rpm, tpm = self.rpm or 10 ** 9, self.tpm or 10 ** 9
+        cost = sum(len(m.get("content") or "") for m in request.get("messages", [])) // 4 + request.get("max_tokens", 0)
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._buckets.setdefault(request.get("model"), [rpm, tpm, now])
+            elapsed, bucket[2] = now - bucket[2], now
+            bucket[0] = min(rpm, bucket[0] + elapsed * rpm / 60)
+            bucket[1] = min(tpm, bucket[1] + elapsed * tpm / 60)
+            allowed = bucket[0] >= 1 and bucket[1] >= min(cost, tpm)
+            if allowed:
+                bucket[0] -= 1
+                bucket[1] -= min(cost, tpm)
+            wait = max((1 - bucket[0]) * 60 / rpm, (min(cost, tpm) - bucket[1]) * 60 / tpm, 0)
+            headers = {
+                "x-ratelimit-limit-requests": str(rpm),
+                "x-ratelimit-remaining-requests": str(int(bucket[0])),
+                "x-ratelimit-reset-requests": f"{(rpm - bucket[0]) * 60 / rpm:.3f}s",
+                "x-ratelimit-limit-tokens": str(tpm),
+                "x-ratelimit-remaining-tokens": str(int(bucket[1])),
+                "x-ratelimit-reset-tokens": f"{(tpm - bucket[1]) * 60 / tpm:.3f}s"
+            }
+        if not allowed:
+            headers["retry-after-ms"] = str(int(wait * 1000) + 1)
+        return headers, allowed
+
+    def _make_handler(self):
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, payload, status=200, headers=None):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/v1/models":
+                    services._count("models")
+                    self._send_json({"object": "list", "data": [{"id": "gpt-4", "object": "model"}]})
+                elif url.path == "/api/1/news":
+                    services._count("news")
+                    if services._delay_and_maybe_fail():
+                        self._send_json({"status": "error"}, 500)
+                        return
+                    self._send_json(services.news_page(parse_qs(url.query)))
+                elif url.path.startswith("/site/"):
+                    services._count("site")
+                    body = services.site_page(url.path.rsplit("/", 1)[-1]).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    try:
+                        self.wfile.write(body)
+                    except (BrokenPipeError, ConnectionResetError):
+                        pass  # Head-only readers hang up early
+                else:
+                    self._send_json({"error": "not found"}, 404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if urlparse(self.path).path != "/v1/chat/completions":
+                    self._send_json({"error": "not found"}, 404)
+                    return
+                services._count("chat")
+                headers, allowed = services.rate_limit(request)
+                if not allowed:
+                    services._count("chat_429")
+                    self._send_json({"error": {"message": "Rate limit reached", "type": "requests",
+                                               "code": "rate_limit_exceeded"}}, 429, headers)
+                    return
+                if services._delay_and_maybe_fail():
+                    self._send_json({"error": {"message": "Injected failure", "type": "server_error"}}, 500)
+                    return
+                text = services.chat_text(request)
+                if request.get("stream"):
+                    self._stream(request, text, headers)
+                else:
+                    self._send_json({
+                        "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()),
+                        "model": request.get("model"),
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                        "usage": services.usage(request, text)
+                    }, headers=headers)
+
+            def _stream(self, request, text, headers):
+                self.send_response(200)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                base = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                        "model": request.get("model")}
+                try:
+                    for word in re.findall(r"\S+\s*", text):
+                        chunk = dict(base, choices=[{"index": 0, "delta": {"content": word}, "finish_reason": None}])
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                        if services.token_delay:
+                            self.wfile.flush()
+                            time.sleep(services.token_delay)
+                    if (request.get("stream_options") or {}).get("include_usage"):
+                        chunk = dict(base, choices=[], usage=services.usage(request, text))
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.write(b"data: [DONE]\n\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # Cancelled hedged requests disconnect mid-stream
+                self.close_connection = True
+
+        return Handler
+
+    def chat_text(self, request):
+        """Canned answer shaped like what each feature asks for"""
+        prompt = request["messages"][-1]["content"]
+        name = re.search(r"^Company(?: Name)?: (.+)$", prompt, re.MULTILINE)
+        name = name.group(1) if name else "The company"
+        if (request.get("response_format") or {}).get("type") == "json_object":
+            if '{"sections"' in prompt:
+                return json.dumps({"sections": {
+                    key: [f"{name}: {key.replace('_', ' ')} point {i}" for i in range(1, 4)]
+                    for key in SECTION_LINE.findall(prompt)
+                }})
+            companies = COMPANY_LINE.findall(prompt)
+            if companies:
+                return json.dumps({"summaries": {
+                    company_id: {
+                        "company": name,
+                        "company_overview": [f"{name} sells software to mid-market companies", "About 1,200 employees"],
+                        "industry_trends": ["Cloud consolidation", "Pay transparency regulation"],
+                        "challenges_and_risks": ["Legacy ERP", "Manual onboarding"],
+                        "tech_adoption_opportunities": ["Headcount planning", "Onboarding automation"]
+                    } for company_id, name in companies
+                }})
+            return json.dumps({"events": [{"type": "funding", "article": 0, "summary": "Raised a Series C round"}]})
+        return (STRATEGY_TEXT if "Trigger Events" in prompt or "Conversation Starters" in prompt else SUMMARY_TEXT).format(name=name)
+
+    @staticmethod
+    def usage(request, text):
+        prompt_tokens = sum(len(m.get("content") or "") for m in request.get("messages", [])) // 4
+        completion_tokens = len(text) // 4
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    def news_page(self, params):
+        """NewsData-style page of articles for every name in a (possibly OR-ed) query"""
+        query = params.get("q", [""])[0]
+        names = [term.strip().strip('"') for term in query.split(" OR ")] if " OR " in query else [query]
+        articles = []
+        for name in names:
+            slug = re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+            headlines = [
+                f"{name} raises $40M Series C to expand internationally",
+                f"{name} appoints new CFO",
+                f"{name} opens new office in Austin",
+                f"Analysts weigh {name}'s move to a unified HR platform"
+            ]
+            for i in range(self.articles_per_company):
+                articles.append({
+                    "title": headlines[i % len(headlines)],
+                    "description": f"{name} announced the news on Tuesday. " * 3,
+                    "pubDate": f"2025-05-{28 - i:02d} 09:00:00",
+                    "link": f"https://news.example/{slug}/{i}",
+                    "source_url": "https://news.example"
+                })
+        size = int(params.get("size", ["10"])[0])
+        page = int(params.get("page", ["0"])[0] or 0)
+        results = articles[page * size:(page + 1) * size]
+        next_page = str(page + 1) if (page + 1) * size < len(articles) else None
+        return {"status": "success", "totalResults": len(articles), "results": results, "nextPage": next_page}
+
+    @staticmethod
+    def site_page(slug):
+        """Homepage with a realistic head and a large body the head-only reader should skip"""
+        name = slug.replace("-", " ").title()
+        organization = {"@context": "https://schema.org", "@type": "Organization", "name": name,
+                        "url": f"https://{slug}.example"}
+        body = "".join(f"<section><h2>Section {i}</h2><p>{'Product details and customer stories. ' * 40}</p></section>"
+                       for i in range(150))
+        return (f"<!DOCTYPE html><html><head><title>{name} | Home</title>"
+                f"<meta name=\"description\" content=\"{name} builds software for modern teams.\"/>"
+                f"<meta property=\"og:site_name\" content=\"{name}\"/>"
+                f"<script type=\"application/ld+json\">{json.dumps(organization)}</script>"
+                f"</head><body>{body}</body></html>")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before each chat/news response")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Standard deviation of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of chat/news requests that fail")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Seconds between streamed chunks")
+    parser.add_argument("--rpm", type=int, default=0, help="Chat requests per minute per model (0 = unlimited)")
+    parser.add_argument("--tpm", type=int, default=0, help="Chat tokens per minute per model (0 = unlimited)")
+    args = parser.parse_args()
+
+    services = MockServices(port=args.port, latency=args.latency, jitter=args.jitter,
+                            error_rate=args.error_rate, token_delay=args.token_delay, rpm=args.rpm, tpm=args.tpm)
+    services.start()
+    print(f"OPENAI_BASE_URL={services.openai_base_url}")
+    print(f"NEWSDATA_API_URL={services.news_url}")
+    print(f"Sample site: {services.site_url('acme-corp')}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        services.stop()
+
+
+if __name__ == "__main__":
+    main()
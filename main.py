@@ -2,30 +2,31 @@ import streamlit as st
 import pandas as pd
 import os
 import plotly.graph_objects as go
-from datetime import date
-from openai import OpenAI
-from bs4 import BeautifulSoup
+from datetime import date, datetime
+from openai import OpenAI, APIConnectionError, InternalServerError, RateLimitError
+from bs4 import BeautifulSoup, SoupStrainer
 import requests
-from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib.parse import urlparse, urlencode
+from collections import OrderedDict, deque
 import json
+import queue
+import re
+import logging
+import time
+import hashlib
+import sqlite3
+import threading
+import itertools
+import random
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 
-st.set_page_config(page_title="Territory Suite", layout="wide")
-
-# Initialize OpenAI client with Streamlit secrets
-try:
-    api_key = st.secrets["OPENAI_API_KEY"]
-    if not api_key:
-        raise ValueError("API key is empty")
-    client = OpenAI(api_key=api_key)
-    # Test the client with a simple call
-    client.models.list()
-except Exception as e:
-    st.error(f"⚠️ Error initializing OpenAI client: {str(e)}")
-    st.info("Please check your secrets.toml file and make sure it contains a valid OPENAI_API_KEY")
-    st.stop()
+logger = logging.getLogger("territory_suite")
 
 # === STYLES ===
-st.markdown("""
+APP_STYLES = """
 <style>
 @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;600&display=swap');
 html, body, [class*="css"] {
@@ -102,43 +103,35 @@ footer {visibility: hidden;}
     line-height: 1.6;
 }
 </style>
-""", unsafe_allow_html=True)
+"""
 
 # === SIDEBAR ===
-st.sidebar.title("📈 Territory Suite")
-st.sidebar.caption("The Sales Mainframe")
-section = st.sidebar.radio("Navigate", [
+SECTIONS = [
     "🏠 Home", "📂 CRM", "📁 Top Targets",
-    "🔍 Account Search", "📊 Quota Tracker"
-])
-
-# === SESSION STATE INIT ===
-if "deals" not in st.session_state:
-    st.session_state.deals = []
-if "quota" not in st.session_state:
-    st.session_state.quota = 850000
-if "pipeline" not in st.session_state:
-    st.session_state.pipeline = []
-if "top_targets" not in st.session_state:
-    st.session_state.top_targets = pd.DataFrame(columns=['Company Name', 'Website', 'Last Updated'])
-if "uploaded_accounts" not in st.session_state:
-    st.session_state.uploaded_accounts = None
-if "last_updated" not in st.session_state:
-    st.session_state.last_updated = {}
+    "🔍 Account Search", "📞 Call Prep", "📊 Quota Tracker"
+]
+
+def show_sidebar():
+    """Render the sidebar navigation and return the selected section"""
+    st.sidebar.title("📈 Territory Suite")
+    st.sidebar.caption("The Sales Mainframe")
+    sections = list(SECTIONS)
+    if st.query_params.get("admin") == "1":
+        # Hidden admin page, opened with ?admin=1
+        sections.append("⚙️ Performance")
+    return st.sidebar.radio("Navigate", sections, key="section")
 
 # === HOME ===
 def show_home():
     st.title("🏠 Territory Suite")
     st.subheader("Your Sales Mainframe")
 
-    # Initialize session state for deals if not present
-    if "deals" not in st.session_state:
-        st.session_state.deals = []
+    # Initialize session state for quota if not present
     if "quota" not in st.session_state:
         st.session_state.quota = 850000
 
-    df = pd.DataFrame(st.session_state.deals)
-    total_acv = df["acv"].sum() if not df.empty else 0
+    totals = st.session_state.aggregates
+    total_acv = totals.booked_acv
     remaining = max(st.session_state.quota - total_acv, 0)
 
     fig = go.Figure(data=[go.Pie(
@@ -153,10 +146,9 @@ def show_home():
                       margin=dict(t=40, b=0, l=0, r=0), font=dict(family="Inter", size=14))
     st.plotly_chart(fig, use_container_width=True)
 
-    logo_types = ["HR", "FINS", "Full Suite", "HR + FINS", "FINS + PLN"]
-    logo_count = sum(1 for d in st.session_state.deals if d["deal_type"] in logo_types)
+    logo_count = totals.logo_count
     st.markdown("### 🧩 Logos Progress")
-    st.progress(min(logo_count / 4, 1.0), text=f"{logo_count} / 4 Logos")
+    st.progress(min(logo_count / LOGO_TARGET, 1.0), text=f"{logo_count} / {LOGO_TARGET} Logos")
 
 # === QUOTA TRACKER ===
 def show_quota_tracker():
@@ -172,27 +164,1099 @@ def show_quota_tracker():
         st.session_state.quota = new_quota
         st.success("✅ Quota updated!")
     
-    # Calculate and display metrics
-    df = pd.DataFrame(st.session_state.deals)
-    if not df.empty:
-        df.columns = ["Account", "ACV", "Deal Type", "Quarter"]
-        total_acv = df["ACV"].sum()
-        logo_types = ["HR", "FINS", "Full Suite", "HR + FINS", "FINS + PLN"]
-        logo_deals = df[df["Deal Type"].isin(logo_types)]
-        logo_count = len(logo_deals)
+    # Display metrics from the running totals
+    totals = st.session_state.aggregates
+    if totals.deal_count:
+        total_acv = totals.booked_acv
+        quota_percentage = totals.quota_percentage(st.session_state.quota)
 
         st.markdown(f"### 💰 Booked: ${total_acv:,.0f} / ${st.session_state.quota:,.0f}")
-        st.progress(min(total_acv / st.session_state.quota, 1.0), text=f"{(total_acv / st.session_state.quota) * 100:.1f}% to goal")
-        st.markdown(f"### 🧩 Logos: {logo_count} / 4")
+        st.progress(min(quota_percentage / 100, 1.0), text=f"{quota_percentage:.1f}% to goal")
+        st.markdown(f"### 🧩 Logos: {totals.logo_count} / {LOGO_TARGET}")
+        logo_deals = pd.DataFrame(
+            [d for d in st.session_state.deals if d["deal_type"] in LOGO_TYPES],
+            columns=["account", "acv", "deal_type", "quarter"]
+        )
+        logo_deals.columns = ["Account", "ACV", "Deal Type", "Quarter"]
         st.dataframe(logo_deals, use_container_width=True)
     else:
         st.info("No deals logged yet.")
 
-# === ACCOUNT SEARCH ===
-def generate_company_summary(company_name):
-    """Generate company summary using OpenAI"""
+# === INSTRUMENTATION ===
+METRICS_WINDOW_SECONDS = 15 * 60  # Percentiles cover this much recent history
+METRICS_MAX_SAMPLES = 2000  # Per series, so a busy series cannot grow without bound
+METRICS_PORT = os.getenv("METRICS_PORT")  # Serve Prometheus text on this port when set
+
+class Metrics:
+    """Rolling latency samples and running totals for spans, keyed by span name and labels"""
+
+    def __init__(self, window_seconds=METRICS_WINDOW_SECONDS, max_samples=METRICS_MAX_SAMPLES):
+        self.window_seconds = window_seconds
+        self.max_samples = max_samples
+        self._samples = {}  # (name, labels) -> deque of (finished_at, seconds)
+        self._totals = {}  # (name, labels) -> running totals since start
+        self._lock = threading.Lock()
+
+    def record(self, name, labels, seconds, error=False, bytes=0, input_tokens=0, output_tokens=0, cache=None):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.max_samples)).append((time.time(), seconds))
+            totals = self._totals.setdefault(key, {
+                "count": 0, "seconds": 0.0, "errors": 0, "bytes": 0,
+                "input_tokens": 0, "output_tokens": 0, "cache_hits": 0, "cache_misses": 0
+            })
+            totals["count"] += 1
+            totals["seconds"] += seconds
+            totals["errors"] += bool(error)
+            totals["bytes"] += bytes or 0
+            totals["input_tokens"] += input_tokens or 0
+            totals["output_tokens"] += output_tokens or 0
+            if cache is not None:
+                totals["cache_hits" if cache else "cache_misses"] += 1
+
+    def summary(self):
+        """One row per series with rolling p50/p95/p99 (in ms) and running totals"""
+        cutoff = time.time() - self.window_seconds
+        with self._lock:
+            series = [(key, [s for t, s in samples if t >= cutoff], dict(self._totals[key]))
+                      for key, samples in self._samples.items()]
+        rows = []
+        for (name, labels), recent, totals in sorted(series):
+            recent.sort()
+            rows.append(dict(
+                {"span": name, "labels": ", ".join(f"{k}={v}" for k, v in labels), "recent": len(recent)},
+                **{f"p{q}_ms": recent[min(len(recent) - 1, int(len(recent) * q / 100))] * 1000 if recent else None
+                   for q in (50, 95, 99)},
+                **totals
+            ))
+        return rows
+
+    def prometheus(self):
+        """Render the series in the Prometheus text exposition format"""
+        cutoff = time.time() - self.window_seconds
+        lines = [
+            "# HELP territory_span_seconds Rolling latency quantiles of instrumented spans",
+            "# TYPE territory_span_seconds summary"
+        ]
+        counters = {
+            "errors": "territory_span_errors_total",
+            "bytes": "territory_span_bytes_total",
+            "input_tokens": "territory_span_input_tokens_total",
+            "output_tokens": "territory_span_output_tokens_total",
+            "cache_hits": "territory_span_cache_hits_total",
+            "cache_misses": "territory_span_cache_misses_total"
+        }
+        counter_lines = {metric: [] for metric in counters.values()}
+        with self._lock:
+            items = [(key, sorted(s for t, s in samples if t >= cutoff), dict(self._totals[key]))
+                     for key, samples in self._samples.items()]
+        for (name, labels), recent, totals in sorted(items):
+            label_text = ",".join([f'span="{name}"'] + [f'{k}="{prometheus_escape(v)}"' for k, v in labels])
+            for q in (0.5, 0.95, 0.99):
+                if recent:
+                    lines.append(f'territory_span_seconds{{{label_text},quantile="{q}"}} '
+                                 f'{recent[min(len(recent) - 1, int(len(recent) * q))]:.6f}')
+            lines.append(f"territory_span_seconds_sum{{{label_text}}} {totals['seconds']:.6f}")
+            lines.append(f"territory_span_seconds_count{{{label_text}}} {totals['count']}")
+            for field, metric in counters.items():
+                counter_lines[metric].append(f"{metric}{{{label_text}}} {totals[field]}")
+        for metric, metric_lines in counter_lines.items():
+            lines.append(f"# TYPE {metric} counter")
+            lines.extend(metric_lines)
+        return "\n".join(lines) + "\n"
+
+def prometheus_escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+@st.cache_resource
+def get_metrics():
+    """Process-wide metrics registry"""
+    metrics = Metrics()
+    if METRICS_PORT:
+        start_metrics_exporter(metrics, int(METRICS_PORT))
+    return metrics
+
+def start_metrics_exporter(metrics, port):
+    """Serve metrics.prometheus() at /metrics from a background thread"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = metrics.prometheus().encode()
+            self.send_response(200 if self.path.startswith("/metrics") else 404)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    except OSError:
+        logger.exception("Could not start the metrics exporter on port %d", port)
+        return
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics_exporter").start()
+    logger.info("Serving Prometheus metrics on port %d", port)
+
+@contextmanager
+def span(name, **labels):
+    """Time a block and record it under name and labels
+
+    The block can fill in bytes, input_tokens, output_tokens, cache (True for a
+    hit) and error on the yielded dict. Exceptions are counted as errors and
+    re-raised, unless the block set cancelled.
+    """
+    attrs = {}
+    start = time.perf_counter()
+    error = False
+    try:
+        yield attrs
+    except Exception:
+        error = not attrs.pop("cancelled", False)
+        raise
+    finally:
+        error = attrs.pop("error", error)
+        get_metrics().record(name, labels, time.perf_counter() - start, error=error, **attrs)
+
+def show_performance_panel():
+    """Hidden admin page with span percentiles, totals and a Prometheus export"""
+    st.title("⚙️ Performance")
+    metrics = get_metrics()
+    rows = metrics.summary()
+    st.caption(f"Percentiles cover the last {metrics.window_seconds // 60} minutes; totals are since the process started.")
+    if rows:
+        df = pd.DataFrame(rows)
+        df["error_rate"] = df["errors"] / df["count"]
+        df["mean_ms"] = df["seconds"] / df["count"] * 1000
+        st.dataframe(
+            df[["span", "labels", "recent", "p50_ms", "p95_ms", "p99_ms", "mean_ms", "count", "error_rate",
+                "bytes", "input_tokens", "output_tokens", "cache_hits", "cache_misses"]],
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "p50_ms": st.column_config.NumberColumn("p50 (ms)", format="%.0f"),
+                "p95_ms": st.column_config.NumberColumn("p95 (ms)", format="%.0f"),
+                "p99_ms": st.column_config.NumberColumn("p99 (ms)", format="%.0f"),
+                "mean_ms": st.column_config.NumberColumn("mean (ms)", format="%.0f"),
+                "error_rate": st.column_config.NumberColumn("errors", format="percent")
+            }
+        )
+    else:
+        st.info("No spans recorded yet.")
+
+    st.markdown("### Model health")
+    health = get_model_health()
+    models = sorted({m for route in MODEL_ROUTES.values() for m in (route["primary"], route.get("fallback")) if m})
+    st.dataframe(pd.DataFrame([dict(model=m, **health.stats(m)) for m in models]), use_container_width=True, hide_index=True)
+
+    st.markdown("### OpenAI rate limits")
+    limits = get_rate_limiter().stats()
+    if limits:
+        st.dataframe(pd.DataFrame(limits), use_container_width=True, hide_index=True)
+    else:
+        st.info("No OpenAI requests sent yet.")
+
+    prometheus = metrics.prometheus()
+    st.download_button("📥 Download Prometheus metrics", prometheus, file_name="metrics.prom", mime="text/plain")
+    if METRICS_PORT:
+        st.caption(f"Also served for scraping at :{METRICS_PORT}/metrics")
+    with st.expander("Prometheus text"):
+        st.code(prometheus, language="text")
+
+# === OPENAI CLIENT ===
+@st.cache_resource(show_spinner=False)
+def get_openai_client():
+    """Create the OpenAI client and verify the API key once per process"""
+    try:
+        api_key = st.secrets["OPENAI_API_KEY"]
+        if not api_key:
+            raise ValueError("API key is empty")
+        client = OpenAI(api_key=api_key, max_retries=0)  # Retries go through the rate limiter instead
+        # Test the client with a simple call
+        with span("openai_models"):
+            client.models.list()
+        return client
+    except Exception as e:
+        raise RuntimeError(
+            f"Error initializing OpenAI client: {str(e)}. "
+            "Please check your secrets.toml file and make sure it contains a valid OPENAI_API_KEY"
+        ) from e
+
+# === RATE LIMITING ===
+# Starting limits per model; the x-ratelimit-* headers of the first response replace them
+OPENAI_DEFAULT_RPM = 500
+OPENAI_DEFAULT_TPM = 30_000
+OPENAI_INITIAL_CONCURRENCY = 8  # In-flight requests per model before the limiter has learned anything
+OPENAI_MAX_CONCURRENCY = 64
+OPENAI_MAX_RETRIES = 5  # Retries after a 429 before giving up
+OPENAI_MAX_SERVER_ERROR_RETRIES = 2  # As the OpenAI client did; after that the router tries the other model
+OPENAI_BACKOFF_SECONDS = 1.0  # First wait when the server gave no hint; doubles on each retry
+OPENAI_MAX_BACKOFF_SECONDS = 60
+OPENAI_DECREASE_COOLDOWN_SECONDS = 5  # A burst of 429s halves concurrency once, not once per request
+RATE_LIMIT_RESET_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+
+def parse_reset_duration(value):
+    """Seconds in an x-ratelimit-reset-* value such as 1s, 6m0s or 20ms"""
+    units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(amount) * units[unit] for amount, unit in RATE_LIMIT_RESET_PATTERN.findall(value or ""))
+
+def retry_delay(headers, attempt):
+    """How long to wait before retrying: retry-after if the server sent it, else the reset hints, else backoff"""
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass  # An HTTP date; fall through to our own estimate
+    resets = [parse_reset_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+              for kind in ("requests", "tokens") if headers.get(f"x-ratelimit-remaining-{kind}") == "0"]
+    if any(resets):
+        return max(resets)
+    backoff = min(OPENAI_MAX_BACKOFF_SECONDS, OPENAI_BACKOFF_SECONDS * 2 ** attempt)
+    return backoff / 2 + random.uniform(0, backoff / 2)  # Jitter so throttled workers do not retry in lockstep
+
+class TokenBucket:
+    """Capacity per minute, refilled continuously; the owning limiter holds the lock"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self._updated_at = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self._updated_at) * self.capacity / 60)
+        self._updated_at = now
+
+    def wait_time(self, amount, now):
+        """Seconds until amount is available (requests larger than capacity only wait for a full bucket)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) * 60 / self.capacity
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+    def sync(self, limit, remaining, now):
+        """Adopt the server's limit and never assume more headroom than it reported"""
+        self._refill(now)
+        self.capacity = limit
+        self.level = min(self.level, remaining)
+
+class ModelRateLimiter:
+    """Request and token buckets plus an AIMD concurrency limit for one model
+
+    Every successful call raises the concurrency limit by 1/limit (about one per
+    round of calls); a 429 halves it and pauses new calls for the retry delay.
+    """
+
+    def __init__(self, model, rpm=OPENAI_DEFAULT_RPM, tpm=OPENAI_DEFAULT_TPM,
+                 concurrency=OPENAI_INITIAL_CONCURRENCY):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.concurrency = float(concurrency)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.throttled = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, tokens):
+        """Block until a call of about this many tokens fits every limit; returns the seconds waited"""
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wait = max(self.paused_until - now, self.requests.wait_time(1, now),
+                           self.tokens.wait_time(tokens, now))
+                if wait <= 0 and self.in_flight < int(self.concurrency):
+                    break
+                self._cond.wait(timeout=wait if wait > 0 else None)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.in_flight += 1
+        return time.monotonic() - start
+
+    def release(self, ok):
+        """Free a slot; only completed calls count towards growing the concurrency limit"""
+        with self._cond:
+            self.in_flight -= 1
+            if ok:
+                self.concurrency = min(OPENAI_MAX_CONCURRENCY, self.concurrency + 1 / self.concurrency)
+            self._cond.notify_all()
+
+    def throttle(self, delay):
+        """React to a 429: halve concurrency (once per cooldown) and hold new calls for delay seconds"""
+        with self._cond:
+            now = time.monotonic()
+            self.throttled += 1
+            self.paused_until = max(self.paused_until, now + delay)
+            if now - self._last_decrease >= OPENAI_DECREASE_COOLDOWN_SECONDS:
+                self.concurrency = max(1.0, self.concurrency / 2)
+                self._last_decrease = now
+            self._cond.notify_all()
+
+    def sync(self, headers):
+        """Update both buckets from the x-ratelimit-* headers of a response"""
+        with self._cond:
+            now = time.monotonic()
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                try:
+                    limit = float(headers[f"x-ratelimit-limit-{kind}"])
+                    remaining = float(headers[f"x-ratelimit-remaining-{kind}"])
+                except (KeyError, ValueError):
+                    continue
+                if limit > 0:
+                    bucket.sync(limit, remaining, now)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            self.requests._refill(now)
+            self.tokens._refill(now)
+            return {
+                "model": self.model,
+                "concurrency": round(self.concurrency, 1),
+                "in_flight": self.in_flight,
+                "rpm": int(self.requests.capacity),
+                "requests_left": int(self.requests.level),
+                "tpm": int(self.tokens.capacity),
+                "tokens_left": int(self.tokens.level),
+                "throttled": self.throttled,
+                "paused_for": round(max(0.0, self.paused_until - now), 1)
+            }
+
+class OpenAIRateLimiter:
+    """One limiter per model, since OpenAI enforces its limits per model"""
+
+    def __init__(self, limits=None):
+        self.limits = limits or {}  # model -> {"rpm", "tpm"} starting values
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def for_model(self, model):
+        with self._lock:
+            if model not in self._models:
+                limits = self.limits.get(model, {})
+                self._models[model] = ModelRateLimiter(
+                    model,
+                    rpm=limits.get("rpm", OPENAI_DEFAULT_RPM),
+                    tpm=limits.get("tpm", OPENAI_DEFAULT_TPM)
+                )
+            return self._models[model]
+
+    def stats(self):
+        with self._lock:
+            limiters = list(self._models.values())
+        return [limiter.stats() for limiter in limiters]
+
+@st.cache_resource
+def get_rate_limiter():
+    """Process-wide OpenAI rate limiter; seed known limits in secrets.toml under [openai_rate_limits."<model>"]"""
+    try:
+        limits = {model: dict(values) for model, values in st.secrets.get("openai_rate_limits", {}).items()}
+    except Exception:
+        limits = {}  # No secrets file; learn the limits from response headers
+    return OpenAIRateLimiter(limits)
+
+def create_rate_limited(model, estimated_tokens, on_start=None, **params):
+    """Send a chat completion request once the model's limits allow it, retrying 429s and server errors
+
+    Returns the parsed response and the limiter; the caller must call
+    limiter.release() once it has finished reading the response (streams included).
+    on_start is called once, when the limiter first lets the request through.
+    """
+    limiter = get_rate_limiter().for_model(model)
+    client = get_openai_client()
+    for attempt in range(OPENAI_MAX_RETRIES + 1):
+        get_metrics().record("openai_rate_limit_wait", {"model": model}, limiter.acquire(estimated_tokens))
+        if on_start is not None and attempt == 0:
+            on_start()
+        try:
+            raw = client.chat.completions.with_raw_response.create(model=model, **params)
+        except RateLimitError as e:
+            limiter.release(ok=False)
+            if e.code == "insufficient_quota" or attempt == OPENAI_MAX_RETRIES:
+                raise  # Out of credit is not going to clear up by waiting
+            delay = retry_delay(e.response.headers, attempt)
+            limiter.sync(e.response.headers)
+            limiter.throttle(delay)
+            logger.warning("OpenAI rate limit on %s; retrying in %.1fs (attempt %d)", model, delay, attempt + 1)
+            continue
+        except (APIConnectionError, InternalServerError) as e:
+            limiter.release(ok=False)
+            if attempt >= OPENAI_MAX_SERVER_ERROR_RETRIES:
+                raise
+            delay = retry_delay(e.response.headers if getattr(e, "response", None) is not None else {}, attempt)
+            logger.warning("OpenAI request to %s failed (%s); retrying in %.1fs", model, e, delay)
+            time.sleep(delay)
+            continue
+        except Exception:
+            limiter.release(ok=False)
+            raise
+        limiter.sync(raw.headers)
+        return raw.parse(), limiter
+
+# === LLM RESPONSE CACHE ===
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm_cache.sqlite3"))
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60  # Reuse answers for up to a week
+LLM_CACHE_MAX_ENTRIES = 5000
+
+class LLMCache:
+    """Disk-backed LRU cache of chat completion responses with a TTL"""
+
+    def __init__(self, path, ttl_seconds=LLM_CACHE_TTL_SECONDS, max_entries=LLM_CACHE_MAX_ENTRIES):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model, messages, **params):
+        """Hash the model, messages and sampling parameters into a cache key"""
+        payload = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached response for key, or None if missing or expired"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def record_miss(self):
+        """Count a lookup that bypassed the cache, under the same lock as get()"""
+        with self._lock:
+            self.misses += 1
+
+    def set(self, key, response):
+        """Store a response and evict the least recently used entries beyond max_entries"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            overflow = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN "
+                    "(SELECT key FROM llm_cache ORDER BY accessed_at ASC LIMIT ?)",
+                    (overflow,)
+                )
+            self._conn.commit()
+
+    def stats(self):
+        """Return hit/miss counters and the current number of entries"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": entries
+        }
+
+@st.cache_resource
+def get_llm_cache():
+    """Process-wide LLM response cache shared by every session"""
+    return LLMCache(LLM_CACHE_PATH)
+
+def create_chat_completion(messages, model="gpt-4", temperature=0.7, max_tokens=1000, force_refresh=False,
+                           on_token=None, response_format=None, feature="chat", on_start=None):
+    """Return the completion text for messages, serving repeated requests from the LLM cache
+
+    When on_token is given the completion is streamed and on_token is called with
+    the text received so far after every chunk. Token usage is logged under feature.
+    on_start is called when the request is sent, after any wait for the rate limiter.
+    """
+    cache = get_llm_cache()
+    params = {"temperature": temperature, "max_tokens": max_tokens}
+    if response_format:
+        params["response_format"] = response_format
+    key = cache.make_key(model, messages, **params)
+    with span("openai_chat", feature=feature, model=model) as attrs:
+        attrs["cache"] = False
+        if not force_refresh:
+            cached = cache.get(key)
+            if cached is not None:
+                attrs["cache"] = True
+                if on_token:
+                    on_token(cached)
+                return cached
+        else:
+            cache.record_miss()
+
+        estimated_tokens = count_message_tokens(messages, model) + max_tokens  # How OpenAI counts a request against TPM
+        if on_token is None:
+            completion, limiter = create_rate_limited(model, estimated_tokens, on_start=on_start, messages=messages,
+                                                      **params)
+            limiter.release(ok=True)
+            content = completion.choices[0].message.content
+            usage = completion.usage
+        else:
+            stream, limiter = create_rate_limited(
+                model,
+                estimated_tokens,
+                on_start=on_start,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},  # Usage arrives in a final chunk without choices
+                **params
+            )
+            parts = []
+            usage = None
+            finished = False
+            try:
+                with stream:
+                    for chunk in stream:
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            parts.append(delta)
+                            on_token("".join(parts))
+                        if getattr(chunk, "usage", None):
+                            usage = chunk.usage
+                finished = True
+            except RequestCancelled:
+                attrs["cancelled"] = True  # Lost a hedged race; not an error
+                raise
+            finally:
+                limiter.release(ok=finished)
+            content = "".join(parts)
+
+        attrs["input_tokens"], attrs["output_tokens"] = log_token_usage(feature, model, messages, content, usage)
+        attrs["bytes"] = len(content.encode("utf-8"))
+        cache.set(key, content)
+        return content
+
+def log_token_usage(feature, model, messages, content, usage):
+    """Log input/output tokens for a call, counting locally when the API did not report usage"""
+    if usage is not None:
+        input_tokens, output_tokens = usage.prompt_tokens, usage.completion_tokens
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", None) or 0
+    else:
+        input_tokens, output_tokens = count_message_tokens(messages, model), count_tokens(content or "", model)
+        cached_tokens = 0
+    logger.info("LLM %s (%s): %d input tokens (%d cached), %d output tokens",
+                feature, model, input_tokens, cached_tokens, output_tokens)
+    return input_tokens, output_tokens
+
+class StreamingMarkdown:
+    """Render streamed LLM output into a placeholder and record time-to-first-token"""
+
+    def __init__(self, css_class, label, min_interval=0.05):
+        self.css_class = css_class
+        self.label = label
+        self.min_interval = min_interval  # Seconds between re-renders, so long answers don't flood the browser
+        self.placeholder = st.empty()
+        self.started_at = time.perf_counter()
+        self.first_token_at = None
+        self._last_render = 0.0
+
+    def __call__(self, text):
+        now = time.perf_counter()
+        if self.first_token_at is None:
+            self.first_token_at = now
+        if now - self._last_render >= self.min_interval:
+            self._render(text + " ▌")
+            self._last_render = now
+
+    def _render(self, text):
+        self.placeholder.markdown(f"""
+        <div class="{self.css_class}">
+            {text}
+        </div>
+        """, unsafe_allow_html=True)
+
+    @property
+    def time_to_first_token(self):
+        return self.first_token_at - self.started_at if self.first_token_at is not None else None
+
+    def finish(self, text, show=True):
+        """Render the final text (or clear the draft) and report latency"""
+        total = time.perf_counter() - self.started_at
+        if show:
+            self._render(text)
+        else:
+            self.placeholder.empty()
+        ttft = self.time_to_first_token
+        if ttft is not None:
+            logger.info("%s: first token after %.2fs, completed in %.2fs", self.label, ttft, total)
+            st.caption(f"⏱️ First token after {ttft:.2f}s · completed in {total:.1f}s")
+
+def show_llm_cache_stats():
+    """Show LLM cache hit/miss counters in the sidebar"""
+    stats = get_llm_cache().stats()
+    st.sidebar.caption(
+        f"🗄️ LLM cache: {stats['hits']} hits · {stats['misses']} misses "
+        f"({stats['hit_rate']:.0%} hit rate, {stats['entries']} entries)"
+    )
+
+# === MODEL ROUTING ===
+# Per-feature model settings; override any of them in secrets.toml under [model_routes.<feature>].
+# hedge_after is how long to wait for the first token (or the whole answer when not streaming)
+# before sending the same request to the fallback model and taking whichever answers first.
+MODEL_ROUTES = {
+    "company_summary": {"primary": "gpt-4", "fallback": "gpt-4o-mini", "temperature": 0.7, "max_tokens": 1000, "hedge_after": 8.0},
+    "company_intelligence": {"primary": "gpt-4", "fallback": "gpt-4o-mini", "temperature": 0.7, "max_tokens": 1000, "hedge_after": 10.0},
+    "prep_sheet": {"primary": "gpt-4", "fallback": "gpt-4o-mini", "temperature": 0.7, "max_tokens": 1000, "hedge_after": 10.0},
+    "bulk_company_summary": {"primary": "gpt-4o", "fallback": "gpt-4o-mini", "temperature": 0.7, "max_tokens": 2000, "hedge_after": 45.0},
+    "trigger_classification": {"primary": "gpt-4o-mini", "fallback": "gpt-4o", "temperature": 0, "max_tokens": 500, "hedge_after": 15.0}
+}
+MODEL_HEALTH_WINDOW_SECONDS = 5 * 60  # Only recent calls count towards a model's health
+MODEL_HEALTH_MIN_CALLS = 5  # Calls needed in the window before a model can be judged unhealthy
+MODEL_MAX_ERROR_RATE = 0.5
+MODEL_ROUTING_WORKERS = 64  # Above MAX_SUMMARY_CONCURRENCY so queued requests are not hedged as slow
+
+def get_model_route(feature):
+    """Routing settings for a feature, with any secrets.toml overrides applied"""
+    route = dict(MODEL_ROUTES[feature])
+    try:
+        route.update(st.secrets.get("model_routes", {}).get(feature, {}))
+    except Exception:
+        pass  # No secrets file; use the defaults
+    return route
+
+class ModelHealth:
+    """Recent latency and error rate per model, shared by every session"""
+
+    def __init__(self, window_seconds=MODEL_HEALTH_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self._calls = {}  # model -> deque of (finished_at, ok, latency)
+        self._lock = threading.Lock()
+
+    def record(self, model, ok, latency):
+        with self._lock:
+            calls = self._calls.setdefault(model, deque(maxlen=200))
+            calls.append((time.time(), ok, latency))
+
+    def _recent(self, model):
+        cutoff = time.time() - self.window_seconds
+        with self._lock:
+            return [call for call in self._calls.get(model, ()) if call[0] >= cutoff]
+
+    def stats(self, model):
+        """Call count, error rate and median latency of successful calls in the window"""
+        calls = self._recent(model)
+        latencies = sorted(latency for _, ok, latency in calls if ok)
+        return {
+            "calls": len(calls),
+            "error_rate": sum(1 for _, ok, _ in calls if not ok) / len(calls) if calls else 0.0,
+            "p50_latency": latencies[len(latencies) // 2] if latencies else None
+        }
+
+    def is_degraded(self, model, hedge_after):
+        """True when a model has recently been failing, or is slow enough that most calls get hedged"""
+        stats = self.stats(model)
+        if stats["calls"] < MODEL_HEALTH_MIN_CALLS:
+            return False
+        return stats["error_rate"] > MODEL_MAX_ERROR_RATE or (
+            stats["p50_latency"] is not None and stats["p50_latency"] > hedge_after
+        )
+
+@st.cache_resource
+def get_model_health():
+    """Process-wide model health tracker"""
+    return ModelHealth()
+
+@st.cache_resource
+def get_model_executor():
+    """Threads that run routed model requests, so a slow call can be hedged"""
+    return ThreadPoolExecutor(max_workers=MODEL_ROUTING_WORKERS, thread_name_prefix="model")
+
+class RequestCancelled(Exception):
+    """Raised inside a streaming request that lost a hedged race, to stop reading it"""
+
+def route_chat_completion(feature, messages, on_token=None, force_refresh=False, response_format=None,
+                          max_tokens=None):
+    """Run a chat completion for a feature on its configured model, hedging and falling back
+
+    The primary model is used unless recent calls show it failing or slow, in which
+    case the fallback is tried first. If the chosen model errors, the other one is
+    asked; if it is too slow, the other one is asked as well and the first answer wins.
+    Tokens are only forwarded to on_token from the request currently leading.
+    """
+    with span("llm_request", feature=feature):
+        return _route_chat_completion(feature, messages, on_token, force_refresh, response_format, max_tokens)
+
+def _route_chat_completion(feature, messages, on_token, force_refresh, response_format, max_tokens):
+    route = get_model_route(feature)
+    health = get_model_health()
+    models = [route["primary"]] + ([route["fallback"]] if route.get("fallback") else [])
+    if len(models) == 2 and health.is_degraded(models[0], route["hedge_after"]) \
+            and not health.is_degraded(models[1], route["hedge_after"]):
+        logger.warning("Routing %s to %s while %s is degraded", feature, models[1], models[0])
+        models.reverse()
+
+    events = queue.Queue()
+    attempts = {}  # model -> {"started_at", "cancelled"}; started_at stays None while queued or rate limited
+
+    def start(model):
+        attempt = {"started_at": None, "cancelled": threading.Event()}
+        attempts[model] = attempt
+
+        def on_start():
+            attempt["started_at"] = time.perf_counter()
+            events.put(("started", model, None))
+
+        def forward(text):
+            if attempt["cancelled"].is_set():
+                raise RequestCancelled()
+            events.put(("token", model, text))
+
+        def run():
+            try:
+                content = create_chat_completion(
+                    messages,
+                    model=model,
+                    temperature=route["temperature"],
+                    max_tokens=max_tokens or route["max_tokens"],
+                    force_refresh=force_refresh,
+                    on_token=forward if on_token else None,
+                    response_format=response_format,
+                    feature=feature,
+                    on_start=on_start
+                )
+                events.put(("done", model, content))
+            except Exception as e:
+                events.put(("error", model, e))
+
+        get_model_executor().submit(run)
+
+    def latency(attempt):
+        """Seconds since the request was sent, leaving out time spent queued or rate limited"""
+        return time.perf_counter() - attempt["started_at"] if attempt["started_at"] is not None else None
+
+    start(models[0])
+    remaining = models[1:]
+    leader = None
+    last_error = None
+    while True:
+        # Hedge while the only request in flight has been sent but made no progress for hedge_after seconds
+        waiting_on_one = remaining and len(attempts) == 1 and leader is None
+        elapsed = latency(attempts[models[0]]) if waiting_on_one else None
+        timeout = route["hedge_after"] - elapsed if elapsed is not None else None
+        try:
+            kind, model, payload = events.get(timeout=max(timeout, 0) if timeout is not None else None)
+        except queue.Empty:
+            logger.info("Hedging %s: no answer from %s after %.1fs, also asking %s",
+                        feature, models[0], route["hedge_after"], remaining[0])
+            start(remaining.pop(0))
+            continue
+
+        attempt = attempts[model]
+        if attempt["cancelled"].is_set() or kind == "started":
+            continue
+        if kind == "token":
+            if leader is None:
+                leader = model
+            if model == leader:
+                on_token(payload)
+        elif kind == "done":
+            if attempt["started_at"] is not None:  # Cache hits say nothing about the model
+                health.record(model, True, latency(attempt))
+            for other, other_attempt in attempts.items():
+                if other != model and not other_attempt["cancelled"].is_set():
+                    # A loser that was sent counts as slow; streaming losers stop at their next token
+                    other_attempt["cancelled"].set()
+                    if other_attempt["started_at"] is not None:
+                        health.record(other, True, latency(other_attempt))
+            if model != models[0]:
+                logger.info("%s answered by %s", feature, model)
+            return payload
+        else:
+            health.record(model, False, latency(attempt) or 0.0)
+            attempt["cancelled"].set()
+            last_error = payload
+            logger.warning("%s request to %s failed: %s", feature, model, payload)
+            if leader == model:
+                leader = None
+            if remaining:
+                start(remaining.pop(0))
+            elif all(a["cancelled"].is_set() for a in attempts.values()):
+                raise last_error
+
+# === PROMPTS ===
+PROMPT_NEWS_DESCRIPTION_TOKENS = 60  # Longest description kept per news item
+PROMPT_MESSAGE_OVERHEAD_TOKENS = 4  # Role and separators the API adds around each message
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+@st.cache_resource(show_spinner=False)
+def get_token_encoding(model):
+    """tiktoken encoding for model, or None to fall back to estimating"""
+    if tiktoken is None:
+        return None
     try:
-        prompt = f"""You are a business intelligence analyst. Create a comprehensive summary for {company_name} with the following sections:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # Encodings are downloaded on first use; estimate when offline
+        logger.warning("tiktoken encoding unavailable, estimating token counts")
+        return None
+
+def count_tokens(text, model="gpt-4"):
+    """Count tokens in text with the model's tokenizer (about 4 characters per token without tiktoken)"""
+    encoding = get_token_encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+def count_message_tokens(messages, model="gpt-4"):
+    """Count the input tokens a list of chat messages will use"""
+    return sum(count_tokens(m["content"], model) + PROMPT_MESSAGE_OVERHEAD_TOKENS for m in messages) + 3
+
+def truncate_to_tokens(text, max_tokens, model="gpt-4"):
+    """Cut text to at most max_tokens, ending with an ellipsis when shortened"""
+    encoding = get_token_encoding(model)
+    if encoding is None:
+        return text if len(text) <= max_tokens * 4 else text[:max_tokens * 4].rstrip() + "…"
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens]).rstrip() + "…"
+
+def rank_news_articles(articles, company_name):
+    """Order articles by how directly they mention the company, then newest first"""
+    name = core_company_name(company_name).lower()
+
+    def rank(article):
+        mentions = 2 * (name in article['title'].lower()) + (name in article['description'].lower())
+        return mentions, article['pub_date']
+
+    return sorted(articles, key=rank, reverse=True)
+
+class PromptBuilder:
+    """Assemble chat messages as a static prefix followed by per-request context
+
+    The system message and instructions are byte-identical for every request so
+    the provider can reuse its prompt cache; the company details and news are
+    appended at the end, with the news trimmed to fit the feature's input budget.
+    """
+
+    def __init__(self, feature, system, instructions, input_budget):
+        self.feature = feature
+        self.system = system
+        self.instructions = instructions
+        self.input_budget = input_budget
+
+    @property
+    def model(self):
+        """Model whose tokenizer is used for budgeting"""
+        return get_model_route(self.feature)["primary"]
+
+    def build(self, context, articles=None, company_name=None):
+        """Return (messages, stats) with as many of the most relevant articles as fit the budget"""
+        messages = [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": f"{self.instructions}\n\n{context}"}
+        ]
+        if articles is None:
+            return messages, {"input_tokens": count_message_tokens(messages, self.model), "news_items": 0}
+
+        header = "\n\nRecent News:\n"
+        used = count_message_tokens(messages, self.model) + count_tokens(header, self.model)
+        items = []
+        ranked = rank_news_articles(articles, company_name) if company_name else articles
+        for article in ranked:
+            item = self.format_news_item(article)
+            item_tokens = count_tokens(item + "\n", self.model)
+            if used + item_tokens > self.input_budget:
+                continue
+            items.append(item)
+            used += item_tokens
+        news = "\n".join(items) if items else "No recent news available."
+        messages[1]["content"] += header + news
+        if len(items) < len(articles):
+            logger.info("%s prompt: kept %d of %d news items to stay within %d input tokens",
+                        self.feature, len(items), len(articles), self.input_budget)
+        return messages, {"input_tokens": count_message_tokens(messages, self.model), "news_items": len(items)}
+
+    def format_news_item(self, article):
+        """One compact line per article; links are left out because the model cannot follow them"""
+        try:
+            date = datetime.strptime(article['pub_date'], "%Y-%m-%d %H:%M:%S").strftime("%b %d, %Y")
+        except ValueError:
+            date = article['pub_date']
+        description = truncate_to_tokens(" ".join(article['description'].split()), PROMPT_NEWS_DESCRIPTION_TOKENS, self.model)
+        return f"- {date} — {article['title']}: {description}"
+
+    def complete(self, context, articles=None, company_name=None, **kwargs):
+        """Build the prompt and run it on the feature's routed model"""
+        messages, _ = self.build(context, articles, company_name)
+        return route_chat_completion(self.feature, messages, **kwargs)
+
+SECTION_MAX_TOKENS = 300  # Output budget per section of a sectioned document
+SECTION_RETRIES = 1  # Follow-up requests for sections missing from or malformed in an answer
+PARTIAL_JSON_STRING = re.compile(r'"((?:[^"\\]|\\.)*)"(\s*:)?')  # Complete strings (and keys) in streamed JSON
+
+def section_bullets(value):
+    """Validate one section of a JSON answer as a list of non-empty bullet strings, or None"""
+    if isinstance(value, str):
+        value = [line.strip(" -*") for line in value.splitlines()]
+    if not isinstance(value, list):
+        return None
+    bullets = [str(bullet).strip() for bullet in value if str(bullet).strip()]
+    return bullets or None
+
+def news_fingerprint(articles):
+    """Short hash of the articles a news-dependent section was written from"""
+    items = sorted((a['title'], a['pub_date'], a.get('link') or "") for a in articles or [])
+    return hashlib.sha256(json.dumps(items).encode("utf-8")).hexdigest()[:16]
+
+class SectionedPrompt:
+    """A document generated as schema-checked JSON sections, each cached on its own
+
+    Sections marked news are keyed on the articles they were written from and the
+    rest only on the company context, so when just the news changes only the news
+    sections are requested again, with a prompt that describes only those sections.
+    """
+
+    def __init__(self, feature, system, intro, sections, closing, input_budget):
+        self.feature = feature
+        self.system = system
+        self.intro = intro
+        self.sections = sections  # key -> {"title", "news", "guidance"}
+        self.closing = closing
+        self.input_budget = input_budget
+        self._builders = {}  # tuple of section keys -> PromptBuilder
+
+    def builder(self, keys):
+        """PromptBuilder asking for just these sections; its prefix is static for each set of keys"""
+        keys = tuple(keys)
+        if keys not in self._builders:
+            guidance = "\n".join(f"- {key}: {self.sections[key]['guidance']}" for key in keys)
+            instructions = (
+                f"{self.intro}\n\n"
+                'Return a JSON object of the form:\n{"sections": {"<section>": ["<bullet>", ...]}}\n\n'
+                f"Include exactly these sections, each a list of 3-5 short bullet strings:\n{guidance}\n\n"
+                f"{self.closing}"
+            )
+            self._builders[keys] = PromptBuilder(self.feature, self.system, instructions, self.input_budget)
+        return self._builders[keys]
+
+    def cache_key(self, key, context, fingerprint):
+        section = self.sections[key]
+        return LLMCache.make_key(self.feature, [{"role": "user", "content": context}], section=key,
+                                 guidance=section["guidance"], news=fingerprint if section["news"] else None)
+
+    def parse(self, content, keys):
+        """Sections from a JSON answer that pass validation; anything else is left out to be retried"""
+        try:
+            sections = json.loads(content).get("sections")
+        except (ValueError, AttributeError):
+            return {}
+        if not isinstance(sections, dict):
+            return {}
+        parsed = {key: section_bullets(sections.get(key)) for key in keys}
+        return {key: bullets for key, bullets in parsed.items() if bullets}
+
+    def parse_partial(self, text):
+        """Bullets completed so far in a streaming JSON answer, for live previews"""
+        sections, current = {}, None
+        for match in PARTIAL_JSON_STRING.finditer(text):
+            try:
+                value = json.loads(f'"{match.group(1)}"')
+            except ValueError:
+                continue
+            if match.group(2):
+                current = value if value in self.sections else None
+            elif current is not None:
+                sections.setdefault(current, []).append(value)
+        return sections
+
+    def render(self, sections):
+        """Markdown with a bold header per section, in schema order"""
+        return "\n\n".join(
+            f"**{section['title']}:**\n" + "\n".join(f"- {bullet}" for bullet in sections[key])
+            for key, section in self.sections.items() if sections.get(key)
+        )
+
+    def complete(self, context, articles=None, company_name=None, force_refresh=False, on_token=None):
+        """Return {section key: bullets}, reusing cached sections and generating only the missing ones
+
+        Raises if the model returned no usable section at all; sections still missing
+        after the retries are left out of the result.
+        """
+        cache = get_llm_cache()
+        fingerprint = news_fingerprint(articles)
+        cache_keys = {key: self.cache_key(key, context, fingerprint) for key in self.sections}
+        sections = {}
+        if not force_refresh:
+            for key, cache_key in cache_keys.items():
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    sections[key] = json.loads(cached)
+        reused = len(sections)
+
+        missing = [key for key in self.sections if key not in sections]
+        for attempt in range(SECTION_RETRIES + 1):
+            if not missing:
+                break
+            known = dict(sections)
+            content = self.builder(missing).complete(
+                context,
+                # Stable sections are written from the company context alone
+                articles=(articles or []) if any(self.sections[key]["news"] for key in missing) else None,
+                company_name=company_name,
+                response_format={"type": "json_object"},
+                max_tokens=SECTION_MAX_TOKENS * len(missing),
+                force_refresh=force_refresh or attempt > 0,
+                on_token=(lambda text: on_token(self.render(dict(known, **self.parse_partial(text))))) if on_token else None
+            )
+            parsed = self.parse(content, missing)
+            for key, bullets in parsed.items():
+                cache.set(cache_keys[key], json.dumps(bullets))
+            sections.update(parsed)
+            missing = [key for key in missing if key not in parsed]
+            if missing:
+                logger.warning("%s answer missing sections %s (attempt %d)", self.feature, missing, attempt + 1)
+
+        if not sections:
+            raise ValueError("the model did not return any usable sections")
+        logger.info("%s: reused %d cached sections, generated %d", self.feature, reused,
+                    len(sections) - reused)
+        return {key: sections[key] for key in self.sections if key in sections}
+
+COMPANY_SUMMARY_PROMPT = PromptBuilder(
+    feature="company_summary",
+    input_budget=600,
+    system="You are a business intelligence analyst providing detailed company summaries. Your responses must be accurate, specific, and well-structured. Use markdown formatting with bold headers and bullet points for clarity.",
+    instructions="""You are a business intelligence analyst. Create a comprehensive summary for the company named at the end of this message with the following sections:
 
 **Company Overview:**
 - Brief description of the company's core business
@@ -219,21 +1283,307 @@ def generate_company_summary(company_name):
 - Digital initiatives that could drive growth
 
 Format your response using markdown with bold headers and bullet points. Be specific and data-driven where possible. Focus on actionable insights that would be valuable for a technology sales conversation."""
+)
 
-        completion = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are a business intelligence analyst providing detailed company summaries. Your responses must be accurate, specific, and well-structured. Use markdown formatting with bold headers and bullet points for clarity."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1000
+COMPANY_INTELLIGENCE_SECTIONS = {
+    "company_summary": {"title": "Company Summary", "news": False,
+                        "guidance": "core business model and market position, key products/services and value proposition, target markets and customer segments, strategic initiatives"},
+    "industry_trends": {"title": "Industry Trends", "news": False,
+                        "guidance": "major market dynamics and competitive landscape, regulatory or technological changes, economic factors affecting the sector, growth opportunities and threats"},
+    "workday_fit": {"title": "Workday Fit/Value", "news": False,
+                    "guidance": "current technology landscape and gaps, potential areas for digital transformation, specific Workday value propositions, ROI scenarios and business impact"},
+    "trigger_events": {"title": "Trigger Events", "news": True,
+                       "guidance": "from the recent news: executive changes or hires, funding rounds or financial developments, M&A activity or partnerships, office expansions or relocations, other strategic shifts"}
+}
+
+COMPANY_INTELLIGENCE_PROMPT = SectionedPrompt(
+    feature="company_intelligence",
+    input_budget=1200,
+    system="You are a senior business strategy expert providing executive-level company summaries. Focus on strategic insights, actionable intelligence, and clear business implications. Avoid generic statements and prioritize specific, data-driven insights. Respond with a single JSON object only.",
+    intro="As a senior business strategy expert, create a concise 1-page strategic summary for the company described at the end of this message. Focus on actionable insights and strategic implications.",
+    sections=COMPANY_INTELLIGENCE_SECTIONS,
+    closing="Focus on insights that would be valuable for a technology sales conversation. If information is not available for a section, say so in a single bullet."
+)
+
+BULK_SUMMARY_SECTIONS = {
+    "company_overview": "Company Overview",
+    "industry_trends": "Industry Trends",
+    "challenges_and_risks": "Known Challenges or Risks",
+    "tech_adoption_opportunities": "Opportunities for Tech Adoption"
+}
+
+BULK_SUMMARY_PROMPT = PromptBuilder(
+    feature="bulk_company_summary",
+    input_budget=1000,
+    system="You are a business intelligence analyst providing concise company summaries for many accounts at once. Respond with a single JSON object only.",
+    instructions="""Summarize every company listed at the end of this message for a technology sales team.
+
+Return a JSON object of the form:
+{"summaries": {"<id>": {"company": "<company name exactly as listed>", "company_overview": [...], "industry_trends": [...], "challenges_and_risks": [...], "tech_adoption_opportunities": [...]}}}
+
+Use the ids from the list as keys and include every listed company. Each section is a list of 3-4 short bullet strings:
+- company_overview: core business, key products or services, market position, recent developments
+- industry_trends: sector trends, competitive landscape, regulatory or technological changes
+- challenges_and_risks: current business challenges, market and operational risks
+- tech_adoption_opportunities: digital transformation areas, technology gaps, growth initiatives
+
+Be specific and data-driven where possible. Focus on actionable insights that would be valuable for a technology sales conversation."""
+)
+
+PREP_SHEET_SECTIONS = {
+    "strategic_context": {"title": "Strategic Business Context", "news": False,
+                          "guidance": "core business model and market position, key growth drivers and revenue streams, competitive dynamics and market share implications"},
+    "growth_triggers": {"title": "Growth Triggers & Risk Factors", "news": True,
+                        "guidance": "from the recent news: funding rounds and their strategic implications, M&A activity and integration challenges or opportunities, leadership changes and organizational impact, regulatory changes affecting the business model, market expansion or contraction signals"},
+    "technology_opportunities": {"title": "Technology Enablement Opportunities", "news": False,
+                                 "guidance": "current technology gaps affecting growth or margins, digital transformation initiatives in progress, specific areas where Workday could drive revenue expansion, margin improvement, risk mitigation or strategic advantage"},
+    "conversation_starters": {"title": "Executive Conversation Starters", "news": True,
+                              "guidance": "key business challenges to explore, strategic initiatives to align with, metrics that matter to the executive team, recent developments to reference, potential ROI scenarios to discuss"}
+}
+
+PREP_SHEET_PROMPT = SectionedPrompt(
+    feature="prep_sheet",
+    input_budget=1500,
+    system="You are a senior business strategy expert with deep experience in technology transformation. Your analysis should demonstrate strategic thinking, connect dots between recent developments and business outcomes, and focus on executive-level insights. Avoid generic statements and focus on specific, actionable insights that matter to C-level executives. Respond with a single JSON object only.",
+    intro="You are a senior business strategy expert preparing a high-level briefing for a technology sales executive on the company named at the end of this message. Focus on strategic implications, growth opportunities, and technology enablement.",
+    sections=PREP_SHEET_SECTIONS,
+    closing="""Important:
+- Use the exact company name given at the end of this message
+- Focus on strategic implications, not just facts
+- Connect recent news to business outcomes
+- Frame insights in terms of revenue, margin, and growth
+- Be specific and cite relevant information from the news
+- Maintain an executive-level perspective throughout"""
+)
+
+# === HTTP CLIENT ===
+HTTP_CONNECT_TIMEOUT = 5  # Seconds to establish a connection
+HTTP_READ_TIMEOUT = 20  # Seconds to wait between bytes of the response
+HTTP_MAX_RETRIES = 3
+HTTP_POOL_CONNECTIONS = 10  # Hosts whose connection pools are kept; the least recently used host is dropped
+HTTP_POOL_MAXSIZE = 20  # Keep-alive connections kept per host
+HTTP_REVALIDATION_MAX_ENTRIES = 500
+
+class HttpClient:
+    """Pooled HTTP client with timeouts, jittered retries and ETag / Last-Modified revalidation"""
+
+    def __init__(self, connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=HTTP_READ_TIMEOUT,
+                 max_retries=HTTP_MAX_RETRIES, pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE,
+                 max_revalidation_entries=HTTP_REVALIDATION_MAX_ENTRIES):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_revalidation_entries = max_revalidation_entries
+        retry = Retry(
+            total=max_retries,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            backoff_factor=0.5,
+            backoff_jitter=0.5,  # urllib3>=2
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = "TerritorySuite/1.0"
+        self._validators = OrderedDict()  # url -> cached validators and body for conditional GETs
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None, revalidate=False, max_bytes=None, stop_at=None, target="http", **kwargs):
+        """GET a URL; with revalidate=True a cached copy is reused when the server answers 304
+
+        With max_bytes the body is streamed and only its first max_bytes (or everything
+        up to and including the stop_at marker) is read before the connection is closed.
+        Each call is recorded as an http_get span labelled with target.
+        """
+        cache_key = f"{url}?{urlencode(sorted(params.items()))}" if params else url
+        if max_bytes is not None:
+            cache_key = f"{cache_key}#prefix={max_bytes}:{stop_at}"
+            kwargs["stream"] = True
+        headers = dict(kwargs.pop("headers", None) or {})
+        cached = None
+        if revalidate:
+            with self._lock:
+                cached = self._validators.get(cache_key)
+                if cached is not None:
+                    self._validators.move_to_end(cache_key)
+            if cached is not None:
+                if cached["etag"]:
+                    headers["If-None-Match"] = cached["etag"]
+                if cached["last_modified"]:
+                    headers["If-Modified-Since"] = cached["last_modified"]
+
+        with span("http_get", target=target) as attrs:
+            response = self.session.get(url, params=params, headers=headers, timeout=kwargs.pop("timeout", self.timeout), **kwargs)
+            response.revalidated = False
+            response.truncated = False
+            if max_bytes is not None:
+                self._read_prefix(response, max_bytes, stop_at)
+            attrs["bytes"] = len(response.content)
+            attrs["error"] = response.status_code >= 400
+            if revalidate:
+                attrs["cache"] = response.status_code == 304 and cached is not None
+
+        if response.status_code == 304 and cached is not None:
+            # Serve the body we already have; only the headers crossed the wire
+            response.status_code = 200
+            response._content = cached["content"]
+            response.encoding = cached["encoding"]
+            response.revalidated = True
+        elif revalidate and response.status_code == 200:
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if etag or last_modified:
+                self._remember(cache_key, {
+                    "etag": etag,
+                    "last_modified": last_modified,
+                    "content": response.content,
+                    "encoding": response.encoding
+                })
+        return response
+
+    @staticmethod
+    def _read_prefix(response, max_bytes, stop_at):
+        """Read the start of a streamed body into response.content and drop the rest"""
+        marker = stop_at.lower() if stop_at else None
+        body = bytearray()
+        try:
+            for chunk in response.iter_content(chunk_size=16 * 1024):
+                search_from = max(0, len(body) - len(marker) + 1) if marker else 0
+                body += chunk
+                if marker:
+                    end = body.lower().find(marker, search_from)
+                    if end != -1:
+                        del body[end + len(marker):]
+                        response.truncated = True
+                        break
+                if len(body) >= max_bytes:
+                    del body[max_bytes:]
+                    response.truncated = True
+                    break
+        finally:
+            response.close()
+        response._content = bytes(body)
+        response._content_consumed = True
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._validators[key] = entry
+            self._validators.move_to_end(key)
+            while len(self._validators) > self.max_revalidation_entries:
+                self._validators.popitem(last=False)
+
+@st.cache_resource
+def get_http_client():
+    """Process-wide pooled HTTP client for website scraping and news lookups"""
+    return HttpClient()
+
+# === CONCURRENCY ===
+SUMMARY_CONCURRENCY = 8  # Default number of in-flight OpenAI requests for CSV batches
+MAX_SUMMARY_CONCURRENCY = 32
+
+def run_concurrently(func, items, max_workers):
+    """Run func over items on a bounded thread pool, yielding (index, result, error) as each call finishes"""
+    with ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as executor:
+        futures = {executor.submit(func, item): i for i, item in enumerate(items)}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, e
+
+# === ACCOUNT SEARCH ===
+def generate_company_summary(company_name, force_refresh=False, on_token=None):
+    """Generate company summary using OpenAI"""
+    try:
+        return COMPANY_SUMMARY_PROMPT.complete(
+            f"Company: {company_name}",
+            force_refresh=force_refresh,
+            on_token=on_token
         )
-        
-        return completion.choices[0].message.content
     except Exception as e:
         return f"Error generating summary: {str(e)}"
 
+BULK_SUMMARY_BATCH_SIZE = 5  # Companies packed into one request by default
+MAX_BULK_SUMMARY_BATCH_SIZE = 10
+BULK_SUMMARY_TOKENS_PER_COMPANY = 450  # Output budget per company in a packed request
+BULK_SUMMARY_RETRIES = 1  # Packed retries for companies missing from the answer before asking one by one
+
+def bulk_summary_cache_key(company_name):
+    """LLM cache key for one company's share of a packed summary request"""
+    return LLMCache.make_key(BULK_SUMMARY_PROMPT.feature, [{"role": "user", "content": company_name}])
+
+def parse_bulk_summaries(content, batch):
+    """Validate a packed JSON answer and render each well-formed entry as markdown
+
+    batch maps the ids used in the prompt to company names. Entries that are missing,
+    name the wrong company or lack a section are left out so they can be retried.
+    """
+    try:
+        summaries = json.loads(content).get("summaries")
+    except (ValueError, AttributeError):
+        return {}
+    if not isinstance(summaries, dict):
+        return {}
+
+    results = {}
+    for company_id, company_name in batch.items():
+        entry = summaries.get(company_id)
+        if not isinstance(entry, dict) or normalize_company_name(entry.get("company", "")) != normalize_company_name(company_name):
+            continue
+        sections = []
+        for key, title in BULK_SUMMARY_SECTIONS.items():
+            bullets = section_bullets(entry.get(key))
+            if not bullets:
+                break
+            sections.append(f"**{title}:**\n" + "\n".join(f"- {bullet}" for bullet in bullets))
+        else:
+            results[company_name] = "\n\n".join(sections)
+    return results
+
+def generate_company_summaries_bulk(companies, force_refresh=False):
+    """Summarize several companies with one JSON request, returning {company: markdown or error}
+
+    Companies missing from the answer or malformed are retried together, then one
+    by one with generate_company_summary as a last resort.
+    """
+    cache = get_llm_cache()
+    results = {}
+    pending = list(dict.fromkeys(companies))
+    if not force_refresh:
+        for company_name in pending:
+            cached = cache.get(bulk_summary_cache_key(company_name))
+            if cached is not None:
+                results[company_name] = cached
+        pending = [company_name for company_name in pending if company_name not in results]
+
+    for attempt in range(BULK_SUMMARY_RETRIES + 1):
+        if not pending:
+            break
+        batch = {f"c{i}": company_name for i, company_name in enumerate(pending, start=1)}
+        try:
+            content = BULK_SUMMARY_PROMPT.complete(
+                "Companies:\n" + "\n".join(f"{company_id}: {name}" for company_id, name in batch.items()),
+                max_tokens=BULK_SUMMARY_TOKENS_PER_COMPANY * len(batch),
+                response_format={"type": "json_object"},
+                force_refresh=force_refresh or attempt > 0
+            )
+            parsed = parse_bulk_summaries(content, batch)
+        except Exception:
+            logger.exception("Packed summary request for %d companies failed", len(batch))
+            parsed = {}
+        for company_name, summary in parsed.items():
+            cache.set(bulk_summary_cache_key(company_name), summary)
+        results.update(parsed)
+        pending = [company_name for company_name in pending if company_name not in parsed]
+        if pending:
+            logger.warning("Packed summary missing %d of %d companies (attempt %d)",
+                           len(pending), len(batch), attempt + 1)
+
+    for company_name in pending:
+        results[company_name] = generate_company_summary(company_name, force_refresh=force_refresh)
+    return results
+
 def show_account_search():
     st.title("🔍 Account Search")
     
@@ -284,22 +1634,25 @@ def show_account_search():
     with tab1:
         st.markdown('<div class="search-container">', unsafe_allow_html=True)
         company_name = st.text_input("Enter Company Name", placeholder="e.g., Acme Corporation")
+        force_refresh = st.checkbox("Force refresh (skip cached summary)", key="search_force_refresh")
         if st.button("Search", key="search_name"):
             if company_name:
                 try:
+                    # Variants such as "Acme Inc." or "acme.com" share the summary of the known account
+                    account = get_account_registry().resolve(company_name)
+                    if account["name"] != company_name.strip():
+                        st.caption(f"Matched existing account **{account['name']}**")
+                    company_name = account["name"]
+                    # Stream the summary into a styled block as it is generated
+                    stream = StreamingMarkdown("response-text", f"Account Search summary for {company_name}")
                     with st.spinner("Generating company summary..."):
-                        # Generate summary
-                        summary = generate_company_summary(company_name)
-                        
-                        if summary.startswith("Error"):
-                            st.error(summary)
-                        else:
-                            # Display the summary in a styled block
-                            st.markdown(f"""
-                            <div class="response-text">
-                                {summary}
-                            </div>
-                            """, unsafe_allow_html=True)
+                        summary = generate_company_summary(company_name, force_refresh=force_refresh, on_token=stream)
+                    
+                    if summary.startswith("Error"):
+                        stream.finish(summary, show=False)
+                        st.error(summary)
+                    else:
+                        stream.finish(summary)
                             
                 except Exception as e:
                     st.error(f"An error occurred: {str(e)}")
@@ -317,83 +1670,419 @@ def show_account_search():
                 if 'Company Name' not in df.columns:
                     st.error("❌ CSV must contain a 'Company Name' column")
                 else:
-                    st.success(f"✅ Found {len(df)} companies")
-                    for company in df['Company Name']:
-                        with st.expander(f"🔍 {company}"):
-                            try:
-                                with st.spinner(f"Generating summary for {company}..."):
-                                    summary = generate_company_summary(company)
-                                    if summary.startswith("Error"):
-                                        st.error(summary)
+                    companies = df['Company Name'].dropna().astype(str).tolist()
+                    # Rows naming the same account (or one already researched) share a single summary
+                    account_names, unique_names = dedupe_accounts((name, None) for name in companies)
+                    rows_by_account = {}
+                    for i, name in enumerate(account_names):
+                        rows_by_account.setdefault(name, []).append(i)
+                    duplicates = len(companies) - len(unique_names)
+                    st.success(f"✅ Found {len(companies)} companies"
+                               + (f" ({len(unique_names)} unique accounts)" if duplicates else ""))
+                    max_workers = st.number_input(
+                        "Concurrent requests",
+                        min_value=1,
+                        max_value=MAX_SUMMARY_CONCURRENCY,
+                        value=SUMMARY_CONCURRENCY,
+                        step=1,
+                        help="Maximum number of requests in flight at the same time"
+                    )
+                    batch_size = st.number_input(
+                        "Companies per request",
+                        min_value=1,
+                        max_value=MAX_BULK_SUMMARY_BATCH_SIZE,
+                        value=BULK_SUMMARY_BATCH_SIZE,
+                        step=1,
+                        help="Pack several companies into each request to cut repeated instructions and rate-limit pressure; 1 sends one detailed request per company"
+                    )
+                    force_refresh = st.checkbox("Force refresh (skip cached summaries)", key="batch_force_refresh")
+                    # Results are kept per file and settings, so reruns and setting changes do not call OpenAI again
+                    batch_size = int(batch_size)
+                    results_key = f"account_search_{uploaded_file.file_id}_{int(max_workers)}_{batch_size}_{force_refresh}"
+                    started = st.button("Generate summaries", key="batch_start", type="primary")
+                    batch = st.session_state.get(results_key)
+                    if batch is None and not started:
+                        st.info("Choose the settings above, then click **Generate summaries**.")
+                    else:
+                        progress = st.progress(0.0, text=f"0 / {len(companies)} summaries generated")
+
+                        # Create every expander up front so results can fill in as they finish
+                        placeholders = []
+                        for company in companies:
+                            with st.expander(f"🔍 {company}"):
+                                placeholder = st.empty()
+                                placeholder.caption("⏳ Waiting for summary...")
+                                placeholders.append(placeholder)
+
+                        def show_summary(name, summary):
+                            for i in rows_by_account[name]:
+                                if summary.startswith("Error"):
+                                    placeholders[i].error(summary)
+                                else:
+                                    placeholders[i].markdown(f"""
+                                    <div class="response-text">
+                                        {summary}
+                                    </div>
+                                    """, unsafe_allow_html=True)
+
+                        if batch is None:
+                            # Each unit of work is a batch of accounts; a batch of one uses the detailed single prompt
+                            batches = [unique_names[start:start + batch_size] for start in range(0, len(unique_names), batch_size)]
+
+                            def summarize(names):
+                                if len(names) == 1:
+                                    return {names[0]: generate_company_summary(names[0], force_refresh=force_refresh)}
+                                return generate_company_summaries_bulk(names, force_refresh=force_refresh)
+
+                            start = time.perf_counter()
+                            summaries_by_name = {}
+                            done = 0
+                            for b, summaries, error in run_concurrently(summarize, batches, max_workers):
+                                for name in batches[b]:
+                                    if error is not None:
+                                        summary = f"Error generating summary for {name}: {str(error)}"
                                     else:
-                                        st.markdown(f"""
-                                        <div class="response-text">
-                                            {summary}
-                                        </div>
-                                        """, unsafe_allow_html=True)
-                            except Exception as e:
-                                st.error(f"Error generating summary for {company}: {str(e)}")
+                                        summary = summaries.get(name)
+                                    summaries_by_name[name] = summary
+                                    show_summary(name, summary)
+                                    done += len(rows_by_account[name])
+                                progress.progress(done / len(companies), text=f"{done} / {len(companies)} summaries generated")
+                            batch = {"summaries": summaries_by_name, "elapsed": time.perf_counter() - start}
+                            st.session_state[results_key] = batch
+                        else:
+                            for name, summary in batch["summaries"].items():
+                                show_summary(name, summary)
+                            progress.progress(1.0, text=f"{len(companies)} / {len(companies)} summaries generated")
+
+                        failed = sum(len(rows_by_account[name]) for name, summary in batch["summaries"].items()
+                                     if summary.startswith("Error"))
+                        elapsed = batch["elapsed"]
+                        if failed:
+                            st.warning(f"⚠️ {failed} of {len(companies)} summaries failed ({elapsed:.1f}s)")
+                        elif companies:
+                            st.caption(f"Generated {len(companies)} summaries in {elapsed:.1f}s")
             except Exception as e:
                 st.error(f"❌ Error processing file: {str(e)}")
         st.markdown('</div>', unsafe_allow_html=True)
 
-# === TOP TARGETS ===
-def fetch_company_intelligence(company_name, website):
-    """Generate strategic company summary using OpenAI"""
-    try:
-        # Get recent news
-        news = fetch_news(company_name)
-        
-        # Build the prompt for OpenAI
-        prompt = f"""As a senior business strategy expert, create a concise 1-page strategic summary for {company_name} ({website}). Focus on actionable insights and strategic implications.
+# === TRIGGER EVENTS ===
+TRIGGER_EVENT_TYPES = {
+    "funding": ("💰 Funding Update", "signal-funding"),
+    "exec_change": ("👥 Executive Change", "signal-hiring"),
+    "m_and_a": ("🤝 M&A Activity", "signal-news"),
+    "expansion": ("🏢 Expansion", "signal-news"),
+    "tech_stack": ("💻 Tech Signal", "signal-tech")
+}
 
-Recent News:
-{news if news else 'No recent news available.'}
+# One alternation with a named group per event type, so each text is scanned once.
+# "raise" only counts next to money or round words, so "raised concerns" is not funding,
+# and "secure" only next to funding words, so "secures its network" is not either.
+TRIGGER_PATTERN = re.compile(r"""
+    (?P<funding>\b(?:(?:raise[sd]?|raising)\s+(?:\S+\s+){0,3}?(?:\$|[\d.,]+\s*(?:million|billion|mn|bn|m|b)\b
+            |million\b|billion\b|series\s+[a-h]\b|(?:seed|funding|financing)\s+round\b|round\b)
+        |funding\s+round|series\s+[a-h]\b|seed\s+round|venture\s+capital
+        |growth\s+equity|secures?\s+\$|closes?\s+\$[\d.,]+\s*[mb]|ipo\b|goes\s+public|valuation
+        |secur(?:e|es|ed|ing)\s+(?:\S+\s+){0,4}?(?:funding|investment|financing)\b))
+  | (?P<exec_change>\b(?:appoint(?:s|ed|ment)?
+        |name[sd]?\s+(?:\S+\s+){0,3}?(?:as\s+)?(?:its\s+)?(?:new\s+)?(?:ceo|cfo|cio|cto|chro|coo|president|chief)\b
+        |hire[sd]?\s+(?:a\s+|its\s+)?(?:new\s+)?(?:chief|ceo|cfo|cio|cto|chro|coo|vp|head)
+        |step(?:s|ped)?\s+down|resign(?:s|ed|ation)?|depart(?:s|ed)\b
+        |new\s+(?:ceo|cfo|cio|cto|chro|coo)
+        |joins?\s+(?:\S+\s+){0,3}?as\s+(?:its\s+)?(?:new\s+)?(?:chief|ceo|cfo|cio|cto|chro|coo|president)\b))
+  | (?P<m_and_a>\b(?:acquir(?:e|es|ed|ing|ition)|merg(?:e|es|ed|er|ing)|buyout|takeover|divest(?:s|ed|iture)?
+        |m&a\b|(?:bought|buys|to\s+buy)\b(?!\s+back)))
+  | (?P<expansion>\b(?:expan(?:d|ds|ded|sion)|opens?\s+(?:a\s+)?new|new\s+(?:office|headquarters|hq|facility|market)
+        |relocat(?:e|es|ed|ion)|headcount\s+growth|hiring\s+spree))
+  | (?P<tech_stack>\b(?:hris|hcm|erp|sap|oracle|peoplesoft|netsuite|adp|ukg|ultipro|kronos|dayforce|bamboohr
+        |(?:selects?|implement(?:s|ed|ing)?|migrat(?:es|ed|ing)\s+to|deploy(?:s|ed)?)\s+workday)\b)
+""", re.IGNORECASE | re.VERBOSE)
 
-Structure your analysis with these exact sections:
+# "no funding news" or "CEO change unknown" are not events. Negations only count within a few
+# words of the mention, and never across a clause break or a conjunction such as "but".
+TRIGGER_NEGATION_PATTERN = re.compile(
+    r"\b(?:no|not|none|without|lack(?:s|ing)?\s+of|unavailable|n/a|unknown|no\s+recent)\b", re.IGNORECASE
+)
+TRIGGER_TRAILING_NEGATION_PATTERN = re.compile(
+    r"^\W*(?:\w+\W+){0,2}?(?:(?:is|are|was|were)\s+)?"
+    r"(?:not\s+(?:available|disclosed|reported|known)|unavailable|unknown|none|n/a)(?!\w)",
+    re.IGNORECASE
+)
+TRIGGER_NEGATION_WINDOW_WORDS = 4  # Words before a mention that a negation may sit in
+TRIGGER_CLAUSE_SPLIT = re.compile(r"[.;:\n!?]")
+TRIGGER_CONJUNCTION_SPLIT = re.compile(r"\b(?:but|while|however|although|though|whereas|yet)\b", re.IGNORECASE)
 
-**Company Summary:**
-- Core business model and market position
-- Key products/services and value proposition
-- Target markets and customer segments
-- Recent strategic initiatives
+def is_negated(before, after):
+    """Whether a mention is negated by the words just before it or a short predicate right after it"""
+    before = TRIGGER_CONJUNCTION_SPLIT.split(before)[-1]
+    window = " ".join(before.split()[-TRIGGER_NEGATION_WINDOW_WORDS:])
+    after = TRIGGER_CONJUNCTION_SPLIT.split(after, maxsplit=1)[0]
+    return bool(TRIGGER_NEGATION_PATTERN.search(window) or TRIGGER_TRAILING_NEGATION_PATTERN.search(after))
 
-**Industry Trends:**
-- Major market dynamics and competitive landscape
-- Regulatory or technological changes
-- Economic factors affecting the sector
-- Growth opportunities and threats
+def find_trigger_types(text):
+    """Return the event types mentioned in text, with the clause each was found in, ignoring negated mentions"""
+    found = {}
+    text = text or ""
+    for match in TRIGGER_PATTERN.finditer(text):
+        if match.lastgroup in found:
+            continue
+        start = max((m.end() for m in TRIGGER_CLAUSE_SPLIT.finditer(text, 0, match.start())), default=0)
+        end_match = TRIGGER_CLAUSE_SPLIT.search(text, match.end())
+        end = end_match.start() if end_match else len(text)
+        if not is_negated(text[start:match.start()], text[match.end():end]):
+            found[match.lastgroup] = text[start:end].strip(" -*\t")
+    return found
 
-**Workday Fit/Value:**
-- Current technology landscape and gaps
-- Potential areas for digital transformation
-- Specific Workday value propositions
-- ROI scenarios and business impact
+MARKDOWN_HEADER_PATTERN = re.compile(r"^(?:#+\s*(.+?)|\*\*(.+?)\*\*)\s*:?$")
+
+def markdown_section_bullets(content, title):
+    """Bullets under a bold or heading title in rendered markdown, up to the next title"""
+    bullets, inside = [], False
+    for line in (content or "").splitlines():
+        stripped = line.strip()
+        header = MARKDOWN_HEADER_PATTERN.match(stripped)
+        if header:
+            inside = (header.group(1) or header.group(2)).strip(" :").lower() == title.lower()
+        elif inside and stripped:
+            bullets.append(stripped.lstrip("-*• ").strip())
+    return bullets
 
-**Trigger Events:**
-- Recent executive changes or hires
-- Funding rounds or financial developments
-- M&A activity or partnerships
-- Office expansions or relocations
-- Other strategic shifts
+def extract_trigger_events(articles, trigger_bullets):
+    """Build typed trigger events from news articles and the model's trigger-events section
 
-Format the response in clear, concise bullet points. Focus on insights that would be valuable for a technology sales conversation. If information is not available for a section, indicate that clearly."""
+    Only that section is scanned: the rest of the intelligence (Workday fit,
+    industry trends) mentions HCM, ERP and sector M&A for nearly every account.
+    """
+    events = []
+    for article in articles or []:
+        text = f"{article['title']}. {article['description']}"
+        for event_type, evidence in find_trigger_types(text).items():
+            events.append({
+                "type": event_type,
+                "source": "news",
+                "evidence": article['title'],
+                "link": article.get('link'),
+                "published": article.get('pub_date')
+            })
+    for event_type, evidence in find_trigger_types("\n".join(trigger_bullets or [])).items():
+        events.append({"type": event_type, "source": "model", "evidence": evidence[:200], "link": None, "published": None})
+    return events
 
-        completion = client.chat.completions.create(
-            model="gpt-4",
+def classify_trigger_events(company_name, articles):
+    """Ask the model to classify the articles into typed trigger events (structured JSON output)"""
+    if not articles:
+        return []
+    listing = "\n".join(f"{i}. {a['title']} — {a['description']}" for i, a in enumerate(articles))
+    try:
+        content = route_chat_completion(
+            "trigger_classification",
             messages=[
-                {"role": "system", "content": "You are a senior business strategy expert providing executive-level company summaries. Focus on strategic insights, actionable intelligence, and clear business implications. Avoid generic statements and prioritize specific, data-driven insights."},
-                {"role": "user", "content": prompt}
+                {"role": "system", "content": "You classify sales trigger events in news articles. Respond with JSON only."},
+                {"role": "user", "content": (
+                    f"Company: {company_name}\n\nArticles:\n{listing}\n\n"
+                    f"Return {{\"events\": [{{\"type\": one of {list(TRIGGER_EVENT_TYPES)}, "
+                    "\"article\": article number, \"summary\": one sentence}]}. "
+                    "Only include events that are actually about this company; return an empty list if there are none."
+                )}
             ],
-            temperature=0.7,
-            max_tokens=1000
+            response_format={"type": "json_object"}
         )
-        
-        return completion.choices[0].message.content
+        items = json.loads(content).get("events", [])
+    except Exception:
+        logger.exception("Trigger classification failed for %s", company_name)
+        return []
+
+    events = []
+    for item in items:
+        if not isinstance(item, dict) or item.get("type") not in TRIGGER_EVENT_TYPES:
+            continue
+        index = item.get("article")
+        article = articles[index] if isinstance(index, int) and 0 <= index < len(articles) else {}
+        events.append({
+            "type": item["type"],
+            "source": "classifier",
+            "evidence": str(item.get("summary") or article.get('title', ''))[:200],
+            "link": article.get('link'),
+            "published": article.get('pub_date')
+        })
+    return events
+
+def merge_trigger_events(*event_lists):
+    """Combine event lists, dropping repeats of the same type from the same article"""
+    merged, seen = [], set()
+    for event in itertools.chain(*event_lists):
+        key = (event["type"], event["link"] or event["evidence"])
+        if key not in seen:
+            seen.add(key)
+            merged.append(event)
+    return merged
+
+# === BACKGROUND JOBS ===
+INTELLIGENCE_WORKERS = 4  # Concurrent intelligence jobs per process
+
+def research_company(company_name, website, force_refresh=False, classify=False, on_token=None):
+    """Fetch news, generate intelligence and extract trigger events for one company
+
+    Returns (entry, articles); failures end up in the entry's content as an
+    "Error ..." message, as with the other generators. Runs on worker threads, so
+    a news failure is kept in the entry's "news_error" for the page to show rather
+    than rendered here; the intelligence is then generated without news.
+    """
+    articles, events, news_error = [], [], None
+    try:
+        try:
+            articles = fetch_news_articles(company_name)
+        except NewsUnavailable as e:
+            logger.warning("No news for %s: %s", company_name, e)
+            news_error = str(e)
+        sections = fetch_company_intelligence(company_name, website, force_refresh=force_refresh,
+                                              on_token=on_token, articles=articles)
+        if isinstance(sections, str):  # An error message
+            content = sections
+        else:
+            content = COMPANY_INTELLIGENCE_PROMPT.render(sections)
+            events = extract_trigger_events(articles, sections.get("trigger_events"))
+            if classify:
+                events = merge_trigger_events(events, classify_trigger_events(company_name, articles))
     except Exception as e:
-        return f"Error generating intelligence: {str(e)}"
+        content = f"Error generating intelligence: {str(e)}"
+    entry = {"content": content, "updated": pd.Timestamp.now(), "events": events}
+    if news_error:
+        entry["news_error"] = news_error
+    return entry, articles
 
-def show_top_targets():
+class IntelligenceJobQueue:
+    """Worker pool for Top Targets intelligence that keeps running across reruns and sessions
+
+    Jobs are deduplicated by company and their results are saved to the territory
+    database, so a refresh finishes even if the browser tab is closed.
+    """
+
+    def __init__(self, db, max_workers=INTELLIGENCE_WORKERS):
+        self.db = db
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="intelligence")
+        self._prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="news_prefetch")
+        self._jobs = {}  # company name -> latest job
+        self._lock = threading.Lock()
+
+    def submit(self, company_name, website, force_refresh=False, classify=False):
+        """Queue a job unless one for the same company is already queued or running"""
+        job = self._add_job(company_name, website, classify)
+        if job is None:
+            return False
+        self._executor.submit(self._run, company_name, job, force_refresh)
+        return True
+
+    def submit_many(self, targets, force_refresh=False, classify=False):
+        """Queue jobs for (company name, website) pairs, fetching their news in batched queries first"""
+        queued = [(name, website, job) for name, website in targets
+                  if (job := self._add_job(name, website, classify)) is not None]
+        if len(queued) > 1:
+            # Claim the news before any job starts, so every worker waits on the batches instead of querying alone
+            prefetch_news([(name, website) for name, website, _ in queued], self._prefetch_executor)
+        for name, _, job in queued:
+            self._executor.submit(self._run, name, job, force_refresh)
+        return len(queued)
+
+    def _add_job(self, company_name, website, classify):
+        """Record a queued job, or return None if one for the company is already queued or running"""
+        with self._lock:
+            job = self._jobs.get(company_name)
+            if job is not None and job["status"] in ("queued", "running"):
+                return None
+            job = {
+                "status": "queued",
+                "website": website,
+                "classify": classify,  # Also ask the model for a structured trigger classification
+                "submitted_at": time.time(),
+                "started_at": None,
+                "first_token_at": None,
+                "finished_at": None,
+                "partial": "",
+                "entry": None
+            }
+            self._jobs[company_name] = job
+            return job
+
+    def _run(self, company_name, job, force_refresh):
+        job["status"] = "running"
+        job["started_at"] = time.time()
+        get_metrics().record("intelligence_queue_wait", {}, job["started_at"] - job["submitted_at"])
+        with span("intelligence_job") as attrs:
+            try:
+                self._generate(company_name, job, force_refresh)
+            except Exception as e:
+                logger.exception("Intelligence job for %s failed", company_name)
+                if job["entry"] is None:
+                    job["entry"] = {"content": f"Error generating intelligence: {e}", "updated": pd.Timestamp.now(),
+                                    "events": []}
+            finally:
+                # The job never stays "running", or the company could not be queued again
+                if job["status"] not in ("done", "failed"):
+                    job["finished_at"] = time.time()
+                    job["status"] = "failed"
+                attrs["error"] = job["status"] == "failed"
+
+    def _generate(self, company_name, job, force_refresh):
+
+        def on_token(text):
+            if job["first_token_at"] is None:
+                job["first_token_at"] = time.time()
+            job["partial"] = text
+
+        entry, _ = research_company(company_name, job["website"], force_refresh=force_refresh,
+                                    classify=job["classify"], on_token=on_token)
+        content = entry["content"]
+        try:
+            self.db.save_intelligence(company_name, entry)
+        except Exception:
+            logger.exception("Could not save intelligence for %s", company_name)
+        job["finished_at"] = time.time()
+        job["entry"] = entry
+        job["status"] = "failed" if content.startswith("Error") else "done"
+        logger.info("Intelligence job for %s %s in %.1fs", company_name, job["status"],
+                    job["finished_at"] - job["started_at"])
+
+    def get(self, company_name):
+        return self._jobs.get(company_name)
+
+    def pending(self, company_names):
+        """Count the given companies with a queued or running job"""
+        return sum(
+            1 for name in company_names
+            if (job := self._jobs.get(name)) is not None and job["status"] in ("queued", "running")
+        )
+
+@st.cache_resource
+def get_intelligence_jobs():
+    """Process-wide intelligence job queue"""
+    return IntelligenceJobQueue(get_territory_db())
+
+# === TOP TARGETS ===
+TOP_TARGETS_STALE_AFTER_HOURS = 24  # Default age at which a company's intelligence is considered stale
+TOP_TARGETS_POLL_SECONDS = 2  # How often the dashboard checks on background jobs
+
+def fetch_company_intelligence(company_name, website, force_refresh=False, on_token=None, articles=None):
+    """Generate strategic company summary sections ({key: bullets}) using OpenAI, or an error message"""
+    try:
+        # Get recent news, reusing articles the caller already fetched
+        if articles is None:
+            try:
+                articles = fetch_news_articles(company_name)
+            except NewsUnavailable as e:
+                logger.warning("No news for %s: %s", company_name, e)
+                articles = []
+        
+        return COMPANY_INTELLIGENCE_PROMPT.complete(
+            f"Company: {company_name}\nWebsite: {website}",
+            articles=articles or [],
+            company_name=company_name,
+            force_refresh=force_refresh,
+            on_token=on_token
+        )
+    except Exception as e:
+        return f"Error generating intelligence: {str(e)}"
+
+def show_top_targets():
     st.title("🎯 Top Targets")
     
     # Initialize session state for top targets if not present
@@ -401,6 +2090,10 @@ def show_top_targets():
         st.session_state.top_targets = pd.DataFrame(columns=['Company Name', 'Website', 'Last Updated'])
     if "last_updated" not in st.session_state:
         st.session_state.last_updated = {}
+    if "intelligence" not in st.session_state:
+        st.session_state.intelligence = {}
+    if "top_targets_file_id" not in st.session_state:
+        st.session_state.top_targets_file_id = None
     
     # Add custom CSS for the intelligence cards
     st.markdown("""
@@ -470,7 +2163,7 @@ def show_top_targets():
     
     # File upload section
     uploaded_file = st.file_uploader("Upload Top Targets CSV", type="csv")
-    if uploaded_file:
+    if uploaded_file and uploaded_file.file_id != st.session_state.top_targets_file_id:
         try:
             df = pd.read_csv(uploaded_file)
             required_columns = ['Company Name', 'Website']
@@ -478,11 +2171,21 @@ def show_top_targets():
                 st.error("❌ CSV must contain 'Company Name' and 'Website' columns")
                 return
                 
-            # Add timestamp for last update
-            df['Last Updated'] = pd.Timestamp.now()
+            # Research each account once: rename rows to their canonical account and drop repeats
+            df = df.dropna(subset=['Company Name']).reset_index(drop=True)
+            df['Company Name'], _ = dedupe_accounts(df[required_columns].itertuples(index=False, name=None))
+            duplicates = df['Company Name'].duplicated()
+            if duplicates.any():
+                st.info(f"ℹ️ Merged {int(duplicates.sum())} rows that name an account already in the list")
+                df = df[~duplicates].reset_index(drop=True)
+
+            # Keep the timestamp of any intelligence we already have for these companies
+            df['Last Updated'] = pd.to_datetime(df['Company Name'].map(st.session_state.last_updated))
             
-            # Update session state
+            # Update session state and persist the target list
             st.session_state.top_targets = df
+            st.session_state.top_targets_file_id = uploaded_file.file_id
+            get_territory_db().replace_target_accounts(df)
             st.success("✅ Top targets uploaded successfully!")
         except Exception as e:
             st.error(f"❌ Error uploading file: {str(e)}")
@@ -491,50 +2194,172 @@ def show_top_targets():
     if not st.session_state.top_targets.empty:
         st.markdown("### 📊 Strategic Intelligence Dashboard")
         
-        for _, row in st.session_state.top_targets.iterrows():
-            company_name = row['Company Name']
-            website = row['Website']
-            last_updated = row['Last Updated']
-            
-            # Store last update time in session state
-            st.session_state.last_updated[company_name] = last_updated
+        stale_hours = st.number_input(
+            "Refresh intelligence older than (hours)",
+            min_value=1,
+            value=TOP_TARGETS_STALE_AFTER_HOURS,
+            step=1,
+            key="top_targets_stale_hours"
+        )
+        stale_after = pd.Timedelta(hours=stale_hours)
+        
+        col1, col2, col3 = st.columns([3, 2, 2])
+        with col1:
+            event_filter = st.multiselect(
+                "Show accounts with trigger events",
+                options=list(TRIGGER_EVENT_TYPES),
+                format_func=lambda event_type: TRIGGER_EVENT_TYPES[event_type][0],
+                key="top_targets_event_filter"
+            )
+        with col2:
+            sort_by = st.selectbox("Sort by", TARGET_SORT_OPTIONS, key="top_targets_sort")
+        with col3:
+            classify = st.checkbox(
+                "AI event classification",
+                key="top_targets_classify",
+                help="Also ask the model to classify news into trigger events (one extra request per account)"
+            )
+        jobs = get_intelligence_jobs()
+        sync_intelligence_from_jobs(jobs)
+        
+        targets = list(zip(st.session_state.top_targets['Company Name'], st.session_state.top_targets['Website']))
+        stale = [(name, website) for name, website in targets if is_intelligence_stale(name, stale_after)]
+        if st.button(f"🔄 Refresh all stale ({len(stale)})", disabled=not stale, key="refresh_all_stale"):
+            # Not forced: sections written from news that has not changed are reused
+            jobs.submit_many(stale, classify=classify)
+        
+        # Queue every company that has never been researched; jobs already queued are not duplicated
+        jobs.submit_many(
+            [(name, website) for name, website in targets if name not in st.session_state.intelligence],
+            classify=classify
+        )
+        
+        # Poll the job queue only while this page is waiting on results
+        polling = jobs.pending(name for name, _ in targets) > 0
+        st.fragment(run_every=TOP_TARGETS_POLL_SECONDS if polling else None)(show_intelligence_cards)(
+            jobs, stale_after, polling, event_filter, sort_by, classify
+        )
+    else:
+        st.info("👆 Upload a CSV file with your top target accounts to get started.")
+
+def is_intelligence_stale(company_name, stale_after):
+    entry = st.session_state.intelligence.get(company_name)
+    return entry is not None and pd.Timestamp.now() - entry['updated'] > stale_after
+
+def sync_intelligence_from_jobs(jobs):
+    """Adopt results that background jobs finished since this session last looked"""
+    adopted = False
+    for company_name in st.session_state.top_targets['Company Name']:
+        job = jobs.get(company_name)
+        if job is None or job["entry"] is None:
+            continue
+        entry = st.session_state.intelligence.get(company_name)
+        if entry is None or job["entry"]['updated'] > entry['updated']:
+            st.session_state.intelligence[company_name] = job["entry"]
+            st.session_state.last_updated[company_name] = job["entry"]['updated']
+            adopted = True
+    if adopted:
+        st.session_state.top_targets['Last Updated'] = pd.to_datetime(
+            st.session_state.top_targets['Company Name'].map(st.session_state.last_updated)
+        )
+
+def show_intelligence_cards(jobs, stale_after, polling, event_filter=(), sort_by="Upload order", classify=False):
+    """Render a card per target; re-run on a timer by show_top_targets while jobs are pending"""
+    sync_intelligence_from_jobs(jobs)
+    names = st.session_state.top_targets['Company Name'].tolist()
+    pending = jobs.pending(names)
+    if pending:
+        ready = len(names) - pending
+        st.progress(ready / len(names), text=f"Generating intelligence: {ready} / {len(names)} ready")
+    elif polling:
+        # Everything finished; rerun the page once so polling stops
+        st.rerun()
+    
+    for i, row in filter_targets_by_events(st.session_state.top_targets, event_filter, sort_by).iterrows():
+        company_name = row['Company Name']
+        website = row['Website']
+        entry = st.session_state.intelligence.get(company_name)
+        job = jobs.get(company_name)
+        running = job is not None and job["status"] in ("queued", "running")
+        stale = is_intelligence_stale(company_name, stale_after)
+        
+        with st.container():
+            last_updated = entry['updated'].strftime('%Y-%m-%d %H:%M') if entry else "never"
+            st.markdown(f"""
+            <div class="intelligence-card">
+                <div class="company-header">
+                    <div>
+                        <span>{company_name}</span>
+                        <div class="company-website">{website}</div>
+                    </div>
+                    <span class="last-updated">Last updated: {last_updated}{" (stale)" if stale else ""}</span>
+                </div>
+            """, unsafe_allow_html=True)
+            if st.button("🔄 Refresh", key=f"refresh_target_{i}", disabled=running):
+                jobs.submit(company_name, website, force_refresh=True, classify=classify)
+                st.rerun()
             
-            with st.container():
-                st.markdown(f"""
-                <div class="intelligence-card">
-                    <div class="company-header">
-                        <div>
-                            <span>{company_name}</span>
-                            <div class="company-website">{website}</div>
-                        </div>
-                        <span class="last-updated">Last updated: {last_updated.strftime('%Y-%m-%d %H:%M')}</span>
+            if running:
+                # Show whatever the worker has streamed so far
+                if job["partial"]:
+                    st.markdown(f"""
+                    <div class="intelligence-content">
+                        {job["partial"]} ▌
                     </div>
-                """, unsafe_allow_html=True)
-                
-                # Generate and display intelligence
-                with st.spinner(f"Generating strategic summary for {company_name}..."):
-                    intelligence = fetch_company_intelligence(company_name, website)
-                    
-                    # Add signal badges if available
-                    if "funding" in intelligence.lower():
-                        st.markdown('<span class="signal-badge signal-funding">💰 Funding Update</span>', unsafe_allow_html=True)
-                    if "hire" in intelligence.lower() or "appoint" in intelligence.lower():
-                        st.markdown('<span class="signal-badge signal-hiring">👥 Executive Change</span>', unsafe_allow_html=True)
-                    if "news" in intelligence.lower():
-                        st.markdown('<span class="signal-badge signal-news">📰 Recent News</span>', unsafe_allow_html=True)
-                    if "workday" in intelligence.lower() or "hris" in intelligence.lower() or "erp" in intelligence.lower():
-                        st.markdown('<span class="signal-badge signal-tech">💻 Tech Signal</span>', unsafe_allow_html=True)
+                    """, unsafe_allow_html=True)
+                else:
+                    st.caption(f"⏳ {'Generating' if job['status'] == 'running' else 'Queued'} strategic summary for {company_name}...")
+            elif entry is not None:
+                intelligence = entry['content']
+                if entry.get('news_error'):
+                    st.warning(f"⚠️ {entry['news_error']}")
+                if intelligence.startswith("Error"):
+                    st.error(intelligence)
+                else:
+                    show_trigger_events(entry.get('events', []))
                     
                     st.markdown(f"""
                     <div class="intelligence-content">
                         {intelligence}
                     </div>
                     """, unsafe_allow_html=True)
-                
-                st.markdown("</div>", unsafe_allow_html=True)
-                st.markdown("---")
-    else:
-        st.info("👆 Upload a CSV file with your top target accounts to get started.")
+                if job is not None and job["first_token_at"] and entry is job["entry"]:
+                    st.caption(f"⏱️ First token after {job['first_token_at'] - job['started_at']:.2f}s · "
+                               f"completed in {job['finished_at'] - job['started_at']:.1f}s")
+            
+            st.markdown("</div>", unsafe_allow_html=True)
+            st.markdown("---")
+
+TARGET_SORT_OPTIONS = ["Upload order", "Most trigger events", "Recently updated"]
+
+def filter_targets_by_events(targets, event_filter, sort_by):
+    """Select and order target rows using the stored trigger events"""
+    intelligence = st.session_state.intelligence
+    event_types = targets['Company Name'].map(
+        lambda name: {event["type"] for event in intelligence.get(name, {}).get('events', [])}
+    )
+    if event_filter:
+        targets = targets[event_types.map(lambda types: not types.isdisjoint(event_filter))]
+    if sort_by == "Most trigger events":
+        counts = targets['Company Name'].map(lambda name: len(intelligence.get(name, {}).get('events', [])))
+        targets = targets.loc[counts.sort_values(ascending=False, kind="stable").index]
+    elif sort_by == "Recently updated":
+        targets = targets.sort_values('Last Updated', ascending=False, na_position='last', kind="stable")
+    return targets
+
+def show_trigger_events(events):
+    """Render one badge per event type plus the evidence behind each event"""
+    if not events:
+        return
+    types = list(dict.fromkeys(event["type"] for event in events))
+    st.markdown("".join(
+        f'<span class="signal-badge {TRIGGER_EVENT_TYPES[t][1]}">{TRIGGER_EVENT_TYPES[t][0]}</span>' for t in types
+    ), unsafe_allow_html=True)
+    with st.expander(f"Trigger events ({len(events)})"):
+        for event in events:
+            label = TRIGGER_EVENT_TYPES[event["type"]][0]
+            evidence = f"[{event['evidence']}]({event['link']})" if event["link"] else event["evidence"]
+            st.markdown(f"- **{label}** · {evidence} _({event['source']})_")
 
 # === UPLOAD ACCOUNTS ===
 def show_upload_section():
@@ -546,7 +2371,931 @@ def show_upload_section():
         st.success("✅ File uploaded.")
         st.dataframe(df)
 
+# === PIPELINE STORE ===
+PIPELINE_STAGES = ["Prospecting", "Discovery", "Demo", "Proposal", "Commit", "Closed Won"]
+OPEN_STAGES = PIPELINE_STAGES[:-1]
+
+def current_quarter():
+    """Return the current quarter label, e.g. Q2"""
+    return f"Q{(date.today().month-1)//3 + 1}"
+
+def new_deal_ids(count=1):
+    """Generate unique 32-character hex deal IDs that sort in creation order
+
+    Ordered keys keep bulk inserts appending to the end of the primary key index.
+    """
+    prefix = f"{time.time_ns():016x}"
+    suffix = os.urandom(4).hex()
+    return [f"{prefix}{i:08x}{suffix}" for i in range(count)]
+
+class PipelineStore:
+    """Pipeline opportunities keyed by stable deal ID, with secondary indexes by stage and account
+
+    Rows live in an insertion-ordered dict (the ID -> row index); the stage and
+    account indexes map to insertion-ordered dicts of IDs so that adds, updates
+    and deletes are all O(1). Open opportunities are also kept in their own
+    ordered index, with a list of their IDs that pages are sliced from; the list
+    is extended on adds and rebuilt on the next page read after a removal.
+    """
+
+    def __init__(self, deals=(), aggregates=None, db=None):
+        self.aggregates = aggregates if aggregates is not None else TerritoryAggregates()
+        self.db = db  # Optional TerritoryDB that every change is written through to
+        self._rows = {}
+        self._by_stage = {stage: {} for stage in PIPELINE_STAGES}
+        self._by_account = {}
+        self._active = {}
+        self._active_ids = []
+        for deal in deals:
+            self.add(deal)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(list(self._rows.values()))
+
+    def __contains__(self, deal_id):
+        return deal_id in self._rows
+
+    def get(self, deal_id):
+        return self._rows.get(deal_id)
+
+    def add(self, deal):
+        """Add an opportunity and return its deal ID"""
+        row = self._index(deal)
+        if self.db is not None:
+            self.db.insert_opportunities([row])
+        return row["id"]
+
+    def load(self, deals):
+        """Index already-persisted opportunities without writing them back"""
+        for deal in deals:
+            self._index(deal)
+
+    def replace_all(self, deals):
+        """Replace the whole pipeline, persisting it as one bulk transaction"""
+        self.clear(persist=False)
+        rows = [self._index(deal) for deal in deals]
+        if self.db is not None:
+            self.db.insert_opportunities(rows, replace=True)
+        return len(rows)
+
+    def _index(self, deal):
+        deal_id = deal.get("id") or new_deal_ids()[0]
+        row = dict(deal, id=deal_id)
+        self._rows[deal_id] = row
+        self._by_stage.setdefault(row["stage"], {})[deal_id] = None
+        self._by_account.setdefault(row["account"], {})[deal_id] = None
+        if row["stage"] != "Closed Won":
+            self._activate(deal_id)
+        self.aggregates.add_opportunity(row)
+        return row
+
+    def update(self, deal_id, **changes):
+        """Apply field changes to an opportunity, keeping the indexes in sync"""
+        row = self._update(deal_id, changes)
+        if self.db is not None:
+            self.db.update_opportunity(deal_id, changes)
+        return row
+
+    def _update(self, deal_id, changes):
+        row = self._rows[deal_id]
+        self.aggregates.remove_opportunity(row)
+        if "stage" in changes and changes["stage"] != row["stage"]:
+            self._unindex(self._by_stage, row["stage"], deal_id)
+            self._by_stage.setdefault(changes["stage"], {})[deal_id] = None
+            if changes["stage"] == "Closed Won":
+                self._deactivate(deal_id)
+            else:
+                self._activate(deal_id)
+        if "account" in changes and changes["account"] != row["account"]:
+            self._unindex(self._by_account, row["account"], deal_id)
+            self._by_account.setdefault(changes["account"], {})[deal_id] = None
+        row.update(changes)
+        self.aggregates.add_opportunity(row)
+        return row
+
+    def remove(self, deal_id):
+        """Delete an opportunity and return its row"""
+        row = self._remove(deal_id)
+        if self.db is not None:
+            self.db.delete_opportunity(deal_id)
+        return row
+
+    def _remove(self, deal_id):
+        row = self._rows.pop(deal_id)
+        self._unindex(self._by_stage, row["stage"], deal_id)
+        self._unindex(self._by_account, row["account"], deal_id)
+        self._deactivate(deal_id)
+        self.aggregates.remove_opportunity(row)
+        return row
+
+    def apply_batch(self, updates, deletes, deals):
+        """Apply a grid diff: field updates by ID, deletes, and moves to Closed Won
+
+        All changes are persisted in a single database transaction.
+        """
+        closed = []
+        for deal_id, changes in updates.items():
+            if changes.get("stage") == "Closed Won":
+                row = self._remove(deal_id)
+                closed.append(deals.append(self._closed_deal(dict(row, **changes)), persist=False))
+            else:
+                self._update(deal_id, changes)
+        for deal_id in deletes:
+            self._remove(deal_id)
+        if self.db is not None:
+            self.db.apply_pipeline_batch(
+                {k: v for k, v in updates.items() if v.get("stage") != "Closed Won"},
+                list(deletes) + [k for k, v in updates.items() if v.get("stage") == "Closed Won"],
+                closed
+            )
+        return len(updates) + len(deletes)
+
+    def clear(self, persist=True):
+        """Remove every opportunity"""
+        self._rows = {}
+        self._by_stage = {stage: {} for stage in PIPELINE_STAGES}
+        self._by_account = {}
+        self._active = {}
+        self._active_ids = []
+        self.aggregates.reset_pipeline()
+        if persist and self.db is not None:
+            self.db.insert_opportunities([], replace=True)
+
+    def close_won(self, deal_id, deals, deal_type="HR"):
+        """Move an opportunity out of the pipeline and into the closed deals list"""
+        row = self.remove(deal_id)
+        deals.append(self._closed_deal(row, deal_type))
+        return row
+
+    @staticmethod
+    def _closed_deal(row, deal_type="HR"):
+        return {
+            "id": new_deal_ids()[0],
+            "account": row["account"],
+            "acv": float(row["acv"]),
+            "deal_type": deal_type,  # Default to HR, can be updated later
+            "quarter": current_quarter()
+        }
+
+    def count_active(self):
+        return len(self._active)
+
+    def page(self, offset, limit):
+        """Return one page of active opportunities, sliced from the ordered ID list in O(limit)"""
+        if self._active_ids is None:
+            self._active_ids = list(self._active)
+        return [self._rows[deal_id] for deal_id in self._active_ids[offset:offset + limit]]
+
+    def in_stage(self, stage):
+        return [self._rows[deal_id] for deal_id in self._by_stage.get(stage, {})]
+
+    def for_account(self, account):
+        return [self._rows[deal_id] for deal_id in self._by_account.get(account, {})]
+
+    def active(self):
+        """Opportunities that have not been marked Closed Won"""
+        return [self._rows[deal_id] for deal_id in self._active]
+
+    def _activate(self, deal_id):
+        if deal_id not in self._active:
+            self._active[deal_id] = None
+            if self._active_ids is not None:
+                self._active_ids.append(deal_id)
+
+    def _deactivate(self, deal_id):
+        if deal_id in self._active:
+            del self._active[deal_id]
+            self._active_ids = None  # Rebuilt on the next page read
+
+    @staticmethod
+    def _unindex(index, value, deal_id):
+        ids = index.get(value)
+        if ids is not None:
+            ids.pop(deal_id, None)
+            if not ids and value not in PIPELINE_STAGES:
+                del index[value]
+
+# === TERRITORY AGGREGATES ===
+LOGO_TYPES = ["HR", "FINS", "Full Suite", "HR + FINS", "FINS + PLN"]
+LOGO_TARGET = 4
+
+class TerritoryAggregates:
+    """Running quota and pipeline totals, updated on every add, edit, move and delete"""
+
+    def __init__(self):
+        self.booked_acv = 0.0
+        self.deal_count = 0
+        self.logo_count = 0
+        self.reset_pipeline()
+
+    def reset_pipeline(self):
+        self.pipeline_acv = 0.0
+        self.pipeline_count = 0
+        self.stage_acv = {stage: 0.0 for stage in PIPELINE_STAGES}
+        self.stage_count = {stage: 0 for stage in PIPELINE_STAGES}
+
+    def add_opportunity(self, row, sign=1):
+        stage = row["stage"]
+        self.stage_acv[stage] = self.stage_acv.get(stage, 0.0) + sign * float(row["acv"])
+        self.stage_count[stage] = self.stage_count.get(stage, 0) + sign
+        if stage != "Closed Won":
+            self.pipeline_acv += sign * float(row["acv"])
+            self.pipeline_count += sign
+
+    def remove_opportunity(self, row):
+        self.add_opportunity(row, sign=-1)
+
+    def add_deal(self, deal, sign=1):
+        self.booked_acv += sign * float(deal["acv"])
+        self.deal_count += sign
+        if deal["deal_type"] in LOGO_TYPES:
+            self.logo_count += sign
+
+    def remove_deal(self, deal):
+        self.add_deal(deal, sign=-1)
+
+    def quota_percentage(self, quota):
+        return (self.booked_acv / quota) * 100 if quota else 0.0
+
+    def snapshot(self):
+        """Plain-dict view of every total, with empty stages dropped"""
+        return {
+            "booked_acv": self.booked_acv,
+            "deal_count": self.deal_count,
+            "logo_count": self.logo_count,
+            "pipeline_acv": self.pipeline_acv,
+            "pipeline_count": self.pipeline_count,
+            "stage_acv": {k: v for k, v in self.stage_acv.items() if self.stage_count.get(k)},
+            "stage_count": {k: v for k, v in self.stage_count.items() if v}
+        }
+
+    @classmethod
+    def recompute(cls, pipeline, deals):
+        """Build totals from scratch with a full pass over the pipeline and closed deals"""
+        totals = cls()
+        for row in pipeline:
+            totals.add_opportunity(row)
+        for deal in deals:
+            totals.add_deal(deal)
+        return totals
+
+    def check_consistency(self, pipeline, deals, tolerance=1e-6):
+        """Compare the running totals with a full recompute and return any mismatches"""
+        expected = self.recompute(pipeline, deals).snapshot()
+        actual = self.snapshot()
+        mismatches = {}
+        for key, value in expected.items():
+            if isinstance(value, dict):
+                keys = set(value) | set(actual[key])
+                if any(abs(value.get(k, 0) - actual[key].get(k, 0)) > tolerance for k in keys):
+                    mismatches[key] = (actual[key], value)
+            elif abs(value - actual[key]) > tolerance:
+                mismatches[key] = (actual[key], value)
+        return mismatches
+
+class DealLedger:
+    """Closed Won deals, reporting every change to the territory aggregates"""
+
+    def __init__(self, deals=(), aggregates=None, db=None):
+        self.aggregates = aggregates if aggregates is not None else TerritoryAggregates()
+        self.db = db  # Optional TerritoryDB that every change is written through to
+        self._deals = []
+        for deal in deals:
+            self._deals.append(deal)
+            self.aggregates.add_deal(deal)
+
+    def __len__(self):
+        return len(self._deals)
+
+    def __iter__(self):
+        return iter(list(self._deals))
+
+    def __getitem__(self, index):
+        return self._deals[index]
+
+    def append(self, deal, persist=True):
+        deal = dict(deal, id=deal.get("id") or new_deal_ids()[0])
+        self._deals.append(deal)
+        self.aggregates.add_deal(deal)
+        if persist and self.db is not None:
+            self.db.insert_deals([deal])
+        return deal
+
+    def update(self, index, **changes):
+        deal = self._deals[index]
+        self.aggregates.remove_deal(deal)
+        deal.update(changes)
+        self.aggregates.add_deal(deal)
+        if self.db is not None:
+            self.db.update_deal(deal["id"], changes)
+        return deal
+
+    def pop(self, index=-1):
+        deal = self._deals.pop(index)
+        self.aggregates.remove_deal(deal)
+        if self.db is not None:
+            self.db.delete_deal(deal["id"])
+        return deal
+
+# === PERSISTENCE ===
+TERRITORY_DB_PATH = os.getenv("TERRITORY_DB_PATH", os.path.join(".cache", "territory.sqlite3"))
+OPPORTUNITY_COLUMNS = ["id", "account", "acv", "stage", "close_date", "notes", "confidence"]
+DEAL_COLUMNS = ["id", "account", "acv", "deal_type", "quarter"]
+
+class TerritoryDB:
+    """SQLite storage in WAL mode for deals, pipeline opportunities, top targets, intelligence and accounts
+
+    Each thread gets its own connection; WAL lets page reads run alongside writes
+    from other sessions and background workers.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS opportunities (
+            id TEXT PRIMARY KEY,
+            account TEXT NOT NULL,
+            acv REAL NOT NULL,
+            stage TEXT NOT NULL,
+            close_date TEXT,
+            notes TEXT,
+            confidence REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_opportunities_stage ON opportunities (stage);
+        CREATE INDEX IF NOT EXISTS idx_opportunities_account ON opportunities (account);
+
+        CREATE TABLE IF NOT EXISTS deals (
+            id TEXT PRIMARY KEY,
+            account TEXT NOT NULL,
+            acv REAL NOT NULL,
+            deal_type TEXT NOT NULL,
+            quarter TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_deals_account ON deals (account);
+
+        CREATE TABLE IF NOT EXISTS target_accounts (
+            company_name TEXT PRIMARY KEY,
+            website TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS intelligence (
+            company_name TEXT PRIMARY KEY,
+            content TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            events TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_intelligence_updated ON intelligence (updated_at);
+
+        CREATE TABLE IF NOT EXISTS accounts (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            domain TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS account_aliases (
+            alias TEXT PRIMARY KEY,
+            account_id TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self.SCHEMA)
+        # Databases created by earlier versions lack newer columns
+        self._add_missing_column(conn, "opportunities", "confidence", "REAL")
+        self._add_missing_column(conn, "intelligence", "events", "TEXT")
+
+    @staticmethod
+    def _add_missing_column(conn, table, column, column_type):
+        if column not in {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    # --- Opportunities ---
+    def load_opportunities(self):
+        """Yield every opportunity in insertion order, one row at a time"""
+        cursor = self._connect().execute(
+            f"SELECT {', '.join(OPPORTUNITY_COLUMNS)} FROM opportunities ORDER BY rowid"
+        )
+        for row in cursor:
+            yield dict(zip(OPPORTUNITY_COLUMNS, row))
+
+    def insert_opportunities(self, rows, replace=False):
+        """Bulk insert opportunities in one transaction, optionally replacing the whole table"""
+        with self._connect() as conn:
+            if replace:
+                conn.execute("DELETE FROM opportunities")
+            conn.executemany(
+                f"INSERT OR REPLACE INTO opportunities ({', '.join(OPPORTUNITY_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(OPPORTUNITY_COLUMNS))})",
+                ([row.get(col) for col in OPPORTUNITY_COLUMNS] for row in rows)
+            )
+
+    def import_opportunity_chunks(self, chunks):
+        """Replace all opportunities with column-oriented chunks, streamed into one transaction"""
+        imported = 0
+        with self._connect() as conn:
+            conn.execute("DELETE FROM opportunities")
+            # Rebuilding the secondary indexes once is much cheaper than maintaining them per row
+            conn.execute("DROP INDEX IF EXISTS idx_opportunities_stage")
+            conn.execute("DROP INDEX IF EXISTS idx_opportunities_account")
+            for columns in chunks:
+                conn.executemany(
+                    f"INSERT INTO opportunities ({', '.join(OPPORTUNITY_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(OPPORTUNITY_COLUMNS))})",
+                    zip(*(columns[col] for col in OPPORTUNITY_COLUMNS))
+                )
+                imported += len(columns["id"])
+            conn.execute("CREATE INDEX idx_opportunities_stage ON opportunities (stage)")
+            conn.execute("CREATE INDEX idx_opportunities_account ON opportunities (account)")
+        return imported
+
+    def update_opportunity(self, deal_id, changes):
+        with self._connect() as conn:
+            self._update_opportunity(conn, deal_id, changes)
+
+    @staticmethod
+    def _update_opportunity(conn, deal_id, changes):
+        columns = [col for col in changes if col in OPPORTUNITY_COLUMNS and col != "id"]
+        if columns:
+            conn.execute(
+                f"UPDATE opportunities SET {', '.join(f'{col} = ?' for col in columns)} WHERE id = ?",
+                [changes[col] for col in columns] + [deal_id]
+            )
+
+    def apply_pipeline_batch(self, updates, deletes, new_deals):
+        """Persist a batch of opportunity updates, deletes and Closed Won deals in one transaction"""
+        with self._connect() as conn:
+            for deal_id, changes in updates.items():
+                self._update_opportunity(conn, deal_id, changes)
+            conn.executemany("DELETE FROM opportunities WHERE id = ?", ((deal_id,) for deal_id in deletes))
+            conn.executemany(
+                f"INSERT OR REPLACE INTO deals ({', '.join(DEAL_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(DEAL_COLUMNS))})",
+                ([deal.get(col) for col in DEAL_COLUMNS] for deal in new_deals)
+            )
+
+    def delete_opportunity(self, deal_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM opportunities WHERE id = ?", (deal_id,))
+
+    # --- Closed deals ---
+    def load_deals(self):
+        cursor = self._connect().execute(f"SELECT {', '.join(DEAL_COLUMNS)} FROM deals ORDER BY rowid")
+        return [dict(zip(DEAL_COLUMNS, row)) for row in cursor]
+
+    def insert_deals(self, deals):
+        with self._connect() as conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO deals ({', '.join(DEAL_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(DEAL_COLUMNS))})",
+                ([deal.get(col) for col in DEAL_COLUMNS] for deal in deals)
+            )
+
+    def update_deal(self, deal_id, changes):
+        columns = [col for col in changes if col in DEAL_COLUMNS and col != "id"]
+        if columns:
+            with self._connect() as conn:
+                conn.execute(
+                    f"UPDATE deals SET {', '.join(f'{col} = ?' for col in columns)} WHERE id = ?",
+                    [changes[col] for col in columns] + [deal_id]
+                )
+
+    def delete_deal(self, deal_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM deals WHERE id = ?", (deal_id,))
+
+    # --- Top targets and intelligence ---
+    def load_target_accounts(self):
+        cursor = self._connect().execute("SELECT company_name, website FROM target_accounts ORDER BY rowid")
+        return pd.DataFrame(cursor.fetchall(), columns=['Company Name', 'Website'])
+
+    def replace_target_accounts(self, df):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM target_accounts")
+            conn.executemany(
+                "INSERT OR REPLACE INTO target_accounts (company_name, website) VALUES (?, ?)",
+                df[['Company Name', 'Website']].astype(str).itertuples(index=False, name=None)
+            )
+
+    def load_intelligence(self):
+        cursor = self._connect().execute("SELECT company_name, content, updated_at, events FROM intelligence")
+        return {
+            name: {
+                "content": content,
+                "updated": pd.Timestamp(updated_at),
+                # Rows saved before events were stored get them from the saved summary's trigger events
+                "events": json.loads(events) if events is not None else (
+                    [] if content.startswith("Error") else extract_trigger_events(
+                        [], markdown_section_bullets(content, COMPANY_INTELLIGENCE_SECTIONS["trigger_events"]["title"])
+                    )
+                )
+            }
+            for name, content, updated_at, events in cursor
+        }
+
+    def save_intelligence(self, company_name, entry):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO intelligence (company_name, content, updated_at, events) VALUES (?, ?, ?, ?)",
+                (company_name, entry["content"], entry["updated"].isoformat(), json.dumps(entry.get("events", [])))
+            )
+
+    # --- Account registry ---
+    def load_accounts(self):
+        conn = self._connect()
+        accounts = {
+            account_id: {"id": account_id, "name": name, "domain": domain}
+            for account_id, name, domain in conn.execute("SELECT id, name, domain FROM accounts")
+        }
+        return accounts, dict(conn.execute("SELECT alias, account_id FROM account_aliases"))
+
+    def save_accounts(self, accounts, aliases):
+        """Upsert accounts and alias -> account id entries in one transaction"""
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO accounts (id, name, domain) VALUES (?, ?, ?)",
+                ((account["id"], account["name"], account["domain"]) for account in accounts)
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO account_aliases (alias, account_id) VALUES (?, ?)",
+                aliases.items()
+            )
+
+@st.cache_resource
+def get_territory_db():
+    """Process-wide handle on the territory database"""
+    return TerritoryDB(TERRITORY_DB_PATH)
+
+def load_territory_state(db):
+    """Read the persisted territory into session state once per session"""
+    aggregates = TerritoryAggregates()
+    st.session_state.aggregates = aggregates
+    st.session_state.deals = DealLedger(db.load_deals(), aggregates=aggregates, db=db)
+    st.session_state.pipeline = PipelineStore(aggregates=aggregates, db=db)
+    st.session_state.pipeline.load(db.load_opportunities())
+
+    st.session_state.intelligence = db.load_intelligence()
+    st.session_state.last_updated = {name: entry["updated"] for name, entry in st.session_state.intelligence.items()}
+    top_targets = db.load_target_accounts()
+    top_targets['Last Updated'] = pd.to_datetime(top_targets['Company Name'].map(st.session_state.last_updated))
+    st.session_state.top_targets = top_targets
+
+# === ACCOUNT REGISTRY ===
+# A bare domain or URL typed where a company name was expected, e.g. "brightline.com"
+DOMAIN_LIKE_PATTERN = re.compile(r"^(?:https?://)?(?:www\.)?[a-z0-9-]+(?:\.[a-z0-9-]+)*\.[a-z]{2,}(?:[/?#]\S*)?$", re.IGNORECASE)
+# Hosts whose pages belong to many companies, so their domain says nothing about identity
+SHARED_DOMAINS = {"linkedin.com", "facebook.com", "twitter.com", "x.com", "crunchbase.com", "wikipedia.org",
+                  "github.com", "google.com", "sites.google.com", "medium.com", "bloomberg.com"}
+
+def account_name_key(company_name):
+    """Normalized name used to match accounts, ignoring legal suffixes, case, punctuation and a leading The"""
+    name = core_company_name(company_name).lower().replace("&", " and ")
+    words = re.sub(r"[^\w\s]", " ", name).split()
+    if len(words) > 1 and words[0] == "the":
+        words = words[1:]
+    return " ".join(words)
+
+def domain_name_key(domain):
+    """Name key from the registrable label of a domain: 'go.acme-corp.co.uk' -> 'acme'"""
+    labels = domain.split(".")
+    # Two-letter country codes often sit under a short second level, as in .co.uk or .com.au
+    label = labels[-3] if len(labels) >= 3 and len(labels[-1]) == 2 and len(labels[-2]) <= 3 else labels[-2]
+    return account_name_key(label.replace("-", " "))
+
+def account_aliases(company_name, website=None):
+    """Index keys an account can be found under, strongest first"""
+    name = " ".join(str(company_name).split())
+    name_is_domain = bool(DOMAIN_LIKE_PATTERN.match(name))
+    domain = company_domain(website) or (company_domain(name) if name_is_domain else None)
+    if domain and (domain in SHARED_DOMAINS or not DOMAIN_LIKE_PATTERN.match(domain)):
+        domain = None  # Shared hosts, IP addresses and ports cannot identify a company
+    aliases = []
+    if domain:
+        aliases.append(f"domain:{domain}")
+    name_key = domain_name_key(company_domain(name)) if name_is_domain else account_name_key(name)
+    if name_key:
+        aliases.append(f"name:{name_key}")
+    return aliases, domain, name_is_domain
+
+class AccountRegistry:
+    """Canonical accounts with a hash index from normalized names and domains to account IDs
+
+    "Brightline", "Brightline Inc." and "brightline.com" all resolve to the same
+    account, whose name is then used for every cache key, news query and prompt.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._lock = threading.Lock()
+        self._accounts, self._index = db.load_accounts()  # id -> account, alias -> id
+
+    def resolve(self, company_name, website=None):
+        """Canonical account for a company name and optional website, registering it if new"""
+        return self.resolve_many([(company_name, website)])[0]
+
+    def resolve_many(self, companies):
+        """Resolve (name, website) pairs in one pass, saving all new accounts and aliases together"""
+        changed_accounts, new_aliases, resolved = {}, {}, []
+        with self._lock:
+            for company_name, website in companies:
+                if not isinstance(company_name, str) or not company_name.strip():
+                    # A blank or NaN cell names no company; registering it would create an account called "nan"
+                    resolved.append({"id": None, "name": "", "domain": None})
+                    continue
+                aliases, domain, name_is_domain = account_aliases(company_name, website)
+                if not aliases:
+                    resolved.append({"id": None, "name": str(company_name), "domain": None})
+                    continue
+                # A domain match wins over a name match that points at a different account
+                account_id = next((self._index[alias] for alias in aliases if alias in self._index), None)
+                if (account_id is not None and domain and f"domain:{domain}" not in self._index
+                        and self._accounts[account_id]["domain"] not in (None, domain)):
+                    account_id = None  # Same name on another domain is another company; its name alias stays put
+                if account_id is None:
+                    account_id = "acct_" + hashlib.sha1(aliases[0].encode("utf-8")).hexdigest()[:12]
+                    self._accounts[account_id] = {"id": account_id, "name": " ".join(str(company_name).split()),
+                                                  "domain": domain}
+                    changed_accounts[account_id] = self._accounts[account_id]
+                account = self._accounts[account_id]
+                if not name_is_domain and DOMAIN_LIKE_PATTERN.match(account["name"]):
+                    account["name"] = " ".join(str(company_name).split())  # First real name replaces a bare domain
+                    changed_accounts[account_id] = account
+                if domain and not account["domain"]:
+                    account["domain"] = domain
+                    changed_accounts[account_id] = account
+                for alias in aliases:
+                    if alias not in self._index:
+                        self._index[alias] = new_aliases[alias] = account_id
+                resolved.append(dict(account))
+            if changed_accounts or new_aliases:
+                try:
+                    self.db.save_accounts(list(changed_accounts.values()), new_aliases)
+                except Exception:
+                    logger.exception("Could not save %d accounts", len(changed_accounts))
+        return resolved
+
+    def __len__(self):
+        return len(self._accounts)
+
+@st.cache_resource
+def get_account_registry():
+    """Process-wide account registry shared by every session"""
+    return AccountRegistry(get_territory_db())
+
+def dedupe_accounts(companies):
+    """Resolve (name, website) pairs and return the canonical name for each, plus the unique names in order"""
+    names = [account["name"] for account in get_account_registry().resolve_many(companies)]
+    return names, list(dict.fromkeys(names))
+
+# === PIPELINE IMPORT ===
+PIPELINE_IMPORT_CHUNK_ROWS = 50_000  # Rows parsed and validated at a time
+PIPELINE_IMPORT_MAX_REPORTED_ERRORS = 1000  # Rejected rows kept for display; the rest are only counted
+PIPELINE_REQUIRED_COLUMNS = ["account", "acv", "stage", "close_date", "notes"]
+PIPELINE_OPTIONAL_COLUMNS = ["confidence"]
+
+class PipelineImportReport:
+    """Row counts and a bounded sample of rejected rows from a pipeline CSV import"""
+
+    def __init__(self):
+        self.imported = 0
+        self.rejected = 0
+        self._errors = []
+
+    def add_errors(self, errors):
+        self.rejected += len(errors)
+        kept = sum(len(e) for e in self._errors)
+        if kept < PIPELINE_IMPORT_MAX_REPORTED_ERRORS:
+            self._errors.append(errors.head(PIPELINE_IMPORT_MAX_REPORTED_ERRORS - kept))
+
+    @property
+    def errors(self):
+        if not self._errors:
+            return pd.DataFrame(columns=["row", "account", "errors"])
+        return pd.concat(self._errors, ignore_index=True)
+
+def validate_pipeline_chunk(chunk, first_row):
+    """Validate a raw chunk in vectorized form; return (columns of valid rows, DataFrame of rejected rows)"""
+    account = chunk["account"].fillna("").str.strip()
+    acv = pd.to_numeric(chunk["acv"], errors="coerce")
+    stage = chunk["stage"].fillna("").str.strip()
+    close_date = pd.to_datetime(chunk["close_date"], errors="coerce", format="ISO8601")
+    if "confidence" in chunk.columns:
+        confidence = pd.to_numeric(chunk["confidence"], errors="coerce")
+        bad_confidence = chunk["confidence"].notna() & ~confidence.between(0, 100)
+    else:
+        confidence = pd.Series(float("nan"), index=chunk.index)
+        bad_confidence = pd.Series(False, index=chunk.index)
+
+    checks = {
+        "missing account": account == "",
+        "invalid acv": acv.isna() | (acv < 0),
+        "unknown stage": ~stage.isin(PIPELINE_STAGES),
+        "invalid close_date": close_date.isna(),
+        "confidence not in 0-100": bad_confidence
+    }
+    bad = pd.DataFrame(checks)
+    is_bad = bad.any(axis=1)
+
+    errors = pd.DataFrame({
+        # 1-based file line numbers, counting the header row
+        "row": (first_row + pd.RangeIndex(len(chunk)) + 2)[is_bad.to_numpy()],
+        "account": account[is_bad].to_numpy(),
+        "errors": bad[is_bad].apply(lambda flags: ", ".join(flags.index[flags]), axis=1).to_numpy()
+    }) if is_bad.any() else pd.DataFrame(columns=["row", "account", "errors"])
+
+    good = ~is_bad
+    count = int(good.sum())
+    columns = {
+        "id": new_deal_ids(count),
+        "account": account[good].tolist(),
+        "acv": acv[good].astype(float).tolist(),
+        "stage": stage[good].tolist(),
+        "close_date": close_date[good].dt.strftime("%Y-%m-%d").tolist(),
+        "notes": chunk["notes"][good].fillna("").tolist(),
+        "confidence": confidence[good].astype(object).where(confidence[good].notna(), None).tolist()
+    }
+    return columns, errors
+
+def import_pipeline_csv(file, db, chunk_rows=PIPELINE_IMPORT_CHUNK_ROWS):
+    """Stream a pipeline CSV into the database chunk by chunk, replacing the current pipeline
+
+    Only the parse and validate step is bounded by chunk_rows: the file is never
+    held in memory as a whole. Callers that then reload a PipelineStore from the
+    database still hold every imported row in memory, so the session's footprint
+    grows with the size of the export. Raises ValueError if required columns are
+    missing.
+    """
+    header = pd.read_csv(file, nrows=0).columns
+    missing = [col for col in PIPELINE_REQUIRED_COLUMNS if col not in header]
+    if missing:
+        raise ValueError(f"CSV must contain columns: {', '.join(PIPELINE_REQUIRED_COLUMNS)} (missing {', '.join(missing)})")
+    file.seek(0)
+
+    usecols = PIPELINE_REQUIRED_COLUMNS + [col for col in PIPELINE_OPTIONAL_COLUMNS if col in header]
+    report = PipelineImportReport()
+
+    def valid_chunks():
+        first_row = 0
+        for chunk in pd.read_csv(file, usecols=usecols, dtype={col: "string" for col in usecols},
+                                 chunksize=chunk_rows):
+            columns, errors = validate_pipeline_chunk(chunk, first_row)
+            if len(errors):
+                report.add_errors(errors)
+            first_row += len(chunk)
+            yield columns
+
+    report.imported = db.import_opportunity_chunks(valid_chunks())
+    return report
+
 # === CRM PIPELINE ===
+PIPELINE_PAGE_SIZES = [25, 50, 100, 250]
+
+def show_pipeline_grid(rows):
+    """Editable grid for one page of opportunities; edits are collected and applied as one batch"""
+    columns = ["id", "account", "acv", "stage", "confidence", "close_date", "notes"]
+    original = pd.DataFrame(rows, columns=columns)
+    original["close_date"] = pd.to_datetime(original["close_date"], errors="coerce").dt.date
+    original["confidence"] = pd.to_numeric(original["confidence"], errors="coerce")
+    original["notes"] = original["notes"].fillna("")
+    original["delete"] = False
+    
+    # A new editor key after each apply resets the grid to the stored values
+    version = st.session_state.get("pipeline_grid_version", 0)
+    edited = st.data_editor(
+        original,
+        key=f"pipeline_grid_{version}",
+        hide_index=True,
+        use_container_width=True,
+        disabled=["id", "account"],
+        column_config={
+            "id": None,
+            "account": st.column_config.TextColumn("Account"),
+            "acv": st.column_config.NumberColumn("ACV", min_value=0.0, step=5000.0, format="$%.0f", required=True),
+            "stage": st.column_config.SelectboxColumn("Stage", options=PIPELINE_STAGES, required=True),
+            "confidence": st.column_config.NumberColumn("Confidence (%)", min_value=0, max_value=100, step=5),
+            "close_date": st.column_config.DateColumn("Close Date", format="YYYY-MM-DD", required=True),
+            "notes": st.column_config.TextColumn("Notes"),
+            "delete": st.column_config.CheckboxColumn("Delete")
+        }
+    )
+    
+    updates, deletes = diff_pipeline_grid(original, edited)
+    updates, rejected = validate_grid_updates(edited, updates)
+    pending = len(updates) + len(deletes)
+    col1, col2 = st.columns([1, 3])
+    if col1.button(f"💾 Apply {pending} change(s)", disabled=pending == 0, key="pipeline_grid_apply"):
+        st.session_state.pipeline.apply_batch(updates, deletes, st.session_state.deals)
+        st.session_state.pipeline_grid_version = version + 1
+        st.rerun()
+    if pending:
+        col2.caption(f"{len(updates)} edited, {len(deletes)} marked for deletion — not saved yet")
+    if len(rejected):
+        st.warning(f"{len(rejected)} edited row(s) are invalid and will not be saved")
+        st.dataframe(rejected, hide_index=True, use_container_width=True)
+
+def diff_pipeline_grid(original, edited):
+    """Collect changed fields by deal ID and the IDs marked for deletion"""
+    deletes = edited.loc[edited["delete"], "id"].tolist()
+    updates = {}
+    for col in ["acv", "stage", "confidence", "close_date", "notes"]:
+        before, after = original[col], edited[col]
+        changed = ~((before == after) | (before.isna() & after.isna())) & ~edited["delete"]
+        for deal_id, value in zip(edited.loc[changed, "id"], after[changed]):
+            if col == "close_date":
+                value = value.isoformat() if pd.notna(value) else None
+            elif col in ("acv", "confidence"):
+                value = float(value) if pd.notna(value) else None
+            updates.setdefault(deal_id, {})[col] = value
+    return updates, deletes
+
+def validate_grid_updates(edited, updates):
+    """Check edited rows with the import validator; return (updates of valid rows, DataFrame of rejected rows)"""
+    rows = edited[edited["id"].isin(list(updates))].reset_index(drop=True)
+    if rows.empty:
+        return updates, pd.DataFrame(columns=["account", "errors"])
+    chunk = pd.DataFrame({
+        "account": rows["account"],
+        "acv": rows["acv"],
+        "stage": rows["stage"],
+        "close_date": rows["close_date"].map(lambda value: value.isoformat() if pd.notna(value) else None),
+        "notes": rows["notes"],
+        "confidence": rows["confidence"]
+    }).astype("string")
+    _, errors = validate_pipeline_chunk(chunk, 0)
+    rejected_ids = set(rows["id"].iloc[errors["row"].to_numpy(dtype=int) - 2])  # Rows are numbered as file lines
+    valid = {deal_id: changes for deal_id, changes in updates.items() if deal_id not in rejected_ids}
+    return valid, errors[["account", "errors"]].reset_index(drop=True)
+
+def show_pipeline_cards(rows):
+    """Editable card per opportunity; each edit is applied as soon as it is made"""
+    # Process each deal for potential updates
+    for deal in rows:
+        deal_id = deal['id']
+        col1, col2, col3, col4, col5 = st.columns([2, 1, 1, 2, 1])
+        
+        # Account name (read-only)
+        col1.markdown(f"**{deal['account']}**")
+        
+        # ACV (editable)
+        new_acv = col2.number_input(
+            "ACV",
+            value=float(deal['acv']),
+            min_value=0.0,
+            step=5000.0,
+            key=f"acv_{deal_id}"
+        )
+        
+        # Stage (editable)
+        new_stage = col3.selectbox(
+            "Stage",
+            PIPELINE_STAGES,
+            index=PIPELINE_STAGES.index(deal['stage']),
+            key=f"stage_{deal_id}"
+        )
+        
+        # Notes (editable)
+        new_notes = col4.text_area(
+            "Notes",
+            value=deal['notes'],
+            key=f"notes_{deal_id}"
+        )
+        
+        # Handle ACV changes
+        if new_acv != deal['acv']:
+            st.session_state.pipeline.update(deal_id, acv=float(new_acv))
+        
+        # Handle notes changes
+        if new_notes != deal['notes']:
+            st.session_state.pipeline.update(deal_id, notes=new_notes)
+        
+        # Handle stage changes
+        if new_stage != deal['stage']:
+            if new_stage == "Closed Won":
+                # Move to closed deals
+                st.session_state.pipeline.close_won(deal_id, st.session_state.deals)
+            else:
+                st.session_state.pipeline.update(deal_id, stage=new_stage)
+        
+        # Handle delete
+        if col5.button("❌", key=f"delete_{deal_id}") and deal_id in st.session_state.pipeline:
+            st.session_state.pipeline.remove(deal_id)
+        st.markdown("---")
+
 def show_crm_pipeline():
     st.title("📂 CRM – Pipeline Manager")
     
@@ -558,6 +3307,7 @@ def show_crm_pipeline():
         "account": ["Example Corp", "Sample Inc"],
         "acv": [100000, 150000],
         "stage": ["Discovery", "Proposal"],
+        "confidence": [25, 50],
         "close_date": ["2024-06-30", "2024-07-15"],
         "notes": ["Initial meeting scheduled", "Waiting for legal review"]
     })
@@ -571,26 +3321,32 @@ def show_crm_pipeline():
     )
     
     uploaded_file = st.file_uploader("Upload Pipeline CSV", type="csv", key="pipeline_upload")
-    if uploaded_file:
+    if uploaded_file and uploaded_file.file_id != st.session_state.get("pipeline_file_id"):
         try:
-            df = pd.read_csv(uploaded_file)
-            required_columns = ["account", "acv", "stage", "close_date", "notes"]
-            if all(col in df.columns for col in required_columns):
-                # Clear existing pipeline if new file is uploaded
-                st.session_state.pipeline = []
-                for _, row in df.iterrows():
-                    st.session_state.pipeline.append({
-                        "account": row["account"],
-                        "acv": float(row["acv"]),
-                        "stage": row["stage"],
-                        "close_date": row["close_date"],
-                        "notes": row["notes"]
-                    })
-                st.success("✅ Pipeline uploaded successfully!")
-            else:
-                st.error("❌ CSV must contain columns: account, acv, stage, close_date, notes")
+            # Replace the existing pipeline with the uploaded file, streamed in validated chunks
+            db = get_territory_db()
+            with st.spinner("Importing pipeline..."):
+                report = import_pipeline_csv(uploaded_file, db)
+                # The in-memory store is rebuilt from the database, row by row; it holds the whole pipeline
+                st.session_state.pipeline.clear(persist=False)
+                st.session_state.pipeline.load(db.load_opportunities())
+            st.session_state.pipeline_file_id = uploaded_file.file_id
+            st.session_state.pipeline_import_report = report
+        except ValueError as e:
+            st.error(f"❌ {str(e)}")
         except Exception as e:
             st.error(f"❌ Error uploading file: {str(e)}")
+    
+    report = st.session_state.get("pipeline_import_report")
+    if uploaded_file and report is not None:
+        if report.rejected:
+            st.warning(f"⚠️ Imported {report.imported:,} opportunities; {report.rejected:,} rows were rejected.")
+            with st.expander("Rejected rows"):
+                st.dataframe(report.errors, use_container_width=True)
+                if report.rejected > len(report.errors):
+                    st.caption(f"Showing the first {len(report.errors):,} of {report.rejected:,} rejected rows.")
+        else:
+            st.success(f"✅ Pipeline uploaded successfully! ({report.imported:,} opportunities)")
 
     with st.form("add_pipeline_opportunity"):
         st.subheader("➕ Add Opportunity")
@@ -600,10 +3356,12 @@ def show_crm_pipeline():
         with col2:
             acv = st.number_input("Deal Value (ACV $)", min_value=0.0, step=5000.0, value=0.0)
         with col3:
-            stage = st.selectbox("Stage", ["Prospecting", "Discovery", "Demo", "Proposal", "Commit", "Closed Won"])
-        col4 = st.columns(1)[0]
+            stage = st.selectbox("Stage", PIPELINE_STAGES)
+        col4, col5 = st.columns(2)
         with col4:
             close_date = st.date_input("Expected Close Date", value=date.today(), format="MM/DD/YYYY")
+        with col5:
+            confidence = st.slider("Confidence (%)", min_value=0, max_value=100, value=50, step=5)
         notes = st.text_area("Notes / Next Steps")
         submitted = st.form_submit_button("Add Opportunity")
 
@@ -614,17 +3372,18 @@ def show_crm_pipeline():
                     "account": account,
                     "acv": float(acv),
                     "deal_type": "HR",  # Default to HR, can be updated later
-                    "quarter": f"Q{(date.today().month-1)//3 + 1}"  # Current quarter
+                    "quarter": current_quarter()
                 })
                 st.success(f"✅ Deal for {account} added to Closed Won.")
             else:
                 # Add to pipeline
-                st.session_state.pipeline.append({
+                st.session_state.pipeline.add({
                     "account": account,
                     "acv": float(acv),
                     "stage": stage,
                     "close_date": str(close_date),
-                    "notes": notes
+                    "notes": notes,
+                    "confidence": float(confidence)
                 })
                 st.success(f"✅ Opportunity for {account} added to pipeline.")
 
@@ -632,85 +3391,30 @@ def show_crm_pipeline():
     if st.session_state.pipeline:
         st.subheader("📋 Active Pipeline")
         
-        # Filter out any deals that might have been marked as Closed Won
-        active_pipeline = [deal for deal in st.session_state.pipeline if deal['stage'] != "Closed Won"]
+        # Only one page of opportunities is rendered at a time
+        active_count = st.session_state.pipeline.count_active()
+        col1, col2, col3 = st.columns([2, 1, 1])
+        view = col1.radio("View", ["Grid", "Cards"], horizontal=True, key="pipeline_view")
+        page_size = col2.selectbox("Rows per page", PIPELINE_PAGE_SIZES, index=1, key="pipeline_page_size")
+        page_count = max((active_count + page_size - 1) // page_size, 1)
+        page = col3.number_input("Page", min_value=1, max_value=page_count, value=1, step=1, key="pipeline_page")
+        st.caption(f"{active_count:,} open opportunities · page {page} of {page_count}")
+        page_rows = st.session_state.pipeline.page((page - 1) * page_size, page_size)
         
-        # Process each deal for potential updates
-        for i, deal in enumerate(active_pipeline):
-            col1, col2, col3, col4, col5 = st.columns([2, 1, 1, 2, 1])
-            
-            # Account name (read-only)
-            col1.markdown(f"**{deal['account']}**")
-            
-            # ACV (editable)
-            new_acv = col2.number_input(
-                "ACV",
-                value=float(deal['acv']),
-                min_value=0.0,
-                step=5000.0,
-                key=f"acv_{i}"
-            )
-            
-            # Stage (editable)
-            new_stage = col3.selectbox(
-                "Stage",
-                ["Prospecting", "Discovery", "Demo", "Proposal", "Commit", "Closed Won"],
-                index=["Prospecting", "Discovery", "Demo", "Proposal", "Commit", "Closed Won"].index(deal['stage']),
-                key=f"stage_{i}"
-            )
-            
-            # Notes (editable)
-            new_notes = col4.text_area(
-                "Notes",
-                value=deal['notes'],
-                key=f"notes_{i}"
-            )
-            
-            # Find the actual index in session state
-            actual_index = next((idx for idx, d in enumerate(st.session_state.pipeline) 
-                               if d['account'] == deal['account']), None)
-            
-            if actual_index is not None:
-                # Handle ACV changes
-                if new_acv != deal['acv']:
-                    st.session_state.pipeline[actual_index]['acv'] = float(new_acv)
-                
-                # Handle stage changes
-                if new_stage != deal['stage']:
-                    if new_stage == "Closed Won":
-                        # Add to closed deals
-                        st.session_state.deals.append({
-                            "account": deal['account'],
-                            "acv": float(deal['acv']),
-                            "deal_type": "HR",
-                            "quarter": f"Q{(date.today().month-1)//3 + 1}"
-                        })
-                        # Remove from pipeline
-                        st.session_state.pipeline.pop(actual_index)
-                    else:
-                        st.session_state.pipeline[actual_index]['stage'] = new_stage
-                
-                # Handle notes changes
-                if new_notes != deal['notes']:
-                    st.session_state.pipeline[actual_index]['notes'] = new_notes
-                
-                # Handle delete
-                if col5.button("❌", key=f"delete_{i}"):
-                    st.session_state.pipeline.pop(actual_index)
-            
-            st.markdown("---")
+        if view == "Grid":
+            show_pipeline_grid(page_rows)
+        else:
+            show_pipeline_cards(page_rows)
         
         # Display summary
         st.subheader("📊 Pipeline Summary")
-        df = pd.DataFrame(active_pipeline)
-        total_acv = df['acv'].sum()
-        st.markdown(f"**Total Pipeline ACV:** ${total_acv:,.0f}")
+        totals = st.session_state.aggregates
+        st.markdown(f"**Total Pipeline ACV:** ${totals.pipeline_acv:,.0f}")
         
         # Stage breakdown
-        for stage in ["Prospecting", "Discovery", "Demo", "Proposal", "Commit"]:
-            stage_deals = df[df['stage'] == stage]
-            if not stage_deals.empty:
-                st.markdown(f"- **{stage}**: {len(stage_deals)} deals (${stage_deals['acv'].sum():,.0f})")
+        for stage in OPEN_STAGES:
+            if totals.stage_count[stage]:
+                st.markdown(f"- **{stage}**: {totals.stage_count[stage]} deals (${totals.stage_acv[stage]:,.0f})")
     else:
         st.info("No deals in pipeline.")
 
@@ -727,166 +3431,442 @@ def show_crm_pipeline():
                 st.session_state.deals.pop(i)
             st.markdown("---")
         
-        # Calculate and display total Closed Won ACV
-        total_closed_acv = sum(deal['acv'] for deal in st.session_state.deals)
+        # Display total Closed Won ACV
+        total_closed_acv = st.session_state.aggregates.booked_acv
         st.markdown(f"**Total Closed Won ACV:** ${total_closed_acv:,.0f}")
         
         # Display progress towards quota if quota is set
         if st.session_state.quota:
-            quota_percentage = (total_closed_acv / st.session_state.quota) * 100
+            quota_percentage = st.session_state.aggregates.quota_percentage(st.session_state.quota)
             st.progress(min(quota_percentage / 100, 1.0), text=f"{quota_percentage:.1f}% to quota")
 
+# === NEWS ===
+NEWS_CACHE_TTL_SECONDS = 15 * 60  # News goes stale quickly, so only reuse it briefly
+NEWS_CACHE_MAX_ENTRIES = 1000
+NEWS_API_URL = os.getenv("NEWSDATA_API_URL", "https://newsdata.io/api/1/news")  # Overridable for local mocks
+NEWS_ARTICLES_PER_COMPANY = 5
+NEWS_BATCH_SIZE = 5  # Companies packed into one OR query
+NEWS_QUERY_MAX_CHARS = 100  # NewsData.io limit on the q parameter
+NEWS_BATCH_PAGE_SIZE = 10
+NEWS_BATCH_MAX_PAGES = 3  # Pages read per batch before falling back to single queries
+
+def normalize_company_name(company_name):
+    """Normalize a company name into a news cache key"""
+    return " ".join(str(company_name).lower().split())
+
+class NewsCache:
+    """In-memory TTL cache of parsed articles that collapses concurrent identical lookups"""
+
+    def __init__(self, ttl_seconds=NEWS_CACHE_TTL_SECONDS, max_entries=NEWS_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = {}  # key -> (fetched_at, articles)
+        self._inflight = {}  # key -> Future shared by callers waiting on the same lookup
+        self._lock = threading.Lock()
+
+    def get_or_fetch(self, key, fetch):
+        """Return cached articles for key, or run fetch once no matter how many callers ask at the same time"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[0] <= self.ttl_seconds:
+                return entry[1]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+
+        if not owner:
+            return future.result()
+
+        try:
+            articles = fetch()
+            with self._lock:
+                self._store(key, articles)
+            future.set_result(articles)
+            return articles
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def claim(self, keys):
+        """Reserve keys that are neither cached nor being fetched; the caller must resolve() each one it gets back"""
+        claimed = []
+        with self._lock:
+            now = time.time()
+            for key in dict.fromkeys(keys):
+                entry = self._entries.get(key)
+                if entry is not None and now - entry[0] <= self.ttl_seconds or key in self._inflight:
+                    continue
+                self._inflight[key] = Future()
+                claimed.append(key)
+        return claimed
+
+    def resolve(self, key, articles=None, error=None):
+        """Publish the result of a claimed lookup to everyone waiting on it"""
+        with self._lock:
+            future = self._inflight.pop(key, None)
+            if error is None:
+                self._store(key, articles)
+        if future is not None:
+            if error is None:
+                future.set_result(articles)
+            else:
+                future.set_exception(error)
+
+    def _store(self, key, articles):
+        now = time.time()
+        if len(self._entries) >= self.max_entries:
+            # Drop expired entries first, then the oldest ones
+            self._entries = {k: v for k, v in self._entries.items() if now - v[0] <= self.ttl_seconds}
+            while len(self._entries) >= self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+        self._entries[key] = (now, articles)
+
+@st.cache_resource
+def get_news_cache():
+    """Process-wide news cache shared by every session"""
+    return NewsCache()
+
+def parse_news_article(article):
+    """Convert a NewsData.io result into the article dict used across the app"""
+    return {
+        "title": article.get('title') or 'No title',
+        "description": article.get('description') or 'No description',
+        "pub_date": article.get('pubDate') or 'No date',
+        "link": article.get('link') or '#',
+        "source_url": article.get('source_url')
+    }
+
+def request_news_articles(company_name, api_key):
+    """Call the NewsData.io API and parse the results into article dicts"""
+    # Prepare the request
+    params = {
+        'apikey': api_key,
+        'q': company_name,
+        'language': 'en',
+        'size': NEWS_ARTICLES_PER_COMPANY  # Get the most recent articles
+    }
+
+    # Make the API call
+    response = get_http_client().get(NEWS_API_URL, params=params, target="newsdata")
+    response.raise_for_status()
+    news_data = response.json()
+
+    return [parse_news_article(article) for article in news_data.get('results') or []]
+
+# Legal suffixes are dropped so "Acme Corp" also matches articles that only say "Acme"
+COMPANY_SUFFIX_PATTERN = re.compile(
+    r"[\s,]+(?:inc|incorporated|corp|corporation|co|company|llc|ltd|limited|plc|group|holdings|gmbh|sa|ag)\.?$",
+    re.IGNORECASE
+)
+# Single words that are too common to attribute articles to by name alone
+NEWS_AMBIGUOUS_WORDS = {
+    "apple", "amazon", "target", "square", "block", "shell", "delta", "gap", "visa", "ford", "meta",
+    "oracle", "box", "slack", "zoom", "uber", "dell", "intel", "sprint", "frontier", "pilot", "unity"
+}
+
+def company_domain(website):
+    """Bare domain of a website value such as 'https://www.acme.com/about' -> 'acme.com'"""
+    if not isinstance(website, str) or not website.strip():
+        return None
+    website = website.strip().lower()
+    netloc = urlparse(website if "://" in website else f"http://{website}").netloc
+    return netloc.removeprefix("www.") or None
+
+def core_company_name(company_name):
+    """Company name without legal suffixes, used for batched queries and matching"""
+    name = " ".join(str(company_name).split())
+    while True:
+        stripped = COMPANY_SUFFIX_PATTERN.sub("", name)
+        if stripped == name or not stripped:
+            return name
+        name = stripped
+
+def plan_news_batches(companies):
+    """Split (company name, website) pairs into OR-query batches and names that need their own query
+
+    A name goes to its own query when it is short, a common word, contains quotes,
+    or overlaps another name, since articles could not be attributed to it reliably.
+    """
+    cores = {name: core_company_name(name) for name, _ in companies}
+    patterns = {name: re.compile(rf"\b{re.escape(core)}\b", re.IGNORECASE) for name, core in cores.items()}
+    batches, singles, batch, query_length = [], [], [], 0
+    for name, website in companies:
+        core = cores[name]
+        overlaps = any(other != name and patterns[name].search(cores[other]) for other in cores)
+        clause = f'"{core}"'
+        if (len(core) < 4 or core.lower() in NEWS_AMBIGUOUS_WORDS or '"' in core or overlaps
+                or len(clause) > NEWS_QUERY_MAX_CHARS):
+            singles.append((name, website))
+            continue
+        added_length = len(clause) + (len(" OR ") if batch else 0)
+        if batch and (len(batch) >= NEWS_BATCH_SIZE or query_length + added_length > NEWS_QUERY_MAX_CHARS):
+            batches.append(batch)
+            batch, query_length, added_length = [], 0, len(clause)
+        batch.append((name, website, patterns[name], company_domain(website)))
+        query_length += added_length
+    if batch:
+        batches.append(batch)
+    return batches, singles
+
+def request_news_batch(batch, api_key):
+    """Run one OR query for a batch of companies, paging until each has enough articles
+
+    Returns the articles per company and whether the results were read to the end,
+    which tells the caller if a company without articles really had no news.
+    """
+    query = " OR ".join(f'"{core_company_name(name)}"' for name, _, _, _ in batch)
+    matched = {name: [] for name, _, _, _ in batch}
+    params = {'apikey': api_key, 'q': query, 'language': 'en', 'size': NEWS_BATCH_PAGE_SIZE}
+    next_page, pages = None, 0
+    while True:
+        if next_page:
+            params['page'] = next_page
+        response = get_http_client().get(NEWS_API_URL, params=params, target="newsdata_batch")
+        response.raise_for_status()
+        news_data = response.json()
+        pages += 1
+
+        for raw in news_data.get('results') or []:
+            article = parse_news_article(raw)
+            text = f"{article['title']} {article['description']}"
+            article_domains = {company_domain(article['link']), company_domain(article['source_url'])}
+            for name, _, pattern, domain in batch:
+                if len(matched[name]) >= NEWS_ARTICLES_PER_COMPANY:
+                    continue
+                if pattern.search(text) or (domain and (domain in article_domains or domain in text.lower())):
+                    matched[name].append(article)
+
+        next_page = news_data.get('nextPage')
+        if not next_page or all(len(articles) >= NEWS_ARTICLES_PER_COMPANY for articles in matched.values()):
+            return matched, pages, not next_page
+        if pages >= NEWS_BATCH_MAX_PAGES:
+            return matched, pages, False
+
+def fill_news_cache(companies, api_key, cache):
+    """Fetch news for companies already claimed in the cache and resolve every claim"""
+    unresolved = {normalize_company_name(name) for name, _ in companies}
+
+    def resolve(name, articles=None, error=None):
+        key = normalize_company_name(name)
+        unresolved.discard(key)
+        cache.resolve(key, articles, error)
+
+    requests_made = 0
+    try:
+        batches, singles = plan_news_batches(companies)
+        for batch in batches:
+            try:
+                matched, pages, complete = request_news_batch(batch, api_key)
+                requests_made += pages
+            except Exception:
+                logger.exception("Batched news query failed; falling back to single queries")
+                singles.extend((name, website) for name, website, _, _ in batch)
+                continue
+            for name, website, _, _ in batch:
+                if matched[name] or complete:
+                    resolve(name, matched[name])
+                else:
+                    # Paging stopped early, so an empty result is not proof there is no news
+                    singles.append((name, website))
+        for name, _ in singles:
+            requests_made += 1
+            try:
+                resolve(name, request_news_articles(name, api_key))
+            except Exception as e:
+                resolve(name, error=e)
+        logger.info("Fetched news for %d companies in %d NewsData requests", len(companies), requests_made)
+    finally:
+        # Never leave callers waiting on a claim that was not filled
+        for key in list(unresolved):
+            cache.resolve(key, error=RuntimeError("News prefetch did not complete"))
+
+def prefetch_news(companies, executor=None):
+    """Fetch news for many (company name, website) pairs using batched queries
+
+    Companies are claimed in the news cache before this returns, so later calls to
+    fetch_news_articles wait for the batch instead of sending their own requests.
+    Runs on the executor if one is given, otherwise inline.
+    """
+    newsdata_api_key = st.secrets.get("NEWSDATA_API_KEY")
+    if not newsdata_api_key:
+        return
+    cache = get_news_cache()
+    by_key = {normalize_company_name(name): (name, website) for name, website in companies}
+    companies = [by_key[key] for key in cache.claim(by_key)]
+    if not companies:
+        return
+    if executor is None:
+        fill_news_cache(companies, newsdata_api_key, cache)
+    else:
+        executor.submit(fill_news_cache, companies, newsdata_api_key, cache)
+
+class NewsUnavailable(Exception):
+    """News could not be fetched; the message is meant to be shown to the user"""
+
+def fetch_news_articles(company_name):
+    """Fetch recent articles about a company, reusing cached and in-flight lookups
+
+    Returns a possibly empty list of articles. Raises NewsUnavailable when the API
+    key is missing or the lookup fails; this runs on worker threads too, so it
+    never renders anything itself and leaves messages to the page code.
+    """
+    # Get NewsData API key from Streamlit secrets
+    newsdata_api_key = st.secrets.get("NEWSDATA_API_KEY")
+    if not newsdata_api_key:
+        raise NewsUnavailable("NewsData.io API key not configured. Please add NEWSDATA_API_KEY to your secrets.toml file.")
+
+    try:
+        with span("news_lookup") as attrs:
+            attrs["cache"] = True  # Also true when another caller's in-flight request is reused
+
+            def fetch():
+                attrs["cache"] = False
+                return request_news_articles(company_name, newsdata_api_key)
+
+            return get_news_cache().get_or_fetch(normalize_company_name(company_name), fetch) or []
+    except Exception as e:
+        raise NewsUnavailable(f"Error fetching news: {str(e)}") from e
+
+def format_news(articles):
+    """Format parsed articles as a markdown list"""
+    if not articles:
+        return None
+
+    news_items = []
+    for article in articles:
+        # Format the date
+        try:
+            date_obj = datetime.strptime(article['pub_date'], "%Y-%m-%d %H:%M:%S")
+            formatted_date = date_obj.strftime("%B %d, %Y")
+        except ValueError:
+            formatted_date = article['pub_date']
+
+        # Format each article as a markdown bullet point
+        news_items.append(f"* **{article['title']}** ({formatted_date})\n  {article['description']}\n  [Read more]({article['link']})")
+
+    # Return formatted news as a markdown list
+    return "\n\n".join(news_items)
+
 # === CALL PREP SHEET ===
+HTML_HEAD_MAX_BYTES = 256 * 1024  # Stop reading a homepage here even if </head> never arrived
+HEAD_TAGS = SoupStrainer(["title", "meta", "script"])
+ORGANIZATION_TYPES = {
+    "Organization", "Corporation", "LocalBusiness", "OnlineBusiness", "NGO",
+    "EducationalOrganization", "NewsMediaOrganization"
+}
+ORGANIZATION_FIELDS = [
+    "name", "legalName", "url", "logo", "description", "sameAs", "foundingDate", "numberOfEmployees", "address"
+]
+
+try:
+    import lxml  # noqa: F401  Faster parser when installed
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+def find_json_ld_organization(data):
+    """Return the first organization-like node in a JSON-LD document"""
+    nodes = data if isinstance(data, list) else [data]
+    for node in nodes:
+        if not isinstance(node, dict):
+            continue
+        types = node.get("@type")
+        types = set(types) if isinstance(types, list) else {types}
+        if types & ORGANIZATION_TYPES:
+            return node
+        nested = find_json_ld_organization(node.get("@graph") or node.get("publisher") or [])
+        if nested:
+            return nested
+    return None
+
+def parse_head_metadata(html):
+    """Collect title, meta description, Open Graph and JSON-LD organization data from page markup"""
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=HEAD_TAGS)
+    metadata = {"title": None, "description": None, "open_graph": {}, "organization": {}}
+    if soup.title and soup.title.string:
+        metadata["title"] = " ".join(soup.title.string.split())
+
+    for meta in soup.find_all("meta"):
+        key = (meta.get("property") or meta.get("name") or "").strip().lower()
+        content = (meta.get("content") or "").strip()
+        if not key or not content:
+            continue
+        if key == "description" and metadata["description"] is None:
+            metadata["description"] = content
+        elif key.startswith("og:"):
+            metadata["open_graph"].setdefault(key[3:], content)
+
+    for script in soup.find_all("script", type="application/ld+json"):
+        try:
+            organization = find_json_ld_organization(json.loads(script.string or ""))
+        except ValueError:
+            continue
+        if organization:
+            metadata["organization"] = {k: organization[k] for k in ORGANIZATION_FIELDS if k in organization}
+            break
+    return metadata
+
 def extract_company_info(url):
     """Extract basic company information from website"""
     try:
-        response = requests.get(url)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Get company name from title
-        company_name = soup.title.string if soup.title else urlparse(url).netloc
+        # Only the <head> is needed, so stop reading there instead of downloading the whole page
+        response = get_http_client().get(url, revalidate=True, max_bytes=HTML_HEAD_MAX_BYTES, stop_at=b"</head>",
+                                         target="website")
+        response.raise_for_status()
+        metadata = parse_head_metadata(response.content)
+        organization = metadata["organization"]
+        open_graph = metadata["open_graph"]
         
-        # Get meta description
-        meta_desc = soup.find('meta', {'name': 'description'})
-        description = meta_desc['content'] if meta_desc else ""
+        # Prefer the declared organization name over the page title
+        company_name = (organization.get("name") or open_graph.get("site_name") or metadata["title"]
+                        or urlparse(url).netloc)
+        description = metadata["description"] or open_graph.get("description") or organization.get("description") or ""
         
         return {
             "name": company_name,
             "description": description,
-            "url": url
+            "url": url,
+            "open_graph": open_graph,
+            "organization": organization
         }
     except Exception as e:
         return {
             "name": urlparse(url).netloc,
             "description": "",
-            "url": url
-        }
-
-def fetch_news(company_name):
-    """Fetch recent news about a company using NewsData.io API"""
-    try:
-        # Get NewsData API key from Streamlit secrets
-        newsdata_api_key = st.secrets.get("NEWSDATA_API_KEY")
-        if not newsdata_api_key:
-            st.warning("⚠️ NewsData.io API key not configured. Please add NEWSDATA_API_KEY to your secrets.toml file.")
-            return None
-
-        # NewsData.io API endpoint
-        search_url = "https://newsdata.io/api/1/news"
-        
-        # Prepare the request
-        params = {
-            'apikey': newsdata_api_key,
-            'q': company_name,
-            'language': 'en',
-            'size': 5  # Get 5 most recent articles
+            "url": url,
+            "open_graph": {},
+            "organization": {}
         }
 
-        # Make the API call
-        response = requests.get(search_url, params=params)
-        response.raise_for_status()
-        news_data = response.json()
-
-        if not news_data.get('results'):
-            st.warning(f"⚠️ No recent news found for {company_name}")
-            return None
-
-        # Format the news articles
-        news_items = []
-        for article in news_data['results']:
-            title = article.get('title', 'No title')
-            description = article.get('description', 'No description')
-            pub_date = article.get('pubDate', 'No date')
-            link = article.get('link', '#')
-            
-            # Format the date
-            try:
-                from datetime import datetime
-                date_obj = datetime.strptime(pub_date, "%Y-%m-%d %H:%M:%S")
-                formatted_date = date_obj.strftime("%B %d, %Y")
-            except:
-                formatted_date = pub_date
-
-            # Format each article as a markdown bullet point
-            news_items.append(f"* **{title}** ({formatted_date})\n  {description}\n  [Read more]({link})")
-
-        # Return formatted news as a markdown list
-        return "\n\n".join(news_items)
-
-    except Exception as e:
-        st.error(f"Error fetching news: {str(e)}")
-        return None
-
-def generate_prep_sheet(company_info):
-    """Generate call prep sheet using OpenAI"""
+def generate_prep_sheet(company_info, force_refresh=False, articles=None, on_token=None):
+    """Generate call prep sheet sections ({key: bullets}) using OpenAI, or an error message"""
     try:
-        # Get company name and recent news
+        # Get company name and recent news, reusing articles the caller already fetched
         company_name = company_info['name']
-        recent_news = fetch_news(company_name)
-        
-        # Build the prompt
-        prompt = f"""You are a senior business strategy expert preparing a high-level briefing for a technology sales executive. Your analysis should focus on strategic implications, growth opportunities, and technology enablement.
-
-Company Name: {company_name}
-
-Recent Updates:
-{recent_news if recent_news else "No recent news available."}
-
-Create a strategic analysis that connects recent developments to business outcomes and technology opportunities. Structure your response with these sections:
-
-**Strategic Business Context:**
-- Core business model and market position
-- Key growth drivers and revenue streams
-- Recent strategic moves (M&A, funding, leadership changes)
-- Competitive dynamics and market share implications
-
-**Growth Triggers & Risk Factors:**
-- Recent funding rounds and their strategic implications
-- M&A activity and integration challenges/opportunities
-- Leadership changes and organizational impact
-- Regulatory changes affecting business model
-- Market expansion or contraction signals
-
-**Technology Enablement Opportunities:**
-- Current technology gaps affecting growth or margins
-- Digital transformation initiatives in progress
-- Specific areas where Workday could drive:
-  * Revenue expansion (e.g., new market entry, product innovation)
-  * Margin improvement (e.g., operational efficiency, cost reduction)
-  * Risk mitigation (e.g., compliance, talent management)
-  * Strategic advantage (e.g., data-driven decision making)
-
-**Executive Conversation Starters:**
-- Key business challenges to explore
-- Strategic initiatives to align with
-- Metrics that matter to the executive team
-- Recent developments to reference
-- Potential ROI scenarios to discuss
-
-Important:
-- Use the exact company name: {company_name}
-- Focus on strategic implications, not just facts
-- Connect recent news to business outcomes
-- Frame insights in terms of revenue, margin, and growth
-- Use markdown formatting with bold headers and bullet points
-- Be specific and cite relevant information from the news
-- Maintain an executive-level perspective throughout"""
+        if articles is None:
+            try:
+                articles = fetch_news_articles(company_name)
+            except NewsUnavailable as e:
+                logger.warning("No news for %s: %s", company_name, e)
+                articles = []
+        context = f"Company Name: {company_name}"
+        if company_info.get('description'):
+            context += f"\nWebsite Description: {company_info['description']}"
 
-        st.write("Sending request to OpenAI...")  # Debug info
-        completion = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are a senior business strategy expert with deep experience in technology transformation. Your analysis should demonstrate strategic thinking, connect dots between recent developments and business outcomes, and focus on executive-level insights. Avoid generic statements and focus on specific, actionable insights that matter to C-level executives."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1000
+        return PREP_SHEET_PROMPT.complete(
+            context,
+            articles=articles or [],
+            company_name=company_name,
+            force_refresh=force_refresh,
+            on_token=on_token
         )
-        st.write("Received response from OpenAI")  # Debug info
-        
-        return completion.choices[0].message.content
     except Exception as e:
-        st.error(f"Detailed error: {str(e)}")  # More detailed error message
+        logger.exception("Prep sheet generation failed for %s", company_info.get('name'))
         return f"Error generating prep sheet: {str(e)}"
 
 def show_call_prep():
@@ -929,21 +3909,27 @@ def show_call_prep():
     </style>
     """, unsafe_allow_html=True)
     
-    # Check for OpenAI API key
-    if not os.getenv("OPENAI_API_KEY"):
-        st.error("⚠️ OpenAI API key not found. Please set the OPENAI_API_KEY environment variable.")
-        st.info("You can set it by running: export OPENAI_API_KEY=your_api_key_here")
+    # Check for OpenAI API key (the client itself is created on first use)
+    try:
+        has_api_key = bool(st.secrets.get("OPENAI_API_KEY"))
+    except Exception:
+        has_api_key = False
+    if not has_api_key:
+        st.error("⚠️ OpenAI API key not found. Please add OPENAI_API_KEY to your secrets.toml file.")
         return
     
     # URL input
     url = st.text_input("Enter Company Website URL", placeholder="https://www.example.com")
+    force_refresh = st.checkbox("Force refresh (skip cached prep sheet)", key="prep_force_refresh")
     
     if st.button("Generate Prep Sheet"):
         if url:
             try:
                 with st.spinner("Analyzing company and generating prep sheet..."):
-                    # Extract company info
+                    # Extract company info and match it to a known account by domain or name
                     company_info = extract_company_info(url)
+                    account = get_account_registry().resolve(company_info['name'], url)
+                    company_info['name'] = account['name']
                     
                     # Create main container for the prep sheet
                     with st.container():
@@ -951,10 +3937,19 @@ def show_call_prep():
                         
                         # Company header
                         st.markdown(f"## {company_info['name']}")
+                        if company_info['description']:
+                            st.caption(company_info['description'])
                         st.markdown("---")
                         
-                        # Get recent news
-                        recent_news = fetch_news(company_info['name'])
+                        # Get recent news once and share it with the prep sheet prompt
+                        try:
+                            articles = fetch_news_articles(company_info['name'])
+                            if not articles:
+                                st.warning(f"⚠️ No recent news found for {company_info['name']}")
+                        except NewsUnavailable as e:
+                            st.warning(f"⚠️ {str(e)}")
+                            articles = []
+                        recent_news = format_news(articles)
                         if recent_news:
                             st.markdown('<div class="news-updates">', unsafe_allow_html=True)
                             st.markdown("### 📰 Recent Company Updates")
@@ -966,19 +3961,22 @@ def show_call_prep():
                             st.markdown('</div>', unsafe_allow_html=True)
                             st.write("")
                         
-                        # Generate prep sheet
-                        prep_content = generate_prep_sheet(company_info)
-                        
-                        if prep_content.startswith("Error"):
-                            st.error(prep_content)
+                        # Stream a draft of the prep sheet, then replace it with the sectioned layout
+                        stream = StreamingMarkdown("prep-content", f"Call Prep sheet for {company_info['name']}")
+                        prep_sheet = generate_prep_sheet(company_info, force_refresh=force_refresh,
+                                                         articles=articles, on_token=stream)
+                        if isinstance(prep_sheet, str):  # An error message
+                            stream.finish(prep_sheet, show=False)
+                            st.error(prep_sheet)
                             return
+                        stream.finish(PREP_SHEET_PROMPT.render(prep_sheet), show=False)
                         
                         # Company Summary
                         st.markdown('<div class="prep-section">', unsafe_allow_html=True)
                         st.markdown("### 📌 Company Summary")
                         st.markdown(f"""
                         <div class="prep-content">
-                            {extract_section(prep_content, "Strategic Business Context") or "_No data available._"}
+                            {format_section(prep_sheet.get("strategic_context"))}
                         </div>
                         """, unsafe_allow_html=True)
                         st.markdown('</div>', unsafe_allow_html=True)
@@ -989,7 +3987,7 @@ def show_call_prep():
                         st.markdown("### 📈 Industry Trends")
                         st.markdown(f"""
                         <div class="prep-content">
-                            {extract_section(prep_content, "Growth Triggers & Risk Factors") or "_No data available._"}
+                            {format_section(prep_sheet.get("growth_triggers"))}
                         </div>
                         """, unsafe_allow_html=True)
                         st.markdown('</div>', unsafe_allow_html=True)
@@ -1000,7 +3998,7 @@ def show_call_prep():
                         st.markdown("### 💼 Workday Fit/Value")
                         st.markdown(f"""
                         <div class="prep-content">
-                            {extract_section(prep_content, "Technology Enablement Opportunities") or "_No data available._"}
+                            {format_section(prep_sheet.get("technology_opportunities"))}
                         </div>
                         """, unsafe_allow_html=True)
                         st.markdown('</div>', unsafe_allow_html=True)
@@ -1011,7 +4009,7 @@ def show_call_prep():
                         st.markdown("### 🚨 Trigger Events")
                         st.markdown(f"""
                         <div class="prep-content">
-                            {extract_section(prep_content, "Executive Conversation Starters") or "_No data available._"}
+                            {format_section(prep_sheet.get("conversation_starters"))}
                         </div>
                         """, unsafe_allow_html=True)
                         st.markdown('</div>', unsafe_allow_html=True)
@@ -1024,33 +4022,45 @@ def show_call_prep():
         else:
             st.warning("Please enter a company website URL")
 
-def extract_section(content, section_name):
-    """Extract a specific section from the GPT response"""
-    try:
-        # Find the section header
-        start_idx = content.find(f"**{section_name}:**")
-        if start_idx == -1:
-            return None
-            
-        # Find the next section or end of content
-        next_section = content.find("**", start_idx + len(section_name) + 4)
-        if next_section == -1:
-            # This is the last section
-            return content[start_idx:].strip()
-        else:
-            # Extract until the next section
-            return content[start_idx:next_section].strip()
-    except:
-        return None
+def format_section(bullets):
+    """Markdown bullet list for one prep sheet section"""
+    return "\n".join(f"- {bullet}" for bullet in bullets) if bullets else "_No data available._"
+
+# === APP ===
+def main():
+    """Render one run of the Streamlit page; the functions above stay importable without it"""
+    st.set_page_config(page_title="Territory Suite", layout="wide")
+    st.markdown(APP_STYLES, unsafe_allow_html=True)
+    section = show_sidebar()
+
+    # Session state init
+    if "aggregates" not in st.session_state:
+        load_territory_state(get_territory_db())
+    if "quota" not in st.session_state:
+        st.session_state.quota = 850000
+    if "uploaded_accounts" not in st.session_state:
+        st.session_state.uploaded_accounts = None
+    if "top_targets_file_id" not in st.session_state:
+        st.session_state.top_targets_file_id = None
+
+    # Router
+    with span("page_render", section=section):
+        if section == "🏠 Home":
+            show_home()
+        elif section == "📊 Quota Tracker":
+            show_quota_tracker()
+        elif section == "🔍 Account Search":
+            show_account_search()
+        elif section == "📁 Top Targets":
+            show_top_targets()
+        elif section == "📞 Call Prep":
+            show_call_prep()
+        elif section == "📂 CRM":
+            show_crm_pipeline()
+        elif section == "⚙️ Performance":
+            show_performance_panel()
+
+    show_llm_cache_stats()
 
-# === ROUTER ===
-if section == "🏠 Home":
-    show_home()
-elif section == "📊 Quota Tracker":
-    show_quota_tracker()
-elif section == "🔍 Account Search":
-    show_account_search()
-elif section == "📁 Top Targets":
-    show_top_targets()
-elif section == "📂 CRM":
-    show_crm_pipeline()
+if __name__ == "__main__":
+    main()
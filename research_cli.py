@@ -0,0 +1,238 @@
+"""Headless batch research: news and strategic intelligence for every account in a CSV.
+
+Reads the same CSVs as the app (a 'Company Name' column and optionally 'Website',
+as in accounts.csv or the Top Targets upload), resolves rows to canonical
+accounts, and researches each account once on a thread pool while the next
+window of accounts has its news fetched in batched queries. Results are written
+as they complete, to JSON Lines or to a directory of Parquet part files.
+
+The output doubles as the checkpoint: rerunning the same command skips accounts
+that already have a successful record, so an interrupted run resumes where it
+stopped. Failed accounts are recorded too and retried on the next run; when an
+account appears more than once, its last record wins. Results are also saved to
+the territory database so the Top Targets dashboard picks them up.
+
+API keys come from .streamlit/secrets.toml in the working directory, as for the
+app. Only main.py's functions are used; its page code runs under `streamlit run`,
+not on import.
+
+Usage:
+    python research_cli.py accounts.csv --output intelligence.jsonl [--workers 8]
+                           [--format jsonl|parquet] [--checkpoint-every 50] [--limit N]
+                           [--force-refresh] [--classify] [--no-db]
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import main as app  # noqa: E402
+
+# Outside `streamlit run` there is no script context, which Streamlit's caching decorators warn about
+logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
+
+MAX_PREFETCH_WINDOW = app.NEWS_CACHE_MAX_ENTRIES // 4  # Prefetched news must still be cached when its turn comes
+
+
+class JsonlResults:
+    """Append-only JSON Lines output; every complete line is a finished account"""
+
+    def __init__(self, path):
+        self.path = path
+        self.completed = set()
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                data = f.read()
+            # A run killed mid-write can leave a partial last line; drop it before appending
+            end = data.rfind(b"\n") + 1
+            if end < len(data):
+                with open(path, "r+b") as f:
+                    f.truncate(end)
+            for line in data[:end].splitlines():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("status") == "done":
+                    self.completed.add(record["account_id"])
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, record):
+        self._file.write(json.dumps(record, default=str) + "\n")
+        self._file.flush()
+
+    def checkpoint(self):
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self.checkpoint()
+        self._file.close()
+
+
+class ParquetResults:
+    """Directory of Parquet part files, one per checkpoint; nested fields are stored as JSON text"""
+
+    def __init__(self, path):
+        self.path = path
+        self.completed = set()
+        self._buffer = []
+        os.makedirs(path, exist_ok=True)
+        parts = sorted(glob.glob(os.path.join(path, "part-*.parquet")))
+        for part in parts:
+            done = pd.read_parquet(part, columns=["account_id", "status"])
+            self.completed.update(done.loc[done["status"] == "done", "account_id"])
+        self._next_part = len(parts)
+
+    def write(self, record):
+        self._buffer.append(dict(record, events=json.dumps(record["events"]), articles=json.dumps(record["articles"])))
+
+    def checkpoint(self):
+        """Write buffered records as a new part file, atomically so readers never see half a part"""
+        if not self._buffer:
+            return
+        final = os.path.join(self.path, f"part-{self._next_part:05d}.parquet")
+        temporary = os.path.join(self.path, f".part-{self._next_part:05d}.parquet.tmp")  # Hidden from dataset readers
+        pd.DataFrame(self._buffer).to_parquet(temporary, index=False)
+        os.replace(temporary, final)
+        self._next_part += 1
+        self._buffer = []
+
+    def close(self):
+        self.checkpoint()
+
+
+def read_accounts(path):
+    """Unique accounts in a CSV as (account, website) pairs, in file order"""
+    df = pd.read_csv(path)
+    if "Company Name" not in df.columns:
+        raise ValueError("CSV must contain a 'Company Name' column")
+    df = df.dropna(subset=["Company Name"])
+    websites = df["Website"] if "Website" in df.columns else pd.Series(None, index=df.index)
+    rows = [(str(name), website if isinstance(website, str) and website.strip() else None)
+            for name, website in zip(df["Company Name"], websites)]
+    unique = {}
+    for account, (_, website) in zip(app.get_account_registry().resolve_many(rows), rows):
+        key = account["id"] or account["name"]
+        if key not in unique:
+            unique[key] = (account, website)
+        elif website and not unique[key][1]:
+            unique[key] = (account, website)
+    return len(rows), list(unique.values())
+
+
+def research(account, website, options):
+    started = time.perf_counter()
+    entry, articles = app.research_company(account["name"], website or account["domain"] or "",
+                                           force_refresh=options.force_refresh, classify=options.classify)
+    if not options.no_db:
+        try:
+            app.get_territory_db().save_intelligence(account["name"], entry)
+        except Exception:
+            app.logger.exception("Could not save intelligence for %s", account["name"])
+    failed = entry["content"].startswith("Error")
+    return {
+        "account_id": account["id"] or account["name"],
+        "company": account["name"],
+        "website": website or account["domain"],
+        "status": "failed" if failed else "done",
+        "content": entry["content"],
+        "news_error": entry.get("news_error"),
+        "events": entry["events"],
+        "articles": [{"title": a["title"], "link": a["link"], "published": a["pub_date"]} for a in articles],
+        "updated": entry["updated"].isoformat(),
+        "seconds": round(time.perf_counter() - started, 2)
+    }
+
+
+def run(accounts, results, options):
+    """Research accounts window by window, prefetching the next window's news; returns (done, failed)"""
+    window = max(1, min(options.workers * 8, MAX_PREFETCH_WINDOW))
+    windows = [accounts[start:start + window] for start in range(0, len(accounts), window)]
+    done = failed = since_checkpoint = 0
+    prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="news_prefetch")
+    executor = ThreadPoolExecutor(max_workers=options.workers, thread_name_prefix="research")
+    try:
+        for w, batch in enumerate(windows):
+            if w == 0:
+                app.prefetch_news([(account["name"], website) for account, website in batch], prefetcher)
+            if w + 1 < len(windows):
+                app.prefetch_news([(account["name"], website) for account, website in windows[w + 1]], prefetcher)
+            futures = [executor.submit(research, account, website, options) for account, website in batch]
+            for future in as_completed(futures):
+                record = future.result()
+                results.write(record)
+                done += 1
+                failed += record["status"] == "failed"
+                print(f"[{done}/{len(accounts)}] {record['status']:<6} {record['company']} ({record['seconds']:.1f}s)",
+                      file=sys.stderr)
+                since_checkpoint += 1
+                if since_checkpoint >= options.checkpoint_every:
+                    results.checkpoint()
+                    since_checkpoint = 0
+        results.checkpoint()
+    except KeyboardInterrupt:
+        executor.shutdown(wait=False, cancel_futures=True)
+        results.close()
+        print(f"\nInterrupted after {done} accounts; rerun the same command to resume.", file=sys.stderr)
+        # In-flight requests are abandoned rather than waited for; everything finished is already written
+        os._exit(130)
+    executor.shutdown()
+    prefetcher.shutdown()
+    return done, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="CSV with a 'Company Name' column and optionally 'Website'")
+    parser.add_argument("--output", required=True, help="JSON Lines file, or a directory for Parquet parts")
+    parser.add_argument("--format", choices=["jsonl", "parquet"],
+                        help="Output format (default: parquet if --output ends in .parquet, else jsonl)")
+    parser.add_argument("--workers", type=int, default=app.SUMMARY_CONCURRENCY, help="Accounts researched at once")
+    parser.add_argument("--checkpoint-every", type=int, default=50,
+                        help="Accounts between durable checkpoints (fsync, or a new Parquet part)")
+    parser.add_argument("--limit", type=int, help="Research at most this many remaining accounts")
+    parser.add_argument("--force-refresh", action="store_true", help="Regenerate instead of reusing cached sections and answers")
+    parser.add_argument("--classify", action="store_true", help="Also classify trigger events with the model")
+    parser.add_argument("--no-db", action="store_true", help="Do not save results to the territory database")
+    parser.add_argument("--verbose", action="store_true", help="Log requests, retries and cache use")
+    options = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if options.verbose else logging.WARNING,
+                        format="%(asctime)s %(levelname)s %(message)s")
+    output_format = options.format or ("parquet" if options.output.endswith(".parquet") else "jsonl")
+    if output_format == "parquet":
+        try:
+            import pyarrow  # noqa: F401  Only checks that Parquet output will work
+        except ImportError:
+            parser.error("Parquet output needs pyarrow (pip install pyarrow)")
+
+    try:
+        rows, accounts = read_accounts(options.input)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    results = ParquetResults(options.output) if output_format == "parquet" else JsonlResults(options.output)
+    remaining = [(account, website) for account, website in accounts
+                 if (account["id"] or account["name"]) not in results.completed]
+    if options.limit is not None:
+        remaining = remaining[:options.limit]
+    already_done = sum(1 for account, _ in accounts if (account["id"] or account["name"]) in results.completed)
+    print(f"{rows} rows, {len(accounts)} accounts, {already_done} already done, {len(remaining)} to research",
+          file=sys.stderr)
+
+    start = time.perf_counter()
+    done, failed = run(remaining, results, options)
+    results.close()
+    print(f"Researched {done} accounts ({failed} failed) in {time.perf_counter() - start:.1f}s -> {options.output}",
+          file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+
+# Keep the app's databases out of the working tree before main.py reads these at import
+_TMP = tempfile.mkdtemp(prefix="territory_tests_")
+os.environ.setdefault("TERRITORY_DB_PATH", os.path.join(_TMP, "territory.sqlite3"))
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(_TMP, "llm_cache.sqlite3"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+import main  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    return main.TerritoryDB(str(tmp_path / "territory.sqlite3"))
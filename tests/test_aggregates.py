@@ -0,0 +1,89 @@
+import random
+
+import main
+
+
+def random_opportunity(rng, stages=main.PIPELINE_STAGES):
+    return {
+        "account": f"Account {rng.randrange(20)}",
+        "acv": float(rng.randrange(1, 500) * 1000),
+        "stage": rng.choice(stages),
+        "close_date": "2025-06-30",
+        "notes": "",
+        "confidence": rng.choice([None, 25.0, 50.0, 90.0])
+    }
+
+
+def random_changes(rng):
+    changes = {}
+    if rng.random() < 0.5:
+        changes["acv"] = float(rng.randrange(1, 500) * 1000)
+    if rng.random() < 0.5:
+        changes["stage"] = rng.choice(main.PIPELINE_STAGES)
+    if rng.random() < 0.2:
+        changes["account"] = f"Account {rng.randrange(20)}"
+    return changes or {"notes": "touched"}
+
+
+def run_random_session(seed, db=None, steps=400):
+    rng = random.Random(seed)
+    aggregates = main.TerritoryAggregates()
+    deals = main.DealLedger(aggregates=aggregates, db=db)
+    pipeline = main.PipelineStore(aggregates=aggregates, db=db)
+    for _ in range(steps):
+        ids = [row["id"] for row in pipeline]
+        action = rng.random()
+        if action < 0.35 or not ids:
+            pipeline.add(random_opportunity(rng))
+        elif action < 0.55:
+            pipeline.update(rng.choice(ids), **random_changes(rng))
+        elif action < 0.65:
+            pipeline.remove(rng.choice(ids))
+        elif action < 0.75:
+            pipeline.close_won(rng.choice(ids), deals, deal_type=rng.choice(main.LOGO_TYPES + ["Expansion"]))
+        elif action < 0.9:
+            picked = rng.sample(ids, min(len(ids), rng.randrange(1, 6)))
+            deletes = picked[:rng.randrange(len(picked) + 1)]
+            updates = {deal_id: random_changes(rng) for deal_id in picked if deal_id not in deletes}
+            pipeline.apply_batch(updates, deletes, deals)
+        elif len(deals):
+            if rng.random() < 0.5:
+                deals.update(rng.randrange(len(deals)), acv=float(rng.randrange(1, 500) * 1000),
+                             deal_type=rng.choice(main.LOGO_TYPES + ["Expansion"]))
+            else:
+                deals.pop(rng.randrange(len(deals)))
+        assert aggregates.check_consistency(pipeline, deals) == {}
+    return aggregates, pipeline, deals
+
+
+def test_random_changes_keep_totals_consistent():
+    for seed in range(5):
+        run_random_session(seed)
+
+
+def test_random_changes_keep_totals_consistent_with_persistence(db):
+    aggregates, pipeline, deals = run_random_session(42, db=db, steps=200)
+    # What was written through reloads to the same totals
+    reloaded = main.TerritoryAggregates.recompute(db.load_opportunities(), db.load_deals())
+    assert reloaded.snapshot() == main.TerritoryAggregates.recompute(pipeline, deals).snapshot()
+
+
+def test_check_consistency_reports_drift():
+    aggregates = main.TerritoryAggregates()
+    pipeline = main.PipelineStore(aggregates=aggregates)
+    pipeline.add({"account": "Acme", "acv": 1000.0, "stage": "Demo"})
+    aggregates.pipeline_acv += 1
+    assert set(aggregates.check_consistency(pipeline, [])) == {"pipeline_acv"}
+
+
+def test_page_matches_active_rows_after_changes():
+    rng = random.Random(7)
+    pipeline = main.PipelineStore()
+    for _ in range(60):
+        pipeline.add(random_opportunity(rng))
+    for deal_id in [row["id"] for row in pipeline][::3]:
+        pipeline.update(deal_id, stage=rng.choice(main.PIPELINE_STAGES))
+    active = pipeline.active()
+    assert pipeline.count_active() == len(active) == sum(row["stage"] != "Closed Won" for row in pipeline)
+    pages = [row for offset in range(0, len(active), 7) for row in pipeline.page(offset, 7)]
+    assert pages == active
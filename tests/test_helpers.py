@@ -0,0 +1,229 @@
+import json
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import main
+
+
+def test_plan_news_batches_packs_distinct_names():
+    companies = [(f"Brightline{i} Holdings", None) for i in range(7)]
+    batches, singles = main.plan_news_batches(companies)
+    assert singles == []
+    assert [len(batch) for batch in batches] == [main.NEWS_BATCH_SIZE, 2]
+    for batch in batches:
+        query = " OR ".join(f'"{main.core_company_name(name)}"' for name, _, _, _ in batch)
+        assert len(query) <= main.NEWS_QUERY_MAX_CHARS
+
+
+def test_plan_news_batches_keeps_ambiguous_names_single():
+    companies = [("Apple", None), ("IBM", None), ('The "Co"', None), ("Acme", None), ("Acme Labs", None),
+                 ("Brightline Inc.", "https://www.brightline.com/about")]
+    batches, singles = main.plan_news_batches(companies)
+    assert [name for name, _ in singles] == ["Apple", "IBM", 'The "Co"', "Acme"]
+    # "Acme" overlaps "Acme Labs", but "Acme Labs" contains no other name
+    assert [(name, domain) for batch in batches for name, _, _, domain in batch] == [
+        ("Acme Labs", None), ("Brightline Inc.", "brightline.com")
+    ]
+
+
+def test_account_registry_merges_name_variants(db):
+    registry = main.AccountRegistry(db)
+    first, second, third = registry.resolve_many([
+        ("Brightline Inc.", None), ("brightline.com", None), ("Brightline", "https://brightline.com")
+    ])
+    assert first["id"] == second["id"] == third["id"]
+    assert third["name"] == "Brightline Inc."
+    assert third["domain"] == "brightline.com"
+    assert len(registry) == 1
+    # Aliases survive a reload from the database
+    assert main.AccountRegistry(db).resolve("BRIGHTLINE, INC")["id"] == first["id"]
+
+
+def test_account_registry_ignores_shared_domains(db):
+    registry = main.AccountRegistry(db)
+    one, two = registry.resolve_many([("Acme", "https://linkedin.com/company/acme"),
+                                      ("Globex", "https://linkedin.com/company/globex")])
+    assert one["id"] != two["id"]
+    assert one["domain"] is None and two["domain"] is None
+
+
+def pipeline_chunk(rows):
+    return pd.DataFrame(rows, columns=main.PIPELINE_REQUIRED_COLUMNS + ["confidence"], dtype="string")
+
+
+def test_validate_pipeline_chunk_reports_each_problem():
+    chunk = pipeline_chunk([
+        ["Acme", "1000", "Demo", "2025-06-30", "", "50"],
+        ["", "-5", "Lunch", "someday", "", "150"],
+        ["Globex", "2500.5", "Commit", "2025-07-01", "note", None]
+    ])
+    columns, errors = main.validate_pipeline_chunk(chunk, first_row=100)
+    assert list(columns["account"]) == ["Acme", "Globex"]
+    assert list(columns["acv"]) == [1000.0, 2500.5]
+    assert errors["row"].tolist() == [103]  # File line, counting the header
+    for problem in ["missing account", "invalid acv", "unknown stage", "invalid close_date",
+                    "confidence not in 0-100"]:
+        assert problem in errors["errors"].iloc[0]
+
+
+def test_validate_pipeline_chunk_rejects_missing_close_date():
+    columns, errors = main.validate_pipeline_chunk(pipeline_chunk([["Acme", "1000", "Demo", None, "", None]]), 0)
+    assert len(columns["account"]) == 0
+    assert "invalid close_date" in errors["errors"].iloc[0]
+
+
+def grid(rows):
+    frame = pd.DataFrame(rows, columns=["id", "account", "acv", "stage", "confidence", "close_date", "notes",
+                                        "delete"])
+    frame["close_date"] = pd.to_datetime(frame["close_date"]).dt.date
+    return frame
+
+
+def test_diff_pipeline_grid_collects_changes_and_deletes():
+    original = grid([
+        [1, "Acme", 1000.0, "Demo", None, "2025-06-30", "", False],
+        [2, "Globex", 2000.0, "Commit", 50.0, "2025-07-01", "x", False],
+        [3, "Initech", 3000.0, "Proposal", None, None, "", False]
+    ])
+    edited = original.copy()
+    edited.loc[0, "acv"] = 1500.0
+    edited.loc[0, "close_date"] = pd.Timestamp("2025-08-01").date()
+    edited.loc[1, "stage"] = "Closed Won"
+    edited.loc[1, "delete"] = True
+    updates, deletes = main.diff_pipeline_grid(original, edited)
+    assert deletes == [2]
+    assert updates == {1: {"acv": 1500.0, "close_date": "2025-08-01"}}
+
+
+def test_validate_grid_updates_rejects_cleared_close_date():
+    original = grid([
+        [1, "Acme", 1000.0, "Demo", None, "2025-06-30", "", False],
+        [2, "Globex", 2000.0, "Commit", 50.0, "2025-07-01", "x", False]
+    ])
+    edited = original.copy()
+    edited.loc[0, "close_date"] = None
+    edited.loc[1, "notes"] = "call back"
+    updates, rejected = main.validate_grid_updates(edited, main.diff_pipeline_grid(original, edited)[0])
+    assert updates == {2: {"notes": "call back"}}
+    assert rejected["account"].tolist() == ["Acme"]
+    assert "invalid close_date" in rejected["errors"].iloc[0]
+
+
+def test_parse_partial_keeps_completed_bullets_only():
+    prompt = main.COMPANY_INTELLIGENCE_PROMPT
+    answer = json.dumps({"sections": {"company_summary": ["Makes widgets", 'Says "hi"'],
+                                      "industry_trends": ["Consolidation"]}})
+    partial = answer[:answer.index("Consolidation") + 5]
+    assert prompt.parse_partial(partial) == {"company_summary": ["Makes widgets", 'Says "hi"']}
+    assert prompt.parse_partial(answer)["industry_trends"] == ["Consolidation"]
+    assert prompt.parse_partial('{"unknown": ["x"]}') == {}
+
+
+def test_find_trigger_types_skips_negated_mentions():
+    found = main.find_trigger_types("No funding news; Acme appoints new CFO. Expansion plans unknown")
+    assert found == {"exec_change": "Acme appoints new CFO"}
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = main.TokenBucket(60)
+    now = time.monotonic()
+    assert bucket.wait_time(60, now) == 0
+    bucket.take(60)
+    assert abs(bucket.wait_time(1, now) - 1.0) < 0.01
+    # Requests larger than the bucket only wait for a full bucket
+    assert abs(bucket.wait_time(600, now) - 60.0) < 0.01
+
+
+def test_model_rate_limiter_aimd():
+    limiter = main.ModelRateLimiter("gpt-test", concurrency=8)
+    limiter.acquire(10)
+    limiter.throttle(0)
+    assert limiter.concurrency == 4
+    limiter.throttle(0)
+    assert limiter.concurrency == 4  # One decrease per cooldown for a burst of 429s
+    limiter.release(ok=True)
+    assert limiter.concurrency == 4.25
+    assert limiter.in_flight == 0
+    limiter.acquire(10)
+    limiter.release(ok=False)
+    assert limiter.concurrency == 4.25
+
+
+def test_model_rate_limiter_caps_in_flight():
+    limiter = main.ModelRateLimiter("gpt-test", concurrency=1)
+    limiter.acquire(10)
+    limiter.paused_until = 0
+    start = time.monotonic()
+    threading.Timer(0.1, limiter.release, args=(True,)).start()
+    waited = limiter.acquire(10)
+    assert waited >= 0.09 and time.monotonic() - start >= 0.09
+    assert limiter.in_flight == 1
+
+
+def test_account_registry_keeps_same_name_on_other_domain_apart(db):
+    registry = main.AccountRegistry(db)
+    uk, us, again = registry.resolve_many([("Acme", "acme.co.uk"), ("Acme", "https://acme.com"), ("Acme", None)])
+    assert uk["id"] != us["id"]
+    assert (uk["domain"], us["domain"]) == ("acme.co.uk", "acme.com")
+    assert again["id"] == uk["id"]
+    reloaded = main.AccountRegistry(db)
+    assert reloaded.resolve("Acme Inc", "www.acme.com")["id"] == us["id"]
+    assert reloaded.resolve("Acme", "acme.co.uk")["domain"] == "acme.co.uk"
+
+
+def test_account_registry_skips_blank_names(db):
+    registry = main.AccountRegistry(db)
+    resolved = registry.resolve_many([(float("nan"), None), ("  ", "acme.com"), (None, None)])
+    assert all(account["id"] is None for account in resolved)
+    assert len(registry) == 0
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Recent M&A activity: Acme bought Foo Corp", {"m_and_a"}),
+    ("Acme bought Foo Corp for $40 million", {"m_and_a"}),
+    ("Acme buys payroll startup", {"m_and_a"}),
+    ("Globex agrees to buy Initech", {"m_and_a"}),
+    ("Acme acquired Foo Corp", {"m_and_a"}),
+    ("Acme secured $20 million in funding", {"funding"}),
+    ("Acme secures new investment from Sequoia", {"funding"}),
+    ("Acme raised $12M Series B", {"funding"}),
+    ("Acme named Jane Doe CEO", {"exec_change"}),
+    ("Acme names new CFO", {"exec_change"}),
+    ("Jane Doe joins Acme as Chief People Officer", {"exec_change"}),
+    ("CFO John Smith departed", {"exec_change"}),
+    ("COO departs after ten years", {"exec_change"}),
+    ("CEO steps down", {"exec_change"}),
+    ("Founder stepped down as chair", {"exec_change"}),
+    ("CHRO resigns", {"exec_change"}),
+    ("Acme opens new office in Austin", {"expansion"}),
+    ("Acme selects Workday", {"tech_stack"}),
+])
+def test_find_trigger_types_finds_events(text, expected):
+    assert set(main.find_trigger_types(text)) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "Acme raised concerns about supply chain costs",
+    "Acme secures its network with a new firewall",
+    "Acme named a leader in the Gartner Magic Quadrant",
+    "Acme buys back $50 million of shares",
+    "Quarterly earnings beat expectations",
+    "",
+])
+def test_find_trigger_types_ignores_other_news(text):
+    assert main.find_trigger_types(text) == {}
+
+
+@pytest.mark.parametrize("text", [
+    "No M&A activity",
+    "No recent funding news",
+    "Acme has not secured any funding",
+    "M&A activity unknown",
+    "No CFO departed this year",
+    "Series B round not disclosed",
+])
+def test_find_trigger_types_ignores_negated_mentions(text):
+    assert main.find_trigger_types(text) == {}
@@ -0,0 +1,83 @@
+import time
+
+import pandas as pd
+
+import main
+
+
+class MemoryDB:
+    def __init__(self):
+        self.saved = {}
+
+    def save_intelligence(self, company_name, entry):
+        self.saved[company_name] = entry
+
+
+def wait_for(queue, names, timeout=5):
+    deadline = time.monotonic() + timeout
+    while queue.pending(names) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert queue.pending(names) == 0
+
+
+def test_job_fails_instead_of_hanging_when_research_raises(monkeypatch):
+    def research_company(company_name, website, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(main, "research_company", research_company)
+    queue = main.IntelligenceJobQueue(MemoryDB(), max_workers=1)
+    assert queue.submit("Acme", None)
+    wait_for(queue, ["Acme"])
+    job = queue.get("Acme")
+    assert job["status"] == "failed"
+    assert job["finished_at"] is not None
+    assert job["entry"]["content"].startswith("Error")
+    # A failed job can be queued again
+    assert queue.submit("Acme", None)
+    wait_for(queue, ["Acme"])
+
+
+def test_job_is_done_when_saving_fails(monkeypatch):
+    def research_company(company_name, website, **kwargs):
+        return {"content": "**Company Summary:**\n- Widgets", "updated": pd.Timestamp.now(), "events": []}, []
+
+    class FailingDB(MemoryDB):
+        def save_intelligence(self, company_name, entry):
+            raise OSError("disk full")
+
+    monkeypatch.setattr(main, "research_company", research_company)
+    queue = main.IntelligenceJobQueue(FailingDB(), max_workers=1)
+    queue.submit("Acme", None)
+    wait_for(queue, ["Acme"])
+    assert queue.get("Acme")["status"] == "done"
+
+
+class CountingHttpClient:
+    def __init__(self):
+        self.targets = []
+
+    def get(self, url, params=None, target=None):
+        self.targets.append(target)
+        time.sleep(0.02)
+        response = main.requests.Response()
+        response.status_code = 200
+        response._content = b'{"results": [], "nextPage": null}'
+        return response
+
+
+def test_submit_many_batches_news_before_jobs_start(monkeypatch):
+    client = CountingHttpClient()
+    monkeypatch.setattr(main, "get_http_client", lambda: client)
+    monkeypatch.setattr(main.st, "secrets", {"NEWSDATA_API_KEY": "test"})
+
+    def research_company(company_name, website, **kwargs):
+        articles = main.fetch_news_articles(company_name)
+        return {"content": "ok", "updated": pd.Timestamp.now(), "events": []}, articles
+
+    monkeypatch.setattr(main, "research_company", research_company)
+    names = [f"Quillex {chr(ord('A') + i) * 2}" for i in range(10)]
+    queue = main.IntelligenceJobQueue(MemoryDB(), max_workers=8)
+    assert queue.submit_many([(name, None) for name in names]) == 10
+    wait_for(queue, names)
+    assert client.targets == ["newsdata_batch", "newsdata_batch"]
+    assert all(queue.get(name)["status"] == "done" for name in names)
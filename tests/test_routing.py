@@ -0,0 +1,42 @@
+import time
+
+import pytest
+
+import main
+
+
+def fake_models(monkeypatch, timings):
+    """Stand in for create_chat_completion: per model, seconds rate limited before sending and then to answer"""
+    calls = []
+
+    def create_chat_completion(messages, model, on_start=None, **kwargs):
+        calls.append(model)
+        limited, answer = timings[model]
+        time.sleep(limited)
+        on_start()
+        time.sleep(answer)
+        return f"answer from {model}"
+
+    health = main.ModelHealth()
+    monkeypatch.setattr(main, "create_chat_completion", create_chat_completion)
+    monkeypatch.setattr(main, "get_model_health", lambda: health)
+    monkeypatch.setattr(main, "get_model_route", lambda feature: {
+        "primary": "primary", "fallback": "fallback", "hedge_after": 0.2, "temperature": 0, "max_tokens": 10
+    })
+    return calls, health
+
+
+def test_rate_limiter_wait_does_not_trigger_a_hedge(monkeypatch):
+    calls, health = fake_models(monkeypatch, {"primary": (0.4, 0.05), "fallback": (0, 0.01)})
+    assert main.route_chat_completion("test", []) == "answer from primary"
+    assert calls == ["primary"]
+    assert health.stats("primary")["p50_latency"] == pytest.approx(0.05, abs=0.04)
+
+
+def test_loser_latency_leaves_out_rate_limiter_wait(monkeypatch):
+    calls, health = fake_models(monkeypatch, {"primary": (0, 1.0), "fallback": (0.3, 0.05)})
+    assert main.route_chat_completion("test", []) == "answer from fallback"
+    assert calls == ["primary", "fallback"]
+    assert health.stats("fallback")["p50_latency"] == pytest.approx(0.05, abs=0.04)
+    # The primary had been sent for the hedge delay plus the fallback's wait and answer
+    assert health.stats("primary")["p50_latency"] == pytest.approx(0.55, abs=0.1)